@@ -9,60 +9,75 @@
 # ```
 
 import asyncio
+import contextlib
 import json
 import os
 import subprocess
-import time
 from pathlib import Path
 
-import aiohttp
 import modal
 import modal.experimental
 
+import dg_cache
+import prefetch
+import specdec
+from client import load_test, smoke_test
+from coalesce import Coalescer
+from gateway import (
+    CUT_OFF_GRACE,
+    GATEWAY_PORT,
+    AdmissionConfig,
+    AdmissionController,
+    Gateway,
+    make_app,
+)
+from jazz_trace import SpanRecorder
+from metering import Meter
+from metrics import METRICS_PORT, LoadTracker, MetricsSidecar
+from router import REPLICA_REGISTRY, Heartbeat
+from server_config import ENV_PREFIX, ServerConfig, default_options
+from startup import LogWatcher, StartupProfiler, wait_for_server_ready
+
 here = Path(__file__).parent
 
-image = modal.Image.from_registry("lmsysorg/sglang:v0.5.8").entrypoint([])
+SGLANG_IMAGE = "lmsysorg/sglang:v0.5.8"
+REPO_ID = "zai-org/GLM-5-FP8"
 
-image = image.uv_pip_install("transformers==5.0.0")
+GPU_TYPE = "B200"
+GPU_COUNT = 8
+GPU = f"{GPU_TYPE}:{GPU_COUNT}"
 
-# patch SGLang and DeepGemm for GLM 5 support
-image = (
-    image.add_local_file(
-        here / "glm5_support.patch",
-        "/root/glm5_support.patch",
-        copy=True,
-    )
-    .run_commands(
-        "git clone https://github.com/huggingface/transformers.git /transformers",
-        "cd /transformers && git checkout b2028e7 && pip install /transformers",
-        "cd /sgl-workspace/sglang",
-        "git fetch origin pull/18297/head:glm5_support",
-        "git checkout glm5_support",
-        "git apply /root/glm5_support.patch",
-    )
-    .run_commands(
-        "rm -rf /root/.cache/deep_gemm/cache || true",
-        "curl -L 'https://raw.githubusercontent.com/deepseek-ai/DeepGEMM/477618cd51baffca09c4b0b87e97c03fe827ef03/deep_gemm/include/deep_gemm/impls/sm100_fp8_mqa_logits.cuh' "
-        "-o /usr/local/lib/python3.12/dist-packages/deep_gemm/include/deep_gemm/impls/sm100_fp8_mqa_logits.cuh",
-    )
-)
+SGLANG_PORT = 8001  # behind the admission gateway on GATEWAY_PORT
+
+USE_DUMMY_WEIGHTS = os.environ.get("APP_USE_DUMMY_WEIGHTS", "0") == "1"
+PROBE_MAX_TOKENS = 1024 if USE_DUMMY_WEIGHTS else None  # gibberish rarely stops
+USE_ROUTER = os.environ.get("APP_USE_ROUTER", "0") == "1"  # see router_app.py
+# identical deterministic requests in flight share one generation, see coalesce.py
+COALESCE_REQUESTS = os.environ.get("APP_COALESCE", "0") == "1"
+# read the weights into the page cache while SGLang initializes, see prefetch.py;
+# off until a deploy on the Volume shows it shortening startup
+PREFETCH_WEIGHTS = os.environ.get("APP_PREFETCH_WEIGHTS", "0") == "1"
+PREFETCH_COPY_TO = os.environ.get("APP_PREFETCH_COPY_TO", "")  # local disk path, or ""
 
 # TODO: download to `examples`
 hf_cache_path = "/root/.cache/huggingface"
 hf_cache_vol = modal.Volume.from_name("huggingface-cache", create_if_missing=True)
 
-USE_DUMMY_WEIGHTS = os.environ.get("APP_USE_DUMMY_WEIGHTS", "0") == "1"
+# DeepGEMM kernels are prebuilt into `dg_cache_vol` by `warm_deep_gemm`, below
+dg_cache_vol = modal.Volume.from_name("deepgemm-cache", create_if_missing=True)
+dg_cache_path = "/root/.cache/deep_gemm"
 
-image = image.env(
-    {
-        "HF_XET_HIGH_PERFORMANCE": "1",  # faster downloads
-        "APP_USE_DUMMY_WEIGHTS": str(int(USE_DUMMY_WEIGHTS)),
-        "SGLANG_ALLOW_OVERWRITE_LONGER_CONTEXT_LEN": "1",
-        "SGLANG_JIT_DEEPGEMM_FAST_WARMUP": "1",
-        "SGLANG_NSA_FORCE_MLA": "1",
-        "SGLANG_LOCAL_IP_NIC": "overlay0",
-    }
-)
+# per-API-key token usage logs, one per replica, written by the gateway
+metering_vol = modal.Volume.from_name("jazz-metering", create_if_missing=True)
+metering_path = "/root/metering"
+
+# request spans, one log per replica, written by the gateway; see jazz_trace.py
+traces_vol = modal.Volume.from_name("jazz-traces", create_if_missing=True)
+traces_path = "/root/traces"
+
+local_config_path = os.environ.get("APP_LOCAL_CONFIG_PATH")
+if modal.is_local() and local_config_path is None:
+    local_config_path = here / "config.yaml"
 
 
 def download_model(repo_id, revision=None):
@@ -71,99 +86,143 @@ def download_model(repo_id, revision=None):
     snapshot_download(repo_id=repo_id, revision=revision)
 
 
-dg_cache_vol = modal.Volume.from_name("deepgemm-cache", create_if_missing=True)
-dg_cache_path = "/root/.cache/deep_gemm"
+def is_sglang_env_var(key):
+    return key.startswith("SGL_") or key.startswith("SGLANG_")
 
 
-REPO_ID = "zai-org/GLM-5-FP8"
+# The image graph is defined in one function, called once below. Modal's decorators need it,
+# so it's still described whenever this module is imported, locally and in every
+# container; Modal only builds it on `modal run` or `deploy`. Client-side tooling
+# (`client.py`) doesn't import this module at all.
 
 
-def compile_deep_gemm():
-    import os
+def build_image() -> modal.Image:
+    """The GPU server image: SGLang, the GLM 5 patches, the weights and this repo's code"""
+    image = modal.Image.from_registry(SGLANG_IMAGE).entrypoint([])
 
-    if int(os.environ.get("SGLANG_ENABLE_JIT_DEEPGEMM", "1")):
-        subprocess.run(
-            f"python3 -m sglang.compile_deep_gemm --model-path {REPO_ID} --tp {GPU_COUNT}",
-            shell=True,
+    image = image.uv_pip_install("transformers==5.0.0")
+
+    # patch SGLang and DeepGemm for GLM 5 support
+    image = (
+        image.add_local_file(
+            here / "glm5_support.patch",
+            "/root/glm5_support.patch",
+            copy=True,
+        )
+        .run_commands(
+            "git clone https://github.com/huggingface/transformers.git /transformers",
+            "cd /transformers && git checkout b2028e7 && pip install /transformers",
+            "cd /sgl-workspace/sglang",
+            "git fetch origin pull/18297/head:glm5_support",
+            "git checkout glm5_support",
+            "git apply /root/glm5_support.patch",
+        )
+        .run_commands(
+            "rm -rf /root/.cache/deep_gemm/cache || true",
+            "curl -L 'https://raw.githubusercontent.com/deepseek-ai/DeepGEMM/477618cd51baffca09c4b0b87e97c03fe827ef03/deep_gemm/include/deep_gemm/impls/sm100_fp8_mqa_logits.cuh' "
+            "-o /usr/local/lib/python3.12/dist-packages/deep_gemm/include/deep_gemm/impls/sm100_fp8_mqa_logits.cuh",
         )
+    )
 
+    image = image.env(
+        {
+            "HF_XET_HIGH_PERFORMANCE": "1",  # faster downloads
+            "APP_USE_DUMMY_WEIGHTS": str(int(USE_DUMMY_WEIGHTS)),
+            "APP_USE_ROUTER": str(int(USE_ROUTER)),
+            "APP_COALESCE": str(int(COALESCE_REQUESTS)),
+            "APP_PREFETCH_WEIGHTS": str(int(PREFETCH_WEIGHTS)),
+            "APP_PREFETCH_COPY_TO": PREFETCH_COPY_TO,
+            "SGLANG_ALLOW_OVERWRITE_LONGER_CONTEXT_LEN": "1",
+            "SGLANG_JIT_DEEPGEMM_FAST_WARMUP": "1",
+            "SGLANG_NSA_FORCE_MLA": "1",
+            "SGLANG_LOCAL_IP_NIC": "overlay0",
+        }
+    )
 
-GPU_TYPE = "B200"
-GPU_COUNT = 8
-GPU = f"{GPU_TYPE}:{GPU_COUNT}"
+    if not USE_DUMMY_WEIGHTS:  # skip download if we don't need real weights
+        image = image.run_function(
+            download_model,
+            volumes={"/root/.cache/huggingface": hf_cache_vol},
+            secrets=[modal.Secret.from_name("huggingface-secret")],
+            args=(REPO_ID,),
+        )
 
-# image = image.run_function(
-#     compile_deep_gemm,
-#     volumes={dg_cache_path: dg_cache_vol, hf_cache_path: hf_cache_vol},
-#     gpu=GPU,
-# )
-
-if not USE_DUMMY_WEIGHTS:  # skip download if we don't need real weights
-    image = image.run_function(
-        download_model,
-        volumes={"/root/.cache/huggingface": hf_cache_vol},
-        secrets=[modal.Secret.from_name("huggingface-secret")],
-        args=(REPO_ID,),
+    # configure the inference engine: SGLang's own environment variables
+    image = image.env(
+        {key: value for key, value in os.environ.items() if is_sglang_env_var(key)}
     )
 
-# ### Configure the inference engine
+    # `APP_SERVER_<OPTION>` variables override server options from the YAML, below
+    image = image.env(
+        {key: value for key, value in os.environ.items() if key.startswith(ENV_PREFIX)}
+    )
 
-# **Environment variables**
+    # and the server config YAML
+    if modal.is_local():
+        image = image.add_local_file(local_config_path, "/root/config.yaml")
+
+    return image.add_local_python_source(
+        "startup",
+        "dg_cache",
+        "prefetch",
+        "specdec",
+        "jazz_sse",
+        "jazz_trace",
+        "client",
+        "bench",
+        "sweep",
+        "server_config",
+        "metrics",
+        "gateway",
+        "coalesce",
+        "router",
+        "metering",
+    )
 
 
-def is_sglang_env_var(key):
-    return key.startswith("SGL_") or key.startswith("SGLANG_")
+# ** Command-line arguments**
 
+# Code defaults, then the YAML, then `APP_SERVER_*` overrides (see `server_config.py`).
+# Validated on import, so a bad combination fails locally instead of after a GPU cold start.
 
-image = image.env(
-    {key: value for key, value in os.environ.items() if is_sglang_env_var(key)}
-)
 
-# **YAML**
+def _server_config(config: dict | None = None) -> ServerConfig:
+    config_path = local_config_path if modal.is_local() else "/root/config.yaml"
+    return ServerConfig.load(
+        default_options(REPO_ID, GPU_COUNT, SGLANG_PORT, USE_DUMMY_WEIGHTS),
+        config_path,
+        gpu_count=GPU_COUNT,
+        config=config,
+    ).validate()
 
-local_config_path = os.environ.get("APP_LOCAL_CONFIG_PATH")
 
-if modal.is_local():
-    if local_config_path is None:
-        local_config_path = here / "config.yaml"
+server_config = _server_config()
 
-    image = image.add_local_file(local_config_path, "/root/config.yaml")
 
-# ** Command-line arguments**
+def _sglang_env() -> dict:
+    return {**os.environ, "HF_HUB_OFFLINE": str(1 - int(USE_DUMMY_WEIGHTS))}
 
 
-def _start_server() -> subprocess.Popen:
+def _start_server(config: ServerConfig = server_config) -> subprocess.Popen:
     """Start SGLang server in a subprocess"""
-    cmd = [
-        f"HF_HUB_OFFLINE={1 - int(USE_DUMMY_WEIGHTS)}",
-        "python",
-        "-m",
-        "sglang.launch_server",
-        "--host",
-        "0.0.0.0",
-        "--port",
-        str(SGLANG_PORT),
-        "--model-path",
-        REPO_ID,
-        "--served-model-name",
-        "llm",
-        "--tp",
-        str(GPU_COUNT),
-        "--dp",
-        str(GPU_COUNT),
-        "--enable-dp-attention",
-        "--config",
-        "/root/config.yaml",
-    ]
-
-    if USE_DUMMY_WEIGHTS:
-        cmd.extend(["--load-format", "dummy"])
+    cmd = config.launch_command()
 
     print("Starting SGLang server with command:")
     print(*cmd)
 
-    return subprocess.Popen(" ".join(cmd), shell=True, start_new_session=True)
+    return subprocess.Popen(
+        cmd,
+        env=_sglang_env(),
+        start_new_session=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors="replace",
+        bufsize=1,
+    )
+
 
+image = build_image()  # at import: `app.cls` and `app.function` take it as an argument
 
 with image.imports():
     import sglang  # noqa
@@ -172,6 +231,9 @@ with image.imports():
 
 app = modal.App("jazz-backend", image=image)
 
+# replica name -> gateway tunnel URL and heartbeat, for the router in `router_app.py`
+replica_registry = modal.Dict.from_name(REPLICA_REGISTRY, create_if_missing=True)
+
 REGION = "us"
 PROXY_REGIONS = ["us-east"]
 
@@ -181,55 +243,177 @@ TARGET_INPUTS = 10  # Concurrent requests per replica before scaling
 
 # ### Define the server
 
-SGLANG_PORT = 8000
 MINUTES = 60  # seconds
 
+# on scale-down, in-flight streams get DRAIN_BUDGET seconds to finish before
+# the gateway cuts them off with a resumable error, allowing CUT_OFF_GRACE for
+# that, then the volumes are committed and SGLang is stopped
+EXIT_GRACE_PERIOD = 25  # seconds
+TEARDOWN_ALLOWANCE = 5  # seconds to commit the volumes and terminate SGLang
+DRAIN_BUDGET = EXIT_GRACE_PERIOD - CUT_OFF_GRACE - TEARDOWN_ALLOWANCE
+
 
 @app.cls(
     image=image,
     gpu=f"{GPU_TYPE}:{GPU_COUNT}",
     scaledown_window=20 * MINUTES,  # how long should we stay up with no requests?
     timeout=30 * MINUTES,  # how long should we wait for container start?
-    volumes={hf_cache_path: hf_cache_vol, dg_cache_path: dg_cache_vol},
+    volumes={
+        hf_cache_path: hf_cache_vol,
+        dg_cache_path: dg_cache_vol,
+        metering_path: metering_vol,
+        traces_path: traces_vol,
+    },
     region=REGION,
     min_containers=MIN_CONTAINERS,
 )
 @modal.experimental.http_server(
-    port=SGLANG_PORT,
+    port=GATEWAY_PORT,
     proxy_regions=["us-east"],
-    exit_grace_period=25,  # time to finish requests on shutdown (seconds)
+    exit_grace_period=EXIT_GRACE_PERIOD,  # time to finish requests on shutdown
 )
 @modal.concurrent(target_inputs=TARGET_INPUTS)
 class Server:
     @modal.enter()
     def start(self):
         """Start SGLang server process and wait for it to be ready"""
-        self.proc = _start_server()
-        wait_for_server_ready()
+        profiler = StartupProfiler()
+        profiler.mark("container_enter")
+
+        # volumes are mounted lazily, so the first listing pays for the mount
+        with profiler.span("volume_mount:hf_cache"):
+            os.listdir(hf_cache_path)
+        with profiler.span("volume_mount:dg_cache"):
+            os.listdir(dg_cache_path)
+
+        cache_status = dg_cache.validate(dg_cache_path, _dg_cache_key())
+        print(json.dumps({"deep_gemm_cache": cache_status}))
+        kernels_before = dg_cache.list_kernels(dg_cache_path)
+
+        shards = []
+        if PREFETCH_WEIGHTS and not USE_DUMMY_WEIGHTS:
+            snapshot = prefetch.snapshot_dir(hf_cache_path, REPO_ID)
+            if PREFETCH_COPY_TO and snapshot is not None:
+                # SGLang loads from the copy, so it has to be complete before the spawn
+                try:
+                    with profiler.span("weight_copy"):
+                        copied = prefetch.copy_snapshot(snapshot, PREFETCH_COPY_TO)
+                except OSError as e:
+                    # the partial copy is gone; load from the Volume as if there were none
+                    print(json.dumps({"weight_copy": {"error": str(e)}}))
+                    shards = prefetch.list_shards(snapshot)
+                else:
+                    print(json.dumps({"weight_copy": copied}))
+                    os.environ["HF_HUB_CACHE"] = f"{PREFETCH_COPY_TO}/hub"
+            else:
+                shards = prefetch.list_shards(snapshot)
+        self.prefetcher = prefetch.Prefetcher(shards).start()
+
+        with profiler.span("sglang_spawn"):
+            self.proc = _start_server()
+        # accept length by batch size, from the decode log lines, see specdec.py
+        self.spec_stats = None
+        if server_config.get("speculative-algorithm"):
+            self.spec_stats = specdec.DecodeStats(server_config.get("speculative-num-steps"))
+        listeners = [self.spec_stats.observe_line] if self.spec_stats else []
+        self.log_watcher = profiler.watch(self.proc.stdout, listeners=listeners)
+
+        wait_for_server_ready(
+            self.proc,
+            f"http://localhost:{SGLANG_PORT}/health",
+            self.log_watcher,
+            timeout=30 * MINUTES,
+        )
+        profiler.mark("first_healthy_response")
+        if shards:
+            profiler.record("weight_prefetch", self.prefetcher.started, self.prefetcher.finished)
+            weight_load = profiler.log.phase_timings().get("weight_load", {})
+            prefetched = {**self.prefetcher.stats(), "weight_load_s": weight_load.get("duration")}
+            print(json.dumps({"weight_prefetch": prefetched}))
+        profiler.report()
+
+        kernels = dg_cache.compare_kernels(
+            kernels_before, dg_cache.list_kernels(dg_cache_path)
+        )
+        print(json.dumps({"deep_gemm_kernels": kernels}))
+
+        max_running_requests = server_config.get("max-running-requests")
+
+        # load score from SGLang's /metrics, served on METRICS_PORT inside the container
+        routes = {}
+        if server_config.get("enable-metrics"):
+            tracker = LoadTracker(max_running_requests or TARGET_INPUTS)
+            self.metrics = MetricsSidecar(
+                f"http://localhost:{SGLANG_PORT}/metrics", tracker, spec_stats=self.spec_stats
+            ).start()
+            routes["/load"] = f"http://localhost:{METRICS_PORT}/load"
+
+        # admission control and priorities on the public port, see gateway.py
+        admission = AdmissionConfig()
+        if max_running_requests:
+            admission.max_concurrency = max_running_requests
+        controller = AdmissionController(admission)
+        replica = os.environ.get("MODAL_TASK_ID", "local")
+        # every replica's log is on the volume, so /gateway/usage sums them all
+        meter = Meter(f"{metering_path}/{replica}.bin", shared=True, reload=metering_vol.reload)
+        tracer = SpanRecorder(f"{traces_path}/{replica}.jsonl")
+        coalescer = Coalescer() if COALESCE_REQUESTS else None
+        app = make_app(
+            f"http://localhost:{SGLANG_PORT}", controller, routes, meter, tracer, coalescer
+        )
+        self.gateway = Gateway(app, port=GATEWAY_PORT).start()
+
+        # register with the prefix-affinity router, which reaches us through a tunnel
+        self.exit_stack = contextlib.ExitStack()
+        self.heartbeat = None
+        if USE_ROUTER:
+            tunnel = self.exit_stack.enter_context(modal.forward(GATEWAY_PORT))
+            self.heartbeat = Heartbeat(replica_registry, replica, tunnel.url).start()
 
     @modal.exit()
     def stop(self):
-        """Terminate the SGLang server process"""
+        """Drain in-flight requests through the gateway, then terminate SGLang"""
+        if getattr(self, "heartbeat", None) is not None:
+            self.heartbeat.stop()  # so the router stops sending first
+        if getattr(self, "gateway", None) is not None:  # None if startup failed
+            self.gateway.drain(DRAIN_BUDGET, CUT_OFF_GRACE)  # also flushes the usage and span logs
+            self.exit_stack.close()
+            metering_vol.commit()
+            traces_vol.commit()
         self.proc.terminate()
         self.proc.wait()
 
 
-def wait_for_server_ready():
-    """Wait for SGLang server to be ready"""
-    import requests
+# ## Prebuild DeepGEMM kernels
 
-    url = f"http://localhost:{SGLANG_PORT}/health"
-    print(f"Waiting for server to be ready at {url}")
+# Run once per image/patch/config change, so replicas don't JIT-compile on startup:
+# ```bash
+# modal run backend.py::warm_deep_gemm
+# ```
 
-    while True:
-        try:
-            resp = requests.get(url, timeout=5)
-            if resp.status_code == 200:
-                print("Server is ready!")
-                return
-        except requests.exceptions.RequestException:
-            pass
-        time.sleep(5)
+
+def _dg_cache_key() -> dict:
+    return dg_cache.cache_key(
+        SGLANG_IMAGE, "/root/glm5_support.patch", server_config.options, REPO_ID, GPU_COUNT
+    )
+
+
+@app.function(
+    gpu=GPU,
+    volumes={hf_cache_path: hf_cache_vol, dg_cache_path: dg_cache_vol},
+    timeout=2 * 60 * MINUTES,
+)
+def warm_deep_gemm():
+    """Populate the DeepGEMM kernel cache for this config and record a manifest"""
+    subprocess.run(
+        server_config.launch_command("sglang.compile_deep_gemm"),
+        env=_sglang_env(),
+        check=True,
+    )
+    manifest = dg_cache.write_manifest(dg_cache_path, _dg_cache_key())
+    dg_cache_vol.commit()
+    print(f"Warmed {len(manifest['kernels'])} DeepGEMM kernels:")
+    print(json.dumps(manifest["key"], indent=2))
 
 
 # ## Test the server
@@ -239,86 +423,90 @@ def wait_for_server_ready():
 async def test(test_timeout=60 * MINUTES, content=None, twice=True):
     """Test the model serving endpoint"""
     url = Server._experimental_get_flash_urls()[0]
+    kwargs = {"system": "This system produces gibberish."} if USE_DUMMY_WEIGHTS else {}
+    await smoke_test(url, content, twice, test_timeout, PROBE_MAX_TOKENS, **kwargs)
+
+
+@app.local_entrypoint()
+async def bench(
+    num_requests: int = 64,
+    concurrency: int = TARGET_INPUTS,
+    input_len: str = "512",
+    output_len: str = "256",
+    request_rate: float = 0.0,
+    output: str = "",
+):
+    """Load-test the model serving endpoint and print a JSON latency report"""
+    await load_test(
+        Server._experimental_get_flash_urls()[0],
+        output,
+        PROBE_MAX_TOKENS,
+        num_requests=num_requests,
+        concurrency=concurrency,
+        input_len=input_len,
+        output_len=output_len,
+        request_rate=request_rate or None,
+    )
+
+
+# ## Sweep server configs
 
-    if USE_DUMMY_WEIGHTS:
-        system_prompt = {"role": "system", "content": "This system produces gibberish."}
-    else:
-        system_prompt = {"role": "system", "content": "You are a helpful AI assistant."}
-
-    if content is None:
-        content = "Explain the transformer architecture in one paragraph."
-
-    messages = [system_prompt, {"role": "user", "content": content}]
-
-    print(f"Sending messages to {url}:", *messages, sep="\n\t")
-    await probe(url, messages, timeout=test_timeout)
-
-    if twice:
-        messages[1]["content"] = "What is the capital of France?"
-        print(f"Sending second request to {url}:", *messages, sep="\n\t")
-        await probe(url, messages, timeout=1 * MINUTES)
-
-
-async def probe(url, messages, timeout=60 * MINUTES):
-    """Send request with retry logic for startup delays"""
-    deadline = time.time() + timeout
-    async with aiohttp.ClientSession(base_url=url) as session:
-        while time.time() < deadline:
-            try:
-                await _send_request_streaming(session, messages)
-                return
-            except asyncio.TimeoutError:
-                await asyncio.sleep(1)
-            except aiohttp.client_exceptions.ClientResponseError as e:
-                if e.status == 503:  # Service Unavailable during startup
-                    await asyncio.sleep(1)
-                    continue
-                raise e
-    raise TimeoutError(f"No response from server within {timeout} seconds")
-
-
-async def _send_request_streaming(
-    session: aiohttp.ClientSession, messages: list, timeout: int | None = None
+# Each cell of the grid gets a fresh container, one at a time, since they each take 8 GPUs.
+# Rendered configs don't match the DeepGEMM manifest, so cells JIT-compile kernels on startup.
+
+
+@app.function(
+    gpu=GPU,
+    volumes={hf_cache_path: hf_cache_vol, dg_cache_path: dg_cache_vol},
+    timeout=2 * 60 * MINUTES,
+    max_containers=1,
+)
+async def sweep_cell(cell: dict, bench_kwargs: dict) -> dict:
+    """Start SGLang with a rendered config and load-test it from inside the container"""
+    from bench import run_benchmark
+
+    print(f"Sweep cell {cell['name']}")
+    proc = _start_server(_server_config(cell["options"]))
+    watcher = LogWatcher(proc.stdout).start()
+    try:
+        await asyncio.to_thread(
+            wait_for_server_ready,
+            proc,
+            f"http://localhost:{SGLANG_PORT}/health",
+            watcher,
+            timeout=30 * MINUTES,
+        )
+        return await run_benchmark(f"http://localhost:{SGLANG_PORT}", **bench_kwargs)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+@app.local_entrypoint()
+async def sweep(
+    grid: str = "",
+    base: str = "",
+    num_requests: int = 64,
+    concurrency: int = 32,
+    input_len: str = "512",
+    output_len: str = "256",
+    out_dir: str = "sweep-results",
 ):
-    """Stream response from chat completions endpoint"""
-    payload = {
-        "messages": messages,
-        "stream": True,
-        "max_tokens": 1024 if USE_DUMMY_WEIGHTS else None,
-    }
-    headers = {"Accept": "text/event-stream"}
-
-    async with session.post(
-        "/v1/chat/completions", json=payload, headers=headers, timeout=timeout
-    ) as resp:
-        resp.raise_for_status()
-        full_text = ""
-
-        async for raw in resp.content:
-            line = raw.decode("utf-8", errors="ignore").strip()
-            if not line:
-                continue
-
-            if not line.startswith("data:"):
-                continue
-
-            data = line[len("data:") :].strip()
-            if data == "[DONE]":
-                break
-
-            try:
-                evt = json.loads(data)
-            except json.JSONDecodeError:
-                continue
-
-            delta = (evt.get("choices") or [{}])[0].get("delta") or {}
-            chunk = delta.get("content") or delta.get("reasoning_content")
-
-            if chunk:
-                print(
-                    chunk,
-                    end="",
-                    flush="\n" in chunk or "." in chunk or len(chunk) > 100,
-                )
-                full_text += chunk
-        print()
\ No newline at end of file
+    """Benchmark a grid of server options and print a throughput vs p99 latency table"""
+    from sweep import DEFAULT_GRID, format_table, make_cells, parse_grid, run_sweep, valid_cells
+
+    bases = []
+    for path in (base or str(local_config_path)).split(","):
+        bases.append(path if os.path.exists(path) else str(here / path))
+
+    cells = make_cells(bases, parse_grid(grid) if grid else DEFAULT_GRID)
+    defaults = default_options(REPO_ID, GPU_COUNT, SGLANG_PORT, USE_DUMMY_WEIGHTS)
+    cells = valid_cells(cells, defaults, gpu_count=GPU_COUNT)  # before any GPUs spin up
+    bench_kwargs = dict(
+        num_requests=num_requests,
+        concurrency=concurrency,
+        input_len=input_len,
+        output_len=output_len,
+    )
+    rows = await run_sweep(cells, sweep_cell.remote.aio, bench_kwargs, out_dir)
+    print(format_table(rows))
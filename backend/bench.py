@@ -0,0 +1,313 @@
+"""Load generator for OpenAI-compatible streaming chat completions.
+
+Fires many concurrent streaming `/v1/chat/completions` requests and reports
+time-to-first-token, inter-token latency, per-stream and aggregate throughput,
+and error rates as JSON.
+
+Point it at a deployed backend (or use `modal run backend.py::bench`):
+
+```bash
+python bench.py https://your-jazz-endpoint.modal.direct --concurrency 16 --num-requests 128
+```
+
+Length distributions are given as `N` (fixed), `LO-HI` (uniform),
+or `exp:MEAN` (exponential), measured in approximate tokens.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+
+import aiohttp
+
+from jazz_sse import aiter_json, delta_text
+
+WORDS = (
+    "the of and to in is was for on that with as by at from his an were are "
+    "which this be or had not but what all when we there can been has more "
+    "if no out so said one about up them time into some could new two then "
+    "do first any my now such like our over man me even most made after also"
+).split()
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def parse_length(spec: str):
+    """Parse a length distribution spec into a sampler taking a `random.Random`"""
+    spec = str(spec).strip()
+    if spec.startswith("exp:"):
+        mean = float(spec[len("exp:") :])
+        return lambda rng: max(1, int(rng.expovariate(1 / mean)))
+    if "-" in spec:
+        lo, hi = (int(part) for part in spec.split("-", 1))
+        if lo > hi:
+            raise ValueError(f"Invalid length range {spec!r}")
+        return lambda rng: rng.randint(lo, hi)
+    n = int(spec)
+    return lambda rng: n
+
+
+def make_prompt(rng: random.Random, num_tokens: int) -> str:
+    """Build a synthetic prompt of roughly `num_tokens` tokens.
+
+    A random request tag up front keeps requests from sharing a cached prefix."""
+    tag = f"[{rng.getrandbits(64):016x}]"
+    return " ".join([tag, *rng.choices(WORDS, k=max(0, num_tokens - 8))])
+
+
+@dataclass
+class RequestResult:
+    ok: bool = False
+    error: str | None = None
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    ttft: float | None = None
+    latency: float | None = None
+    itls: list[float] = field(default_factory=list)
+
+    @property
+    def tokens_per_second(self) -> float | None:
+        if not self.ok or self.ttft is None or self.output_tokens < 2:
+            return None
+        decode_time = self.latency - self.ttft
+        return (self.output_tokens - 1) / decode_time if decode_time > 0 else None
+
+
+async def send_request(
+    session: aiohttp.ClientSession,
+    prompt: str,
+    max_tokens: int,
+    model: str = "llm",
+    timeout: float | None = None,
+) -> RequestResult:
+    """Stream a single chat completion and record its token timings"""
+    payload = {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "stream": True,
+        "stream_options": {"include_usage": True},
+        "max_tokens": max_tokens,
+        "ignore_eos": True,  # SGLang extension: always generate max_tokens
+    }
+    headers = {"Accept": "text/event-stream"}
+    result = RequestResult()
+    chunks = 0
+    start = last = time.perf_counter()
+
+    try:
+        async with session.post(
+            "/v1/chat/completions",
+            json=payload,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        ) as resp:
+            if resp.status != 200:
+                result.error = f"HTTP {resp.status}"
+                return result
+
+            async for evt in aiter_json(resp.content.iter_any()):
+                error = evt.get("error")
+                if error:  # e.g. cut off by a draining gateway
+                    kind = error.get("type") if isinstance(error, dict) else None
+                    result.error = kind or "stream error"
+                    return result
+                usage = evt.get("usage")
+                if usage:
+                    result.prompt_tokens = usage.get("prompt_tokens") or 0
+                    result.output_tokens = usage.get("completion_tokens") or 0
+
+                reasoning, content = delta_text(evt)
+                if content or reasoning:
+                    now = time.perf_counter()
+                    if result.ttft is None:
+                        result.ttft = now - start
+                    else:
+                        result.itls.append(now - last)
+                    last = now
+                    chunks += 1
+    except asyncio.TimeoutError:
+        result.error = "timeout"
+        return result
+    except aiohttp.ClientError as e:
+        result.error = type(e).__name__
+        return result
+
+    result.latency = time.perf_counter() - start
+    result.output_tokens = result.output_tokens or chunks
+    if result.ttft is None:
+        result.error = "empty response"
+    else:
+        result.ok = True
+    return result
+
+
+def percentiles(values: list[float]) -> dict:
+    """Nearest-rank percentiles plus mean, or `None`s if there is no data"""
+    if not values:
+        return {"mean": None, **{f"p{p}": None for p in PERCENTILES}}
+    ordered = sorted(values)
+    summary = {"mean": sum(ordered) / len(ordered)}
+    for p in PERCENTILES:
+        rank = max(0, math.ceil(p / 100 * len(ordered)) - 1)
+        summary[f"p{p}"] = ordered[rank]
+    return summary
+
+
+def summarize(results: list[RequestResult], duration: float, config: dict) -> dict:
+    """Aggregate per-request results into a JSON-serializable report"""
+    ok = [r for r in results if r.ok]
+    errors: dict[str, int] = {}
+    for r in results:
+        if not r.ok:
+            errors[r.error] = errors.get(r.error, 0) + 1
+
+    output_tokens = sum(r.output_tokens for r in ok)
+    return {
+        "config": config,
+        "duration_s": duration,
+        "requests": {
+            "total": len(results),
+            "succeeded": len(ok),
+            "failed": len(results) - len(ok),
+            "error_rate": (len(results) - len(ok)) / len(results) if results else 0.0,
+            "errors": errors,
+        },
+        "throughput": {
+            "requests_per_s": len(ok) / duration if duration else None,
+            "output_tokens_per_s": output_tokens / duration if duration else None,
+            "total_tokens_per_s": (
+                (output_tokens + sum(r.prompt_tokens for r in ok)) / duration
+                if duration
+                else None
+            ),
+        },
+        "ttft_s": percentiles([r.ttft for r in ok]),
+        "itl_s": percentiles([itl for r in ok for itl in r.itls]),
+        "latency_s": percentiles([r.latency for r in ok]),
+        "stream_tokens_per_s": percentiles(
+            [r.tokens_per_second for r in ok if r.tokens_per_second is not None]
+        ),
+    }
+
+
+async def run_benchmark(
+    url: str,
+    num_requests: int = 64,
+    concurrency: int = 8,
+    input_len: str = "512",
+    output_len: str = "256",
+    request_rate: float | None = None,
+    model: str = "llm",
+    timeout: float | None = 10 * 60,
+    seed: int = 0,
+    api_key: str | None = None,
+    headers: dict | None = None,
+) -> dict:
+    """Run a closed-loop (or Poisson, with `request_rate`) load test against `url`"""
+    rng = random.Random(seed)
+    sample_input, sample_output = parse_length(input_len), parse_length(output_len)
+    jobs = [
+        (make_prompt(rng, sample_input(rng)), sample_output(rng))
+        for _ in range(num_requests)
+    ]
+
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = dict(headers or {})
+    if api_key:
+        headers["Authorization"] = f"Bearer {api_key}"
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(
+        base_url=url, headers=headers, connector=connector
+    ) as session:
+
+        async def worker(prompt, max_tokens):
+            async with semaphore:
+                return await send_request(session, prompt, max_tokens, model, timeout)
+
+        start = time.perf_counter()
+        tasks = []
+        for prompt, max_tokens in jobs:
+            tasks.append(asyncio.create_task(worker(prompt, max_tokens)))
+            if request_rate:
+                await asyncio.sleep(rng.expovariate(request_rate))
+        results = await asyncio.gather(*tasks)
+        duration = time.perf_counter() - start
+
+    config = {
+        "url": url,
+        "num_requests": num_requests,
+        "concurrency": concurrency,
+        "input_len": input_len,
+        "output_len": output_len,
+        "request_rate": request_rate,
+        "model": model,
+        "seed": seed,
+    }
+    return summarize(results, duration, config)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("url", help="Base URL of the server, without /v1")
+    parser.add_argument("--num-requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--input-len", default="512", help="e.g. 512, 128-2048, exp:1000")
+    parser.add_argument("--output-len", default="256", help="e.g. 256, 64-512, exp:300")
+    parser.add_argument(
+        "--request-rate",
+        type=float,
+        default=None,
+        help="Poisson arrival rate in requests/s. Default: send as fast as concurrency allows",
+    )
+    parser.add_argument("--model", default="llm")
+    parser.add_argument("--timeout", type=float, default=10 * 60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument(
+        "--header",
+        action="append",
+        default=[],
+        help='Extra request header, e.g. "X-Jazz-Priority: batch"',
+    )
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    headers = {}
+    for header in args.header:
+        name, colon, value = header.partition(":")
+        if not colon or not name.strip():
+            parser.error(f"--header must look like 'Name: value', got {header!r}")
+        headers[name.strip()] = value.strip()
+
+    report = asyncio.run(
+        run_benchmark(
+            args.url,
+            num_requests=args.num_requests,
+            concurrency=args.concurrency,
+            input_len=args.input_len,
+            output_len=args.output_len,
+            request_rate=args.request_rate,
+            model=args.model,
+            timeout=args.timeout,
+            seed=args.seed,
+            api_key=args.api_key,
+            headers=headers,
+        )
+    )
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    return 0 if report["requests"]["succeeded"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""Client-side entrypoints for a running backend, importable without Modal's image graph.
+
+Importing `backend.py` defines the GPU image, the volumes and the app, and needs
+`modal` itself, which is most of a local command's startup time. Tooling that
+only talks to a running server imports this module instead: `probe`, `smoke_test`
+and `load_test` depend on aiohttp and `jazz_sse` alone, and Modal is only imported
+to look up the URL. `backend.py`'s `test` and `bench` entrypoints call them with
+the URL of the app they started.
+
+```bash
+python client.py chat "What is the capital of France?"
+python client.py chat "Say hi." --url https://your-jazz-endpoint.modal.direct
+python client.py test
+python client.py bench --concurrency 16 --num-requests 128
+```
+
+Check what a command imports, and how long that takes, with `importtime.py`.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+
+import aiohttp
+
+from jazz_sse import aiter_json, delta_text
+from jazz_trace import TRACEPARENT, new_traceparent, parse_traceparent
+
+APP_NAME = "jazz-backend"
+SERVER_CLASS = "Server"
+DEFAULT_SYSTEM = "You are a helpful AI assistant."
+
+
+class IncompleteResponse(Exception):
+    """A stream the server ended with an error event, after sending `text`"""
+
+    def __init__(self, error: dict, text: str):
+        super().__init__(error.get("message") or error.get("type") or "stream error")
+        self.error = error
+        self.text = text
+        self.resumable = bool(error.get("resumable"))
+
+
+def server_url() -> str:
+    """The deployed server's URL, looked up with Modal"""
+    import modal
+
+    server = modal.Cls.from_name(APP_NAME, SERVER_CLASS)
+    return server._experimental_get_flash_urls()[0]
+
+
+async def probe(url, messages, timeout=60 * 60, max_tokens: int | None = None):
+    """Send request with retry logic for startup delays"""
+    deadline = time.time() + timeout
+    async with aiohttp.ClientSession(base_url=url) as session:
+        while time.time() < deadline:
+            try:
+                return await send_request_streaming(session, messages, max_tokens=max_tokens)
+            except asyncio.TimeoutError:
+                await asyncio.sleep(1)
+            except aiohttp.client_exceptions.ClientResponseError as e:
+                if e.status == 503:  # Service Unavailable during startup
+                    await asyncio.sleep(1)
+                    continue
+                raise e
+    raise TimeoutError(f"No response from server within {timeout} seconds")
+
+
+async def send_request_streaming(
+    session: aiohttp.ClientSession,
+    messages: list,
+    timeout: int | None = None,
+    max_tokens: int | None = None,
+):
+    """Stream response from chat completions endpoint"""
+    payload = {"messages": messages, "stream": True, "max_tokens": max_tokens}
+    headers = {"Accept": "text/event-stream", TRACEPARENT: new_traceparent()}
+
+    async with session.post(
+        "/v1/chat/completions", json=payload, headers=headers, timeout=timeout
+    ) as resp:
+        resp.raise_for_status()
+        parts = []
+        error = None
+
+        async for evt in aiter_json(resp.content.iter_any()):
+            if evt.get("error"):  # e.g. a draining gateway cutting the stream off
+                error = evt["error"]
+                break
+            reasoning, content = delta_text(evt)
+            chunk = content or reasoning
+
+            if chunk:
+                print(
+                    chunk,
+                    end="",
+                    flush="\n" in chunk or "." in chunk or len(chunk) > 100,
+                )
+                parts.append(chunk)
+        print()
+        trace_id, _ = parse_traceparent(headers[TRACEPARENT])
+        print(f"trace {trace_id}")
+        if error is not None:
+            raise IncompleteResponse(error, "".join(parts))
+        return "".join(parts)
+
+
+async def smoke_test(
+    url,
+    content: str | None = None,
+    twice: bool = True,
+    timeout: float = 60 * 60,
+    max_tokens: int | None = None,
+    system: str = DEFAULT_SYSTEM,
+):
+    """Wait for the server to answer one request, then check a second gets through"""
+    if content is None:
+        content = "Explain the transformer architecture in one paragraph."
+    messages = [{"role": "system", "content": system}, {"role": "user", "content": content}]
+
+    print(f"Sending messages to {url}:", *messages, sep="\n\t")
+    await probe(url, messages, timeout=timeout, max_tokens=max_tokens)
+
+    if twice:
+        messages[1]["content"] = "What is the capital of France?"
+        print(f"Sending second request to {url}:", *messages, sep="\n\t")
+        await probe(url, messages, timeout=60, max_tokens=max_tokens)
+
+
+async def load_test(url, output: str = "", max_tokens: int | None = None, **kwargs) -> dict:
+    """Wait for the server to come up, then run `bench.run_benchmark` against it"""
+    from bench import run_benchmark
+
+    print(f"Waiting for {url} to come up")
+    await probe(url, [{"role": "user", "content": "Say hi."}], max_tokens=max_tokens)
+
+    report = await run_benchmark(url, **kwargs)
+    text = json.dumps(report, indent=2)
+    if output:
+        Path(output).write_text(text + "\n")
+    print(text)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Talk to a running backend")
+    parser.add_argument("--url", help="Server URL; looked up with Modal if not given")
+    parser.add_argument("--timeout", type=float, default=60 * 60, help="Seconds to wait")
+    parser.add_argument("--max-tokens", type=int)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    chat = commands.add_parser("chat", help="Send one chat request")
+    chat.add_argument("content", help="User message")
+    chat.add_argument("--system", default=DEFAULT_SYSTEM)
+
+    test = commands.add_parser("test", help="Send two requests, as `modal run` does")
+    test.add_argument("--content")
+    test.add_argument("--once", action="store_true", help="Skip the second request")
+
+    bench = commands.add_parser("bench", help="Load-test and print a JSON report")
+    bench.add_argument("--num-requests", type=int, default=64)
+    bench.add_argument("--concurrency", type=int, default=10)  # backend.TARGET_INPUTS
+    bench.add_argument("--input-len", default="512")
+    bench.add_argument("--output-len", default="256")
+    bench.add_argument("--request-rate", type=float, default=0.0)
+    bench.add_argument("--output", default="", help="Also write the report here")
+    args = parser.parse_args()
+
+    url = args.url or server_url()
+    if args.command == "chat":
+        messages = [
+            {"role": "system", "content": args.system},
+            {"role": "user", "content": args.content},
+        ]
+        run = probe(url, messages, args.timeout, args.max_tokens)
+    elif args.command == "test":
+        run = smoke_test(url, args.content, not args.once, args.timeout, args.max_tokens)
+    else:
+        run = load_test(
+            url,
+            args.output,
+            args.max_tokens,
+            num_requests=args.num_requests,
+            concurrency=args.concurrency,
+            input_len=args.input_len,
+            output_len=args.output_len,
+            request_rate=args.request_rate or None,
+        )
+    try:
+        asyncio.run(run)
+    except IncompleteResponse as e:
+        raise SystemExit(f"Response ended early: {e}")
+
+
+if __name__ == "__main__":
+    main()
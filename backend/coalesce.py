@@ -0,0 +1,315 @@
+"""Single-flight coalescing of identical generation requests, in the gateway.
+
+Agent loops and retrying proxies often send the same request again while the
+first is still running, and each copy takes one of SGLang's running slots. For
+deterministic requests, with `temperature: 0` or a fixed `seed`, every copy
+would get the same answer. The gateway fingerprints them by API key, path and
+body. The first becomes the flight's leader and goes through admission to
+SGLang as usual. Copies that arrive while it runs join the flight and get its
+response, chunk by chunk. A late joiner first gets the chunks sent so far
+replayed from the flight's buffer.
+
+Followers take no admission slot and aren't metered, since their tokens were
+generated once. If the leader ends before responding, e.g. it was rejected,
+its followers go through admission themselves. If it ends part way through
+a stream, they get the same resumable error event as a drained stream. If the
+leader's client goes away, the leader keeps reading the response for its
+followers. Once a response outgrows the buffer, nobody new joins, and a
+follower that falls that far behind is cut off with the same error event.
+`/gateway/stats` reports the counts under `coalesce`, with `dedup_ratio`, the
+share of generation requests served from another request's flight.
+
+To compare duplicate-heavy traffic with and without it, against the mock server:
+
+```bash
+python coalesce.py --demo 64 --copies 4
+```
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import sys
+import time
+from dataclasses import dataclass
+
+COALESCED_HEADER = "X-Jazz-Coalesced"  # on followers' responses
+
+_dumps = json.JSONEncoder(sort_keys=True, separators=(",", ":")).encode
+
+
+@dataclass
+class CoalesceConfig:
+    max_buffer_bytes: int = 16 << 20  # of one flight's response; past it, nobody new joins
+    # and a follower this far behind the leader is cut off
+    max_followers: int = 64  # per flight
+
+
+def deterministic(body: dict) -> bool:
+    """Whether every copy of the request would get the same single completion"""
+    if body.get("n") not in (None, 1):
+        return False
+    return body.get("temperature") == 0 or body.get("seed") is not None
+
+
+def fingerprint(key: str, path: str, body: dict) -> str | None:
+    """An id shared by identical deterministic requests from one key, else None"""
+    if not deterministic(body):
+        return None
+    return hashlib.sha256(f"{key} {path} ".encode() + _dumps(body).encode()).hexdigest()
+
+
+class Overrun(Exception):
+    """A follower fell so far behind that its next chunks were no longer buffered"""
+
+
+class Flight:
+    """One upstream response, fanned out to every request that joined it
+
+    Chunks are buffered for late joiners until the response outgrows
+    `max_buffer_bytes`. From then on nobody new joins, and only the chunks some
+    follower still has to be sent are kept. A follower that lags more than
+    `max_buffer_bytes` behind the leader is dropped with `Overrun`.
+    """
+
+    __slots__ = (
+        "fingerprint",
+        "max_buffer_bytes",
+        "status",
+        "headers",
+        "chunks",
+        "base",
+        "size",
+        "buffered",
+        "done",
+        "complete",
+        "followers",
+        "joinable",
+        "_cursors",
+        "_changed",
+    )
+
+    def __init__(self, fingerprint: str, max_buffer_bytes: int = 16 << 20):
+        self.fingerprint = fingerprint
+        self.max_buffer_bytes = max_buffer_bytes
+        self.status: int | None = None  # set when the upstream response starts
+        self.headers: dict[str, str] = {}
+        self.chunks: list[bytes] = []
+        self.base = 0  # the index in the response of chunks[0]
+        self.size = 0  # bytes published
+        self.buffered = 0  # bytes in `chunks`
+        self.done = False
+        self.complete = False  # the whole response went through
+        self.followers = 0
+        self.joinable = True
+        self._cursors: dict[object, int] = {}  # per attached follower, its next chunk
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def start(self, status: int, headers: dict[str, str]):
+        self.status = status
+        self.headers = headers
+        self._notify()
+
+    def publish(self, chunk: bytes):
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        self.buffered += len(chunk)
+        if self.buffered > self.max_buffer_bytes:
+            self.joinable = False  # a new follower couldn't be sent the start
+            self._trim()
+            if self.buffered > self.max_buffer_bytes:
+                slowest = min(self._cursors.values(), default=None)
+                for follower, cursor in list(self._cursors.items()):
+                    if cursor == slowest:
+                        del self._cursors[follower]  # its replay raises Overrun
+                self._trim()
+        self._notify()
+
+    def _trim(self):
+        """Drop the chunks every follower has been sent, once nobody new can join"""
+        if self.joinable:
+            return  # a new follower needs the first chunk
+        sent = min(self._cursors.values(), default=self.base + len(self.chunks))
+        if sent > self.base:
+            dropped = self.chunks[: sent - self.base]
+            del self.chunks[: sent - self.base]
+            self.buffered -= sum(map(len, dropped))
+            self.base = sent
+
+    def finish(self, complete: bool):
+        self.done = True
+        self.complete = complete
+        self.joinable = False
+        self._trim()
+        self._notify()
+
+    @property
+    def attached(self) -> int:
+        """Followers still being sent the response"""
+        return len(self._cursors)
+
+    def attach(self) -> object:
+        """Start a follower at the first chunk; call before yielding to the event loop"""
+        follower = object()
+        self._cursors[follower] = self.base
+        return follower
+
+    def leave(self, follower: object):
+        """A follower is done with the response, or went away"""
+        self._cursors.pop(follower, None)
+        self._trim()
+
+    async def started(self) -> bool:
+        """Wait for the leader's response to start; False if it ended without one"""
+        while self.status is None and not self.done:
+            await self._changed.wait()
+        return self.status is not None
+
+    async def replay(self, follower: object):
+        """Every chunk of the response for an attached follower, as they arrive"""
+        while True:
+            if follower not in self._cursors:
+                raise Overrun(f"more than {self.max_buffer_bytes} bytes behind")
+            sent = self._cursors[follower]
+            if sent < self.base + len(self.chunks):
+                self._cursors[follower] = sent + 1
+                yield self.chunks[sent - self.base]
+            elif self.done:
+                return
+            else:
+                await self._changed.wait()
+
+
+class Coalescer:
+    """In-flight requests by fingerprint. Not thread-safe: use it from one event loop."""
+
+    def __init__(self, config: CoalesceConfig | None = None):
+        self.config = config or CoalesceConfig()
+        self.flights: dict[str, Flight] = {}
+        self.counters = dict.fromkeys(
+            ("requests", "eligible", "leaders", "followers", "late_joins", "fallbacks"), 0
+        )
+
+    def fingerprint(self, key: str, path: str, body: dict) -> str | None:
+        self.counters["requests"] += 1
+        fp = fingerprint(key, path, body)
+        if fp is not None:
+            self.counters["eligible"] += 1
+        return fp
+
+    def join(self, fp: str) -> tuple[Flight, bool]:
+        """The flight for `fp`, and whether the caller leads it"""
+        flight = self.flights.get(fp)
+        if (
+            flight is not None
+            and flight.joinable
+            and flight.followers < self.config.max_followers
+        ):
+            flight.followers += 1
+            self.counters["followers"] += 1
+            self.counters["late_joins"] += bool(flight.chunks)
+            return flight, False
+        flight = self.flights[fp] = Flight(fp, self.config.max_buffer_bytes)
+        self.counters["leaders"] += 1
+        return flight, True
+
+    def land(self, flight: Flight, complete: bool):
+        """The leader is done with `flight`; nobody joins it from now on"""
+        flight.finish(complete)
+        if self.flights.get(flight.fingerprint) is flight:
+            del self.flights[flight.fingerprint]
+
+    def fallback(self):
+        """Count a follower whose leader ended without a response"""
+        self.counters["followers"] -= 1
+        self.counters["fallbacks"] += 1
+
+    def stats(self) -> dict:
+        requests = self.counters["requests"]
+        followers = self.counters["followers"]
+        return {
+            "flights": len(self.flights),
+            **self.counters,
+            "dedup_ratio": round(followers / requests, 4) if requests else None,
+        }
+
+
+async def _demo(unique: int, copies: int, concurrency: int) -> dict:
+    """Duplicate requests through the gateway to the mock server, with and without"""
+    import aiohttp
+    from aiohttp import web
+
+    import gateway
+    import mock_server
+    from jazz_sse import aiter_json
+
+    async def serve(app) -> tuple[web.AppRunner, str]:
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", 0).start()
+        host, port = runner.addresses[0][:2]
+        return runner, f"http://{host}:{port}"
+
+    results = {}
+    for name, coalescer in (("off", None), ("on", Coalescer())):
+        config = mock_server.MockConfig(max_running_requests=concurrency // 2, seed=0)
+        mock, mock_url = await serve(mock_server.make_app(config))
+        admission = gateway.AdmissionConfig(
+            max_concurrency=concurrency // 2, per_key_concurrency=concurrency * copies
+        )
+        controller = gateway.AdmissionController(admission)
+        app = gateway.make_app(mock_url, controller, coalescer=coalescer)
+        front, url = await serve(app)
+        latencies = []
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(session: aiohttp.ClientSession, i: int):
+            payload = {
+                "messages": [{"role": "user", "content": f"task {i // copies}: go on"}],
+                "stream": True,
+                "temperature": 0,
+                "max_tokens": 64,
+            }
+            async with semaphore:
+                start = time.perf_counter()
+                async with session.post(url + "/v1/chat/completions", json=payload) as r:
+                    async for _ in aiter_json(r.content.iter_any()):
+                        pass
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        async with aiohttp.ClientSession() as session:
+            await asyncio.gather(*(one(session, i) for i in range(unique * copies)))
+        wall = time.perf_counter() - start
+        latencies.sort()
+        results[name] = {
+            "requests": len(latencies),
+            "upstream_requests": controller.counters["admitted"],
+            "wall_s": round(wall, 2),
+            "latency_s_p50": round(latencies[len(latencies) // 2], 3),
+            "latency_s_max": round(latencies[-1], 3),
+            **({"coalesce": coalescer.stats()} if coalescer else {}),
+        }
+        await front.cleanup()
+        await mock.cleanup()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--demo", type=int, required=True, help="Distinct requests to send")
+    parser.add_argument("--copies", type=int, default=4, help="Identical copies of each")
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    report = asyncio.run(_demo(args.demo, args.copies, args.concurrency))
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""Manifest for the prebuilt DeepGEMM kernel cache.
+
+Kernels JIT-compiled by DeepGEMM are only reusable for the exact image, SGLang
+source commit, patch, model, parallelism, and shape-relevant server config they
+were built with. The image checks out a pull request branch, so its tag alone
+doesn't pin the SGLang source.
+`warm_deep_gemm` in `backend.py` records those in a manifest next to the cache,
+and `Server` checks the manifest on startup, so a stale cache is reported
+rather than silently recompiled.
+
+To inspect a cache directory, e.g. a local copy of the `deepgemm-cache` Volume:
+
+```bash
+python dg_cache.py /path/to/deep_gemm --config config.yaml --patch glm5_support.patch \
+    --sglang /path/to/sglang
+```
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import time
+from pathlib import Path
+
+MANIFEST_NAME = "jazz_manifest.json"
+KERNEL_DIR = "cache"
+SGLANG_SOURCE = "/sgl-workspace/sglang"  # the checkout in the image
+
+# server options that don't change which kernels get compiled
+IRRELEVANT_OPTIONS = {
+    "host",
+    "port",
+    "served-model-name",
+    "load-format",
+    "log-level",
+    "dist-timeout",
+    "enable-metrics",
+    "collect-tokens-histogram",
+    "enable-cache-report",
+    "tool-call-parser",
+    "reasoning-parser",
+    "trust-remote-code",
+}
+
+
+def sha256_file(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_commit(repo=SGLANG_SOURCE) -> str | None:
+    """The commit checked out in a git repo, or None if it isn't one"""
+    try:
+        result = subprocess.run(
+            ["git", "-C", str(repo), "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def config_hash(options: dict) -> str:
+    """Hash the kernel-relevant server options"""
+    relevant = {
+        key: value for key, value in options.items() if key not in IRRELEVANT_OPTIONS
+    }
+    blob = json.dumps(relevant, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def cache_key(
+    image: str,
+    patch_path,
+    options: dict,
+    repo_id: str,
+    gpu_count: int,
+    sglang_source=SGLANG_SOURCE,
+) -> dict:
+    """Everything the compiled kernels depend on, given the merged server options"""
+    return {
+        "image": image,
+        "sglang_commit": source_commit(sglang_source),
+        "patch_sha256": sha256_file(patch_path),
+        "config_sha256": config_hash(options),
+        "repo_id": repo_id,
+        "gpu_count": gpu_count,
+        "env": {
+            key: value
+            for key, value in sorted(os.environ.items())
+            if key.startswith("SGLANG_JIT_DEEPGEMM") or key.startswith("DG_")
+        },
+    }
+
+
+def list_kernels(cache_dir) -> set[str]:
+    """Names of the compiled kernels in the cache"""
+    kernel_dir = Path(cache_dir) / KERNEL_DIR
+    if not kernel_dir.is_dir():
+        return set()
+    return {entry.name for entry in kernel_dir.iterdir() if entry.is_dir()}
+
+
+def write_manifest(cache_dir, key: dict) -> dict:
+    manifest = {
+        "key": key,
+        "created_at": time.time(),
+        "kernels": sorted(list_kernels(cache_dir)),
+    }
+    path = Path(cache_dir) / MANIFEST_NAME
+    path.write_text(json.dumps(manifest, indent=2) + "\n")
+    return manifest
+
+
+def read_manifest(cache_dir) -> dict | None:
+    path = Path(cache_dir) / MANIFEST_NAME
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text())
+    except json.JSONDecodeError:
+        return None
+
+
+def validate(cache_dir, key: dict) -> dict:
+    """Compare the cache's manifest against the live configuration.
+
+    Status is "hit" if the manifest matches and all its kernels are present,
+    "stale" if the key differs, "partial" if kernels are missing,
+    and "missing" if the cache was never warmed."""
+    manifest = read_manifest(cache_dir)
+    present = list_kernels(cache_dir)
+    if manifest is None:
+        return {"status": "missing", "mismatched": [], "kernels_present": len(present)}
+
+    mismatched = sorted(
+        field
+        for field in key.keys() | manifest["key"].keys()
+        if key.get(field) != manifest["key"].get(field)
+    )
+    expected = set(manifest.get("kernels", []))
+    absent = expected - present
+    if mismatched:
+        status = "stale"
+    elif absent:
+        status = "partial"
+    else:
+        status = "hit"
+
+    return {
+        "status": status,
+        "mismatched": mismatched,
+        "kernels_expected": len(expected),
+        "kernels_present": len(present),
+        "kernels_absent": len(absent),
+        "warmed_at": manifest.get("created_at"),
+    }
+
+
+def compare_kernels(before: set[str], after: set[str]) -> dict:
+    """Kernels reused from the cache vs compiled during startup"""
+    return {"hits": len(before & after), "misses": len(after - before)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a DeepGEMM cache against a config")
+    parser.add_argument("cache_dir")
+    parser.add_argument("--config", default=Path(__file__).parent / "config.yaml")
+    parser.add_argument("--patch", default=Path(__file__).parent / "glm5_support.patch")
+    parser.add_argument("--image", default="lmsysorg/sglang:v0.5.8")
+    parser.add_argument("--repo-id", default="zai-org/GLM-5-FP8")
+    parser.add_argument("--gpu-count", type=int, default=8)
+    parser.add_argument("--sglang", default=SGLANG_SOURCE, help="The SGLang checkout")
+    args = parser.parse_args()
+
+    from server_config import ServerConfig, default_options
+
+    # the same merge of defaults, YAML, and env that `backend.py` does
+    defaults = default_options(args.repo_id, args.gpu_count, port=8000)
+    options = ServerConfig.load(defaults, args.config).options
+    key = cache_key(
+        args.image, args.patch, options, args.repo_id, args.gpu_count, args.sglang
+    )
+    print(json.dumps(validate(args.cache_dir, key), indent=2))
+
+
+if __name__ == "__main__":
+    main()
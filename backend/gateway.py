@@ -0,0 +1,807 @@
+"""Admission control in front of SGLang, inside the `Server` container.
+
+SGLang queues everything past `max-running-requests` first come, first served,
+so a burst from an agent loop or a batch job puts interactive chats behind it.
+The gateway sits on the public port and proxies to SGLang, admitting
+generation requests by:
+
+- priority class: `interactive` requests (the default) go ahead of `batch`
+  ones, chosen with the `X-Jazz-Priority` header
+- a per-API-key limit on requests in flight or queued
+- a budget of estimated tokens in flight, where a request costs its prompt
+  length (about four characters per token) plus its `max_tokens`
+- bounded queues and wait times, past which requests get a fast 429 with a
+  `Retry-After` estimate instead of waiting in SGLang's queue
+
+Everything else (`/health`, `/v1/models`, `/metrics`, ...) is passed through.
+
+On shutdown, `Gateway.drain` stops admitting requests, fails `/health`, and
+waits for in-flight streams up to a budget. Streams still running after that
+are cut off with a final SSE error event marked `resumable`, so clients can
+resend the request, with what they already received, to another replica.
+
+To try it against the mock server:
+
+```bash
+python mock_server.py --port 8001 --max-running-requests 8
+python gateway.py --upstream http://localhost:8001 --port 8000 --max-concurrency 8
+python bench.py http://localhost:8000 --concurrency 32 --header "X-Jazz-Priority: batch" &
+python bench.py http://localhost:8000 --concurrency 2 --num-requests 16
+```
+
+Sending the gateway SIGTERM drains it the same way `Server.stop` does.
+
+With a `metering.Meter`, token usage per API key is counted from responses as
+they stream past and appended to a log; callers see their own usage at
+`/gateway/usage`, from every replica's log if the meter is `shared`.
+
+With a `jazz_trace.SpanRecorder`, each generation request gets a span stamped
+when it's received, admitted, and sends its first and last tokens. Requests to
+SGLang carry a `traceparent` with the gateway's span as parent, and so do
+responses, so callers can find their trace at `/gateway/traces?trace=<id>`.
+
+With a `coalesce.Coalescer`, identical deterministic requests in flight at the
+same time share one generation; see `coalesce.py`.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import signal
+import threading
+import time
+from dataclasses import dataclass
+
+import aiohttp
+from aiohttp import web
+
+from coalesce import COALESCED_HEADER, Coalescer, Flight, Overrun
+from jazz_trace import FLUSH_INTERVAL, TRACEPARENT, Span, SpanRecorder
+from metering import Meter, UsageScanner
+
+GATEWAY_PORT = 8000
+DRAIN_BUDGET = 20.0  # seconds to let in-flight streams finish on shutdown
+CUT_OFF_GRACE = 5.0  # seconds for the streams still running to send their error
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+PRIORITY_HEADER = "X-Jazz-Priority"
+
+# generation endpoints go through admission; everything else is proxied as-is
+ADMITTED_PATHS = {"/v1/chat/completions", "/v1/completions", "/generate"}
+HEALTH_PATHS = {"/health", "/health_generate"}
+
+HOP_BY_HOP = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+    "host",
+    "content-length",
+}
+
+
+def prompt_chars(body: dict) -> int:
+    """Characters of prompt text in a chat or completions request"""
+    chars = 0
+    for message in body.get("messages") or []:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = " ".join(str(part.get("text", "")) for part in content)
+        chars += len(str(content))
+    return chars + len(str(body.get("prompt") or ""))
+
+
+@dataclass
+class AdmissionConfig:
+    max_concurrency: int = 32  # requests in flight upstream
+    token_budget: int = 1_000_000  # estimated prompt + output tokens in flight
+    per_key_concurrency: int = 8  # in flight or queued, per API key
+    max_queue_interactive: int = 64
+    max_queue_batch: int = 256
+    max_wait_interactive: float = 30.0  # seconds in the queue before a 429
+    max_wait_batch: float = 600.0
+    default_max_tokens: int = 2048  # output tokens assumed when max_tokens is unset
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str, retry_after: float, status: int = 429):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status = status
+
+
+@dataclass
+class Ticket:
+    key: str
+    priority: str
+    cost: int
+    enqueued_at: float
+    admitted_at: float | None = None
+
+
+class AdmissionController:
+    """Priority queue with concurrency, per-key, and token budget limits.
+
+    Not thread-safe: use it from a single event loop."""
+
+    def __init__(self, config: AdmissionConfig | None = None):
+        self.config = config or AdmissionConfig()
+        self.in_flight = 0
+        self.tokens_in_flight = 0
+        self.per_key: dict[str, int] = {}
+        self.queued = dict.fromkeys(PRIORITIES, 0)
+        self._heap: list[tuple[int, int, Ticket, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._service_time = 1.0  # moving average of seconds per admitted request
+        self.counters = {"admitted": 0, "rejected": 0, "timed_out": 0, "completed": 0}
+
+    def cost(self, body: dict) -> int:
+        """Estimated tokens a request will hold while it runs"""
+        max_tokens = (
+            body.get("max_completion_tokens")
+            or body.get("max_tokens")
+            or self.config.default_max_tokens
+        )
+        # a request bigger than the whole budget still runs, just on its own
+        return min(prompt_chars(body) // 4 + int(max_tokens), self.config.token_budget)
+
+    def retry_after(self, queued: int) -> float:
+        slots = max(1, self.config.max_concurrency)
+        return max(1.0, math.ceil(self._service_time * (queued + 1) / slots))
+
+    def _fits(self, cost: int) -> bool:
+        if self.in_flight >= self.config.max_concurrency:
+            return False
+        within_budget = self.tokens_in_flight + cost <= self.config.token_budget
+        return self.in_flight == 0 or within_budget
+
+    def _grant(self, ticket: Ticket):
+        ticket.admitted_at = time.monotonic()
+        self.in_flight += 1
+        self.tokens_in_flight += ticket.cost
+        self.counters["admitted"] += 1
+
+    async def acquire(self, key: str, priority: str, cost: int) -> Ticket:
+        """Wait for admission, or raise `Rejected`"""
+        config = self.config
+        if self.per_key.get(key, 0) >= config.per_key_concurrency:
+            self.counters["rejected"] += 1
+            raise Rejected(
+                f"Too many concurrent requests for this API key "
+                f"(limit {config.per_key_concurrency})",
+                self.retry_after(0),
+            )
+
+        ticket = Ticket(key, priority, cost, time.monotonic())
+        # only skip the queue if nobody of equal or higher priority is waiting
+        rank = PRIORITIES[priority]
+        ahead = sum(n for p, n in self.queued.items() if PRIORITIES[p] <= rank)
+        if not ahead and self._fits(cost):
+            self._grant(ticket)
+            self.per_key[key] = self.per_key.get(key, 0) + 1
+            return ticket
+
+        max_queue = getattr(config, f"max_queue_{priority}")
+        if self.queued[priority] >= max_queue:
+            self.counters["rejected"] += 1
+            raise Rejected(
+                f"Server is at capacity ({priority} queue full)",
+                self.retry_after(sum(self.queued.values())),
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (PRIORITIES[priority], next(self._seq), ticket, future))
+        self.queued[priority] += 1
+        self.per_key[key] = self.per_key.get(key, 0) + 1
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(future), getattr(config, f"max_wait_{priority}")
+            )
+        except asyncio.TimeoutError:
+            self._abandon(ticket, future)
+            self.counters["timed_out"] += 1
+            raise Rejected(
+                f"Timed out waiting for capacity ({priority})",
+                self.retry_after(sum(self.queued.values())),
+            ) from None
+        except asyncio.CancelledError:  # the client went away while queued
+            self._abandon(ticket, future)
+            raise
+        return ticket
+
+    def _abandon(self, ticket: Ticket, future: asyncio.Future):
+        if future.done() and not future.cancelled():
+            if future.exception() is not None:
+                return  # rejected by reject_queued, which already accounted for it
+            self.release(ticket)  # admitted just as we gave up: hand the slot back
+            return
+        future.cancel()
+        self.queued[ticket.priority] -= 1
+        self._release_key(ticket.key)
+
+    def reject_queued(self, reason: str, retry_after: float = 1.0):
+        """Fail every queued request with a 503, e.g. because we're shutting down"""
+        while self._heap:
+            _, _, ticket, future = heapq.heappop(self._heap)
+            if future.done():
+                continue
+            self.queued[ticket.priority] -= 1
+            self._release_key(ticket.key)
+            self.counters["rejected"] += 1
+            future.set_exception(Rejected(reason, retry_after, status=503))
+
+    def _release_key(self, key: str):
+        remaining = self.per_key.get(key, 0) - 1
+        if remaining > 0:
+            self.per_key[key] = remaining
+        else:
+            self.per_key.pop(key, None)
+
+    def release(self, ticket: Ticket):
+        """Return an admitted request's slot and tokens, and admit whoever fits next"""
+        self.in_flight -= 1
+        self.tokens_in_flight -= ticket.cost
+        self._release_key(ticket.key)
+        self.counters["completed"] += 1
+        if ticket.admitted_at is not None:
+            elapsed = time.monotonic() - ticket.admitted_at
+            self._service_time = 0.9 * self._service_time + 0.1 * elapsed
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._heap:
+            _, _, ticket, future = self._heap[0]
+            if future.done():  # timed out or cancelled; already accounted for
+                heapq.heappop(self._heap)
+                continue
+            if not self._fits(ticket.cost):
+                return  # strict priority order, so big prompts aren't starved
+            heapq.heappop(self._heap)
+            self.queued[ticket.priority] -= 1
+            self._grant(ticket)
+            future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "tokens_in_flight": self.tokens_in_flight,
+            "queued": dict(self.queued),
+            "keys_active": len(self.per_key),
+            "service_time_s": round(self._service_time, 3),
+            **self.counters,
+        }
+
+
+class Stream:
+    """An admitted request being proxied, as seen by `Drainer`"""
+
+    __slots__ = ("task", "response", "scanner", "aborted")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.response: web.StreamResponse | None = None
+        self.scanner: UsageScanner | None = None
+        self.aborted = False
+
+    @property
+    def events(self) -> int:
+        """SSE events sent so far, about one token each"""
+        return 0 if self.scanner is None else self.scanner.events
+
+
+class Drainer:
+    """Tracks in-flight streams so a shutdown can wait for them, then cut off the rest"""
+
+    def __init__(self, controller: AdmissionController):
+        self.controller = controller
+        self.draining = False
+        self.streams: set[Stream] = set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.counters = {
+            "drain_duration_s": None,
+            "drained_streams": 0,  # finished on their own during the drain
+            "aborted_streams": 0,
+            "aborted_tokens": 0,
+        }
+
+    def track(self) -> Stream:
+        stream = Stream(asyncio.current_task())
+        self.streams.add(stream)
+        self._idle.clear()
+        return stream
+
+    def untrack(self, stream: Stream):
+        self.streams.discard(stream)
+        if not self.streams:
+            self._idle.set()
+
+    async def drain(self, budget: float = DRAIN_BUDGET, grace: float = CUT_OFF_GRACE) -> dict:
+        """Stop admitting, wait up to `budget` seconds for streams, then abort the rest"""
+        started = time.monotonic()
+        self.draining = True
+        self.controller.reject_queued("Server is shutting down")
+        in_flight = len(self.streams)
+        try:
+            await asyncio.wait_for(self._idle.wait(), budget)
+        except asyncio.TimeoutError:
+            pass
+
+        aborted = list(self.streams)
+        for stream in aborted:
+            stream.aborted = True
+            stream.task.cancel()  # closes the upstream connection, so SGLang aborts too
+        if aborted:
+            try:
+                await asyncio.wait_for(self._idle.wait(), grace)
+            except asyncio.TimeoutError:
+                pass
+
+        self.counters.update(
+            drain_duration_s=round(time.monotonic() - started, 3),
+            drained_streams=in_flight - len(aborted),
+            aborted_streams=len(aborted),
+            aborted_tokens=sum(stream.events for stream in aborted),
+        )
+        return self.stats()
+
+    async def cut_off(
+        self,
+        request: web.Request,
+        stream: Stream,
+        message: str = "Server is shutting down; resend the request to resume",
+        kind: str = "server_shutdown",
+    ) -> web.StreamResponse:
+        """End an aborted request with an error the client can resume from"""
+        error = {
+            "message": message,
+            "type": kind,
+            "code": 503,
+            "resumable": True,
+            "tokens_streamed": stream.events,
+        }
+        resp = stream.response
+        if resp is None:  # nothing sent yet
+            headers = {"Retry-After": "1"}
+            return web.json_response({"error": error}, status=503, headers=headers)
+        return await end_with_error(resp, error)
+
+    def stats(self) -> dict:
+        return {"draining": self.draining, "streams": len(self.streams), **self.counters}
+
+
+def api_key_id(request: web.Request) -> str:
+    """A short, non-reversible id for the caller's API key"""
+    auth = request.headers.get("Authorization", "")
+    token = auth.removeprefix("Bearer ").strip() or "anonymous"
+    return hashlib.sha256(token.encode()).hexdigest()[:12]
+
+
+async def end_with_error(resp: web.StreamResponse, error: dict) -> web.StreamResponse:
+    """End a response whose headers are already sent, with an error event if it's SSE"""
+    if resp.content_type == "text/event-stream":
+        await resp.write(b"data: " + json.dumps({"error": error}).encode() + b"\n\n")
+        await resp.write(b"data: [DONE]\n\n")
+    await resp.write_eof()
+    return resp
+
+
+def error_response(status: int, message: str, kind: str, retry_after: float | None = None):
+    headers = {"Retry-After": str(int(retry_after))} if retry_after is not None else None
+    return web.json_response(
+        {"error": {"message": message, "type": kind, "code": status}},
+        status=status,
+        headers=headers,
+    )
+
+
+def make_app(
+    upstream: str,
+    controller: AdmissionController | None = None,
+    routes: dict[str, str] | None = None,
+    meter: Meter | None = None,
+    tracer: SpanRecorder | None = None,
+    coalescer: Coalescer | None = None,
+) -> web.Application:
+    """Proxy to `upstream`, admitting generation requests through `controller`.
+
+    `routes` maps extra paths to other local URLs, e.g. `/load` to the metrics sidecar.
+    Token usage is counted in `meter`, requests are traced in `tracer`, and identical
+    ones coalesced in `coalescer`, if given."""
+    controller = controller or AdmissionController()
+    routes = routes or {}
+    upstream = upstream.rstrip("/")
+    app = web.Application(client_max_size=64 * 1024**2)
+    app["controller"] = controller
+    app["meter"] = meter
+    app["tracer"] = tracer
+    logs = [log for log in (meter, tracer) if log is not None]
+
+    async def flush_logs():
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            for log in logs:
+                log.flush()
+            if meter is not None and meter.reload is not None:
+                await asyncio.to_thread(meter.reload_peers)  # after the flush closed our log
+
+    async def start_session(app):
+        app["drainer"] = Drainer(controller)
+        if logs:
+            app["flusher"] = asyncio.create_task(flush_logs())
+        app["session"] = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=10),
+            auto_decompress=False,
+        )
+
+    async def close_session(app):
+        if logs:
+            app["flusher"].cancel()
+            for log in logs:
+                log.flush()
+        await app["session"].close()
+
+    async def usage(request):
+        """The caller's usage on every replica sharing the meter's logs, by key id,
+        optionally `?since=&until=&bucket=` seconds"""
+        if meter is None:
+            return error_response(404, "Usage metering is off", "invalid_request_error")
+        try:
+            since, until, bucket = (
+                float(request.query[name]) if name in request.query else None
+                for name in ("since", "until", "bucket")
+            )
+        except ValueError:
+            message = "since, until and bucket must be numbers"
+            return error_response(400, message, "invalid_request_error")
+        key = api_key_id(request)
+        rows = meter.query(key, since, until, int(bucket) if bucket else None)
+        return web.json_response({"key": key, "usage": rows})
+
+    async def traces(request):
+        """Recent spans, optionally just those of `?trace=<id>`"""
+        if tracer is None:
+            return error_response(404, "Tracing is off", "invalid_request_error")
+        return web.json_response({"spans": tracer.query(request.query.get("trace"))})
+
+    async def stats(request):
+        report = {**controller.stats(), "drain": request.app["drainer"].stats()}
+        if coalescer is not None:
+            report["coalesce"] = coalescer.stats()
+        return web.json_response(report)
+
+    async def proxy(request: web.Request) -> web.StreamResponse:
+        if request.method != "POST" or request.path not in ADMITTED_PATHS:
+            return await forward(request)
+        span = None
+        if tracer is not None:
+            span = tracer.start("gateway", request.headers.get(TRACEPARENT))
+        try:
+            if coalescer is None:
+                resp = await forward(request, span)
+            else:
+                resp = await coalesce(request, span)
+            if span is not None:
+                span.status = resp.status
+            return resp
+        finally:
+            if span is not None:
+                tracer.finish(span)
+
+    async def coalesce(request: web.Request, span: Span | None) -> web.StreamResponse:
+        """Lead a flight of identical requests, follow one, or go alone"""
+        body = await request.read()
+        try:
+            request["payload"] = payload = json.loads(body) if body else {}
+        except json.JSONDecodeError:
+            payload = {}
+        fp = coalescer.fingerprint(api_key_id(request), request.path, payload)
+        if fp is None or request.app["drainer"].draining:
+            return await forward(request, span)
+        flight, leader = coalescer.join(fp)
+        if leader:
+            try:
+                return await forward(request, span, flight)
+            finally:
+                if not flight.done:
+                    coalescer.land(flight, complete=False)
+        resp = await follow(request, span, flight)
+        if resp is None:  # the leader ended without a response, e.g. it was rejected
+            coalescer.fallback()
+            return await forward(request, span)
+        return resp
+
+    async def follow(request: web.Request, span: Span | None, flight: Flight):
+        """Stream the leader's response, or None if it ended before responding"""
+        drainer: Drainer = request.app["drainer"]
+        stream = drainer.track()
+        follower = flight.attach()
+        try:
+            if not await flight.started():
+                return None
+            if span is not None:
+                span.mark("admitted")
+            resp = web.StreamResponse(
+                status=flight.status, headers={**flight.headers, COALESCED_HEADER: "1"}
+            )
+            if span is not None:
+                resp.headers[TRACEPARENT] = span.traceparent
+            await resp.prepare(request)
+            stream.response = resp
+            streaming = resp.content_type == "text/event-stream"
+            scanner = stream.scanner = UsageScanner(streaming)
+            try:
+                async for chunk in flight.replay(follower):
+                    if span is not None and span.first_token is None:
+                        span.mark("first_token")
+                    await resp.write(chunk)
+                    scanner.feed(chunk)
+            except Overrun:
+                message = "This request fell behind the one it joined; resend it to resume"
+                return await drainer.cut_off(request, stream, message, "server_error")
+            if not flight.complete:
+                message = "The request this one joined ended early; resend it to resume"
+                return await drainer.cut_off(request, stream, message, "server_error")
+            await resp.write_eof()
+            return resp
+        except asyncio.CancelledError:
+            if not stream.aborted:
+                raise
+            asyncio.current_task().uncancel()
+            return await drainer.cut_off(request, stream)
+        finally:
+            flight.leave(follower)
+            drainer.untrack(stream)
+            if span is not None and stream.scanner:
+                span.events = stream.scanner.events
+
+    async def forward(
+        request: web.Request, span: Span | None = None, flight: Flight | None = None
+    ) -> web.StreamResponse:
+        body = await request.read()
+        target = routes.get(request.path, upstream + request.path_qs)
+        drainer: Drainer = request.app["drainer"]
+        ticket = stream = key = None
+
+        if drainer.draining and request.path in HEALTH_PATHS:
+            return web.Response(status=503, text="Server is shutting down")
+
+        if request.method == "POST" and request.path in ADMITTED_PATHS:
+            if drainer.draining:
+                message = "Server is shutting down"
+                return error_response(503, message, "server_shutdown", 1)
+            if "payload" in request:  # parsed by coalesce()
+                payload = request["payload"]
+            else:
+                try:
+                    payload = json.loads(body) if body else {}
+                except json.JSONDecodeError:
+                    payload = {}
+            priority = request.headers.get(PRIORITY_HEADER, "interactive").lower()
+            if priority not in PRIORITIES:
+                message = f"{PRIORITY_HEADER} must be one of {list(PRIORITIES)}"
+                return error_response(400, message, "invalid_request_error")
+            key = api_key_id(request)
+            try:
+                ticket = await controller.acquire(key, priority, controller.cost(payload))
+            except Rejected as e:
+                kind = "rate_limit_error" if e.status == 429 else "server_shutdown"
+                return error_response(e.status, e.reason, kind, e.retry_after)
+            if request.transport is None or request.transport.is_closing():
+                controller.release(ticket)  # the client gave up while queued
+                return web.Response(status=499)
+            stream = drainer.track()
+            if span is not None:
+                span.mark("admitted")
+
+        resp = None
+        detached = False  # the leader's client left, with followers still reading
+        try:
+            headers = {
+                name: value
+                for name, value in request.headers.items()
+                if name.lower() not in HOP_BY_HOP
+            }
+            if span is not None:  # SGLang's requests are children of the gateway's span
+                headers = {n: v for n, v in headers.items() if n.lower() != TRACEPARENT}
+                headers[TRACEPARENT] = span.traceparent
+            async with request.app["session"].request(
+                request.method, target, headers=headers, data=body
+            ) as upstream_resp:
+                response_headers = {
+                    name: value
+                    for name, value in upstream_resp.headers.items()
+                    if name.lower() not in HOP_BY_HOP
+                }
+                if flight is not None:
+                    flight.start(upstream_resp.status, response_headers)
+                resp = web.StreamResponse(
+                    status=upstream_resp.status, headers=response_headers
+                )
+                if span is not None:
+                    resp.headers[TRACEPARENT] = span.traceparent
+                await resp.prepare(request)
+                if stream is None:
+                    async for chunk in upstream_resp.content.iter_any():
+                        await resp.write(chunk)
+                else:
+                    stream.response = resp
+                    streaming = upstream_resp.content_type == "text/event-stream"
+                    scanner = stream.scanner = UsageScanner(streaming)
+                    chunks = upstream_resp.content.iter_any()
+
+                    async def send(chunk: bytes):
+                        nonlocal detached
+                        if flight is not None:
+                            flight.publish(chunk)
+                        scanner.feed(chunk)
+                        if detached:
+                            if not flight.attached:
+                                raise ConnectionResetError("Every client went away")
+                            return
+                        try:
+                            await resp.write(chunk)
+                        except ConnectionResetError:
+                            if flight is None or not flight.attached:
+                                raise
+                            detached = True  # generate the rest for the followers
+
+                    async for chunk in chunks:
+                        if span is not None:
+                            span.mark("first_token")
+                        await send(chunk)
+                        break
+                    async for chunk in chunks:
+                        await send(chunk)
+                    if span is not None:
+                        span.mark("last_token")
+                    if flight is not None:
+                        coalescer.land(flight, complete=True)
+                if not detached:
+                    await resp.write_eof()
+                return resp
+        except asyncio.CancelledError:
+            if stream is None or not stream.aborted:
+                raise
+            asyncio.current_task().uncancel()  # we cancelled it ourselves, in drain()
+            if detached:
+                return resp
+            return await drainer.cut_off(request, stream)
+        except (
+            aiohttp.ClientConnectionError,
+            aiohttp.ClientPayloadError,
+            ConnectionResetError,  # writing to a client that left, on older aiohttp
+        ) as e:
+            if request.path in HEALTH_PATHS:
+                return web.Response(status=503, text="Upstream is not ready")
+            message = f"Upstream error: {type(e).__name__}"
+            if resp is None or not resp.prepared:
+                return error_response(502, message, "server_error")
+            if request.transport is None or request.transport.is_closing():
+                return resp  # the client is gone, and it's what failed
+            # the status line is sent, so the error has to go in the stream
+            error = {
+                "message": f"{message}; resend the request to resume",
+                "type": "server_error",
+                "code": 502,
+                "resumable": True,
+                "tokens_streamed": stream.events if stream is not None else 0,
+            }
+            return await end_with_error(resp, error)
+        finally:
+            if ticket is not None:
+                controller.release(ticket)
+            if stream is not None:
+                drainer.untrack(stream)
+                scanner = stream.scanner  # set once the upstream response started
+                if span is not None and scanner:
+                    span.events = scanner.events
+                if meter is not None and scanner and stream.response.status == 200:
+                    estimate = prompt_chars(payload) // 4
+                    meter.record(key, scanner.finish(), estimate, scanner.events)
+
+    app.on_startup.append(start_session)
+    app.on_cleanup.append(close_session)
+    app.router.add_get("/gateway/stats", stats)
+    app.router.add_get("/gateway/usage", usage)
+    app.router.add_get("/gateway/traces", traces)
+    app.router.add_route("*", "/{tail:.*}", proxy)
+    return app
+
+
+class Gateway:
+    """Runs an aiohttp app, like the gateway, on its own loop in a background thread"""
+
+    def __init__(
+        self, app: web.Application, port: int = GATEWAY_PORT, host: str = "0.0.0.0"
+    ):
+        self.app = app
+        self.port = port
+        self.host = host
+        self.ready = threading.Event()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self, timeout: float = 10.0) -> "Gateway":
+        self._thread.start()
+        if not self.ready.wait(timeout):
+            raise RuntimeError(f"Gateway didn't start on port {self.port}")
+        return self
+
+    def _run(self):
+        asyncio.run(self._main())
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        runner = web.AppRunner(self.app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, self.host, self.port).start()
+        print(f"Listening on :{self.port}")
+        self.ready.set()
+        await asyncio.Event().wait()
+
+    def drain(self, budget: float = DRAIN_BUDGET, grace: float = CUT_OFF_GRACE) -> dict:
+        """Drain from another thread, e.g. in `Server.stop`, and log the result
+
+        Takes up to `budget + grace` seconds."""
+        drainer: Drainer = self.app["drainer"]
+        logs = [log for log in (self.app["meter"], self.app["tracer"]) if log]
+
+        async def drain():
+            report = await drainer.drain(budget, grace)
+            for log in logs:
+                log.flush()
+            return report
+
+        report = asyncio.run_coroutine_threadsafe(drain(), self._loop).result()
+        print(json.dumps({"drain": report}), flush=True)
+        return report
+
+
+def main():
+    defaults = AdmissionConfig()
+    parser = argparse.ArgumentParser(description="Admission control proxy for SGLang")
+    parser.add_argument("--upstream", default="http://localhost:8001")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=GATEWAY_PORT)
+    parser.add_argument("--drain-budget", type=float, default=DRAIN_BUDGET)
+    parser.add_argument("--usage-log", default=None, help="Meter token usage to this file")
+    parser.add_argument("--trace-log", default=None, help="Record request spans to this file")
+    parser.add_argument(
+        "--coalesce", action="store_true", help="Identical requests share one generation"
+    )
+    for name, value in vars(defaults).items():
+        parser.add_argument("--" + name.replace("_", "-"), type=type(value), default=value)
+    args = parser.parse_args()
+
+    config = AdmissionConfig(**{name: getattr(args, name) for name in vars(defaults)})
+    print(f"Proxying to {args.upstream} with {config}")
+    meter = Meter(args.usage_log) if args.usage_log else None
+    tracer = SpanRecorder(args.trace_log) if args.trace_log else None
+    controller = AdmissionController(config)
+    coalescer = Coalescer() if args.coalesce else None
+    app = make_app(
+        args.upstream, controller, meter=meter, tracer=tracer, coalescer=coalescer
+    )
+    gateway = Gateway(app, args.port, args.host).start()
+
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
+    while not stop.wait(1):
+        pass
+    gateway.drain(args.drain_budget)
+
+
+if __name__ == "__main__":
+    main()
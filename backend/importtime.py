@@ -0,0 +1,92 @@
+"""Where a module's import time goes, from `python -X importtime`.
+
+Local commands pay for everything they import before doing any work. This
+runs `import <module>` in a fresh interpreter with `-X importtime`, and
+reports the total, the time by top-level package and the slowest modules.
+`--forbid` fails if any of the given packages were imported, e.g. to keep
+client-only tooling off Modal and the image definitions in `backend.py`:
+
+```bash
+python importtime.py client --forbid modal,backend
+python importtime.py backend --top 20
+```
+"""
+
+import argparse
+import json
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+LINE_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+TARGET_SECONDS = 1.0  # for a client command, before it does anything
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int, int]]:
+    """(module, self µs, cumulative µs, depth) for each line of `-X importtime` output"""
+    rows = []
+    for line in stderr.splitlines():
+        match = LINE_PATTERN.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            rows.append((name, int(own), int(cumulative), len(indent) // 2))
+    return rows
+
+
+def measure(module: str, cwd=None) -> dict:
+    """Import `module` in a new interpreter, and break down where the time went"""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=cwd,
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode:
+        errors = [line for line in proc.stderr.splitlines() if not line.startswith("import time")]
+        raise SystemExit(f"import {module} failed:\n" + "\n".join(errors[-10:]))
+
+    rows = parse_importtime(proc.stderr)
+    by_package: dict[str, int] = {}
+    for name, own, _, _ in rows:
+        package = name.partition(".")[0]
+        by_package[package] = by_package.get(package, 0) + own
+    return {
+        "module": module,
+        "wall_s": round(wall, 3),  # interpreter startup included
+        "import_s": round(sum(own for _, own, _, _ in rows) / 1e6, 3),
+        "modules": len(rows),
+        "packages": {
+            package: round(us / 1e6, 4)
+            for package, us in sorted(by_package.items(), key=lambda kv: -kv[1])
+        },
+        "slowest": [
+            {"module": name, "self_s": round(own / 1e6, 4), "cumulative_s": round(cum / 1e6, 4)}
+            for name, own, cum, _ in sorted(rows, key=lambda row: -row[1])
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("module", help="Module to import, e.g. client or backend")
+    parser.add_argument("--top", type=int, default=10, help="Packages and modules to show")
+    parser.add_argument("--forbid", default="", help="Comma-separated packages not to import")
+    parser.add_argument("--cwd", default=str(Path(__file__).parent))
+    args = parser.parse_args()
+
+    report = measure(args.module, args.cwd)
+    forbidden = [name for name in args.forbid.split(",") if name]
+    report["forbidden_imported"] = [name for name in forbidden if name in report["packages"]]
+    report["packages"] = dict(list(report["packages"].items())[: args.top])
+    report["slowest"] = report["slowest"][: args.top]
+    report["under_target"] = report["wall_s"] < TARGET_SECONDS
+    print(json.dumps(report, indent=2))
+    return 1 if report["forbidden_imported"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+"""Incremental Server-Sent Events decoder shared by the Python clients.
+
+Works on raw bytes as they arrive from the network, so there's no per-line
+decode/strip/slice, and yields events whose `data` stays as bytes until the
+caller parses it. Multi-line `data:` fields and `event:`/`id:`/`retry:` fields
+are handled per the SSE spec, except that a bare CR is not treated as a line
+ending.
+
+The canonical copy lives in `backend/`; `frontends/llm_show_reasoning` and
+`frontends/claude` ship it via symlinks.
+
+```python
+for evt in iter_json(response.iter_bytes()):
+    reasoning, content = delta_text(evt)
+
+async for event in aiter_events(response.content.iter_any()):
+    print(event.event, event.id, event.json())
+```
+
+To compare CPU per token against per-line decoding on a 100k-token stream:
+
+```bash
+python jazz_sse.py --bench
+```
+"""
+
+import json
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, Optional
+
+DONE = b"[DONE]"
+
+
+class Event:
+    __slots__ = ("data", "event", "id", "retry")
+
+    def __init__(
+        self,
+        data: bytes,
+        event: bytes = b"message",
+        id: Optional[bytes] = None,
+        retry: Optional[int] = None,
+    ):
+        self.data = data
+        self.event = event
+        self.id = id
+        self.retry = retry
+
+    def json(self):
+        # json.loads sniffs the encoding of bytes in Python; decoding first is faster
+        return json.loads(self.data.decode())
+
+    @property
+    def text(self) -> str:
+        return self.data.decode("utf-8", errors="replace")
+
+    def __repr__(self):
+        return f"Event(data={self.data!r}, event={self.event!r}, id={self.id!r})"
+
+
+class SSEDecoder:
+    """Turns arbitrary byte chunks into complete events"""
+
+    def __init__(self):
+        self._buffer = b""
+        self._data: list[bytes] = []
+        self._event = b"message"
+        self._id: Optional[bytes] = None
+        self._retry: Optional[int] = None
+
+    def feed(self, chunk: bytes) -> list[Event]:
+        """Consume a chunk, returning any events it completes"""
+        if self._buffer:
+            chunk = self._buffer + chunk
+        if b"\r" in chunk:
+            chunk = chunk.replace(b"\r\n", b"\n")
+        lines = chunk.split(b"\n")  # one C-level pass instead of a find() loop
+        self._buffer = lines.pop()
+
+        events = []
+        data = self._data
+        for line in lines:
+            if line[:6] == b"data: ":
+                data.append(line[6:])  # the common case: skip the field parsing below
+            elif not line:
+                if data:
+                    events.append(self._dispatch())
+                    data = self._data
+            else:
+                self._field(line)
+        return events
+
+    @property
+    def idle(self) -> bool:
+        """No partial line or event is buffered, so the next chunk starts fresh"""
+        return not self._buffer and not self._data
+
+    def flush(self) -> list[Event]:
+        """End of stream: dispatch any event left without a trailing blank line"""
+        events = self.feed(b"\n") if self._buffer else []
+        if self._data:
+            events.append(self._dispatch())
+        return events
+
+    def _field(self, line: bytes):
+        if line.startswith(b":"):
+            return  # comment, e.g. keep-alive pings
+        name, _, value = line.partition(b":")
+        if value[:1] == b" ":
+            value = value[1:]
+
+        if name == b"event":
+            self._event = value
+        elif name == b"id":
+            if b"\0" not in value:
+                self._id = value
+        elif name == b"retry":
+            if value.isdigit():
+                self._retry = int(value)
+        elif name == b"data":
+            self._data.append(value)
+
+    def _dispatch(self) -> Event:
+        data = self._data[0] if len(self._data) == 1 else b"\n".join(self._data)
+        event = Event(data, self._event, self._id, self._retry)
+        self._data = []
+        self._event = b"message"  # the id persists across events, per the spec
+        return event
+
+
+def iter_events(chunks: Iterable[bytes]) -> Iterator[Event]:
+    decoder = SSEDecoder()
+    for chunk in chunks:
+        yield from decoder.feed(chunk)
+    yield from decoder.flush()
+
+
+async def aiter_events(chunks: AsyncIterable[bytes]) -> AsyncIterator[Event]:
+    decoder = SSEDecoder()
+    async for chunk in chunks:
+        for event in decoder.feed(chunk):
+            yield event
+    for event in decoder.flush():
+        yield event
+
+
+def _parse_batch(events: list[Event]) -> tuple[list[dict], bool]:
+    """Parse the JSON payloads of a batch of events, and whether `[DONE]` was seen.
+
+    Events that arrived in the same network chunk are parsed with a single
+    `json.loads` call, which is several times cheaper per event than one call each.
+    """
+    payloads = []
+    done = False
+    for event in events:
+        if event.data == DONE:
+            done = True
+            break
+        payloads.append(event.data)
+
+    if not payloads:
+        return [], done
+    if len(payloads) > 1:
+        try:
+            return json.loads(b"[" + b",".join(payloads) + b"]"), done
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            pass  # a malformed payload somewhere: fall back to one at a time
+
+    parsed = []
+    for payload in payloads:
+        try:
+            parsed.append(json.loads(payload.decode()))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            continue
+    return parsed, done
+
+
+def iter_json(chunks: Iterable[bytes]) -> Iterator[dict]:
+    """Parsed JSON payloads of an OpenAI-style stream, stopping at `[DONE]`"""
+    decoder = SSEDecoder()
+    for chunk in chunks:
+        parsed, done = _parse_batch(decoder.feed(chunk))
+        yield from parsed
+        if done:
+            return
+    yield from _parse_batch(decoder.flush())[0]
+
+
+async def aiter_json(chunks: AsyncIterable[bytes]) -> AsyncIterator[dict]:
+    decoder = SSEDecoder()
+    async for chunk in chunks:
+        parsed, done = _parse_batch(decoder.feed(chunk))
+        for evt in parsed:
+            yield evt
+        if done:
+            return
+    for evt in _parse_batch(decoder.flush())[0]:
+        yield evt
+
+
+def delta_text(evt: dict) -> tuple[Optional[str], Optional[str]]:
+    """Reasoning and content from a chat completions chunk"""
+    choices = evt.get("choices")
+    delta = (choices[0].get("delta") if choices else None) or {}
+    return delta.get("reasoning_content"), delta.get("content")
+
+
+def finish_reason(evt: dict) -> Optional[str]:
+    """Why the first choice stopped, from a chunk or a whole response, if it has"""
+    choices = evt.get("choices")
+    return choices[0].get("finish_reason") if choices else None
+
+
+def _bench(num_tokens: int = 100_000, network_chunk: int = 2048, repeat: int = 5):
+    """CPU time per token: per-line str handling vs this decoder"""
+    import time
+
+    body = b"".join(
+        b"data: "
+        + json.dumps(
+            {"id": "x", "choices": [{"index": 0, "delta": {"content": f"tok{i} "}}]}
+        ).encode()
+        + b"\n\n"
+        for i in range(num_tokens)
+    ) + b"data: [DONE]\n\n"
+    chunks = [body[i : i + network_chunk] for i in range(0, len(body), network_chunk)]
+
+    def split_lines():
+        # the minimum work a client library does to iterate over lines
+        buffer = b""
+        for chunk in chunks:
+            lines = (buffer + chunk).split(b"\n")
+            buffer = lines.pop()
+            yield from lines
+
+    def legacy():
+        full_text = ""
+        for raw in split_lines():
+            line = raw.decode("utf-8", errors="ignore").strip()
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:") :].strip()
+            if data == "[DONE]":
+                break
+            evt = json.loads(data)
+            delta = (evt.get("choices") or [{}])[0].get("delta") or {}
+            chunk = delta.get("content") or delta.get("reasoning_content")
+            if chunk:
+                full_text += chunk
+        return full_text
+
+    def decoder():
+        parts = []
+        for evt in iter_json(chunks):
+            reasoning, content = delta_text(evt)
+            if content:
+                parts.append(content)
+        return "".join(parts)
+
+    assert legacy() == decoder()
+    results = {}
+    for name, fn in (("per_line_str", legacy), ("jazz_sse", decoder)):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.process_time()
+            fn()
+            best = min(best, time.process_time() - start)
+        results[name] = {
+            "cpu_s": round(best, 4),
+            "cpu_us_per_token": round(1e6 * best / num_tokens, 3),
+        }
+    return {"tokens": num_tokens, "network_chunk_bytes": network_chunk, **results}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="SSE decoder microbenchmark")
+    parser.add_argument("--bench", action="store_true", required=True)
+    parser.add_argument("--tokens", type=int, default=100_000)
+    parser.add_argument("--chunk", type=int, default=2048)
+    args = parser.parse_args()
+    print(json.dumps(_bench(args.tokens, args.chunk), indent=2))
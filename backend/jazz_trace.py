@@ -0,0 +1,377 @@
+"""Request tracing across the frontends, the Claude proxy and the `Server` gateway.
+
+Every hop passes a W3C `traceparent` header (`00-<trace id>-<parent span id>-01`)
+to the next one, and records a span for its part of the request:
+
+- `received`, wall-clock seconds when the request arrived (or was sent, for a client)
+- `admitted`, ms later, when the gateway let it through to SGLang
+- `first_token` and `last_token`, ms later, when the first and last bytes of the
+  response body went by
+
+Spans are kept in memory and appended to a JSON lines log every few seconds, one
+compact object per span. The gateway's log lives on the `jazz-traces` Volume.
+
+Reading spans back, a trace is joined on its id. Within the gateway's span,
+`queue` is time waiting for admission, `ttft` covers SGLang's own queue and
+prefill, and `decode` runs from the first to the last token. Between a span and
+its parent, `hop` is the difference in arrival times: the LiteLLM or proxy hop,
+the Modal edge and the network. Hops compare clocks on different machines,
+so they're only as good as NTP.
+
+```bash
+python jazz_trace.py traces/*.jsonl --slowest 3
+python jazz_trace.py --demo 32
+```
+
+`--demo` runs the gateway and the mock server in process, sends traced requests
+through them and prints the same report.
+"""
+
+import argparse
+import glob
+import json
+import math
+import os
+import re
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+TRACEPARENT = "traceparent"
+TRACEPARENT_PATTERN = re.compile(
+    r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$"
+)
+
+FLUSH_INTERVAL = 10.0  # seconds between appends to a log, for spans and usage alike
+KEEP_SPANS = 1000  # recent spans kept in memory, e.g. for `/gateway/traces`
+PERCENTILES = (50, 90, 99)
+BAR_WIDTH = 48
+
+_dumps = json.JSONEncoder(separators=(",", ":")).encode
+
+
+def new_traceparent(trace_id: Optional[str] = None) -> str:
+    """A `traceparent` for a new span, in a new trace unless `trace_id` is given"""
+    return f"00-{trace_id or os.urandom(16).hex()}-{os.urandom(8).hex()}-01"
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[tuple[str, str]]:
+    """Trace id and parent span id from a `traceparent` header, if it's valid"""
+    match = TRACEPARENT_PATTERN.match(value.strip().lower()) if value else None
+    if match is None:
+        return None
+    version, trace_id, span_id, _ = match.groups()
+    if version == "ff" or not int(trace_id, 16) or not int(span_id, 16):
+        return None
+    return trace_id, span_id
+
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    name: str  # the hop: client, proxy, gateway
+    received: float  # time.time()
+    admitted: Optional[float] = None  # ms after `received`, and so on
+    first_token: Optional[float] = None
+    last_token: Optional[float] = None
+    status: int = 0  # HTTP status; 0 if the client went away
+    events: int = 0  # SSE events streamed, about one per token
+    _start: float = 0.0  # time.monotonic() at `received`
+
+    @property
+    def traceparent(self) -> str:
+        """The header for requests this span makes, with this span as their parent"""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def mark(self, stamp: str):
+        """Set `admitted`, `first_token` or `last_token` to now"""
+        setattr(self, stamp, round((time.monotonic() - self._start) * 1000, 2))
+
+    def record(self) -> dict:
+        return {
+            "trace": self.trace_id,
+            "span": self.span_id,
+            "parent": self.parent_id,
+            "name": self.name,
+            "t": round(self.received, 4),
+            "admit": self.admitted,
+            "first": self.first_token,
+            "last": self.last_token,
+            "status": self.status,
+            "events": self.events,
+        }
+
+    @classmethod
+    def from_record(cls, record: dict) -> "Span":
+        return cls(
+            record["trace"],
+            record["span"],
+            record.get("parent"),
+            record["name"],
+            record["t"],
+            record.get("admit"),
+            record.get("first"),
+            record.get("last"),
+            record.get("status", 0),
+            record.get("events", 0),
+        )
+
+    def phases(self) -> dict[str, float]:
+        """Queue, time to first token and decode, in ms, where the stamps allow"""
+        phases = {}
+        ready = self.admitted or 0.0
+        if self.admitted is not None:
+            phases["queue"] = self.admitted
+        if self.first_token is not None:
+            phases["ttft"] = self.first_token - ready
+            if self.last_token is not None:
+                phases["decode"] = self.last_token - self.first_token
+        if self.last_token is not None:
+            phases["total"] = self.last_token
+        return phases
+
+
+class SpanRecorder:
+    """Starts spans, keeps the recent ones and appends finished ones to a log at `path`"""
+
+    def __init__(self, path=None, keep: int = KEEP_SPANS):
+        self.path = path
+        self.recent: deque[Span] = deque(maxlen=keep)
+        self._pending: list[Span] = []
+        if path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def start(self, name: str, traceparent: Optional[str] = None) -> Span:
+        """A span for a request that just arrived, continuing its trace if it has one"""
+        parent = parse_traceparent(traceparent)
+        trace_id, parent_id = parent if parent else (os.urandom(16).hex(), None)
+        span_id = os.urandom(8).hex()
+        return Span(trace_id, span_id, parent_id, name, time.time(), _start=time.monotonic())
+
+    def finish(self, span: Span):
+        if span.last_token is None:
+            span.mark("last_token")
+        self.recent.append(span)
+        self._pending.append(span)
+
+    def flush(self):
+        """Append finished spans to the log"""
+        if not self._pending or self.path is None:
+            return
+        with open(self.path, "a") as f:
+            f.writelines(_dumps(span.record()) + "\n" for span in self._pending)
+        self._pending.clear()
+
+    def query(self, trace_id: Optional[str] = None) -> list[dict]:
+        return [span.record() for span in self.recent if trace_id in (None, span.trace_id)]
+
+
+def load_spans(paths) -> list[Span]:
+    """Spans from logs, or directories of `*.jsonl` logs; skips torn lines"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, "*.jsonl")))
+        else:
+            files.append(path)
+    spans = []
+    for path in files:
+        with open(path) as f:
+            for line in f:
+                try:
+                    spans.append(Span.from_record(json.loads(line)))
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    continue
+    return spans
+
+
+def group_traces(spans) -> dict[str, list[Span]]:
+    """Spans by trace id, each trace in order of arrival"""
+    traces: dict[str, list[Span]] = {}
+    for span in spans:
+        traces.setdefault(span.trace_id, []).append(span)
+    for trace in traces.values():
+        trace.sort(key=lambda span: span.received)
+    return traces
+
+
+def breakdown(trace: list[Span]) -> list[tuple[str, float]]:
+    """Each span's phases, and the hop from each parent to its child, in ms.
+
+    A trace can hold several requests, e.g. all of a client session's."""
+    by_id = {span.span_id: span for span in trace}
+    times = []
+    for span in trace:
+        times += [(f"{span.name}.{phase}", ms) for phase, ms in span.phases().items()]
+        parent = by_id.get(span.parent_id)
+        if parent is not None:
+            hop = (span.received - parent.received) * 1000
+            times.append((f"hop.{parent.name}->{span.name}", hop))
+    return times
+
+
+def percentile_table(traces) -> list[dict]:
+    """Nearest-rank percentiles of every `breakdown` entry across traces"""
+    values: dict[str, list[float]] = {}
+    for trace in traces:
+        for name, ms in breakdown(trace):
+            values.setdefault(name, []).append(ms)
+    rows = []
+    for name, samples in sorted(values.items()):
+        samples.sort()
+        row = {"segment": name, "count": len(samples)}
+        for p in PERCENTILES:
+            rank = max(0, math.ceil(p / 100 * len(samples)) - 1)
+            row[f"p{p}_ms"] = round(samples[rank], 1)
+        rows.append(row)
+    return rows
+
+
+def format_table(rows: list[dict]) -> str:
+    if not rows:
+        return "no spans"
+    header = {column: column for column in rows[0]}
+    rows = [header] + rows
+    widths = {column: max(len(str(row[column])) for row in rows) for column in header}
+    return "\n".join(
+        "  ".join(str(row[column]).ljust(width) for column, width in widths.items()).rstrip()
+        for row in rows
+    )
+
+
+def waterfall(trace: list[Span], width: int = BAR_WIDTH) -> str:
+    """A bar per span on one time axis: `q` queued, `p` until the first token, `d` decoding"""
+    start = trace[0].received
+    duration = _duration(trace)
+    scale = width / max(duration, 1e-6)
+    by_id = {span.span_id: span for span in trace}
+
+    def depth(span: Span) -> int:
+        parent = by_id.get(span.parent_id)
+        return 0 if parent is None else 1 + depth(parent)
+
+    lines = [f"trace {trace[0].trace_id}  {duration * 1000:.0f} ms"]
+    for span in trace:
+        offset = (span.received - start) * 1000
+        stamps = [
+            ("q", span.admitted or 0.0),
+            ("p", span.first_token if span.first_token is not None else span.last_token),
+            ("d", span.last_token),
+        ]
+        bar = [" "] * width
+        position = round(offset / 1000 * scale)
+        for char, until in stamps:
+            stop = round((offset + (until or 0.0)) / 1000 * scale)
+            for i in range(position, min(stop, width)):
+                bar[i] = char
+            position = max(position, stop)
+        phases = "  ".join(f"{name} {ms:.0f}" for name, ms in span.phases().items())
+        label = ("  " * depth(span) + span.name).ljust(12)
+        bar = "".join(bar)
+        lines.append(f"{label} |{bar}| +{offset:.0f} ms  {phases}  [{span.status}]")
+    return "\n".join(lines)
+
+
+def _duration(trace: list[Span]) -> float:
+    return max(span.received + (span.last_token or 0) / 1000 for span in trace) - trace[0].received
+
+
+def report(spans, slowest: int = 3, trace_id: Optional[str] = None) -> str:
+    traces = group_traces(spans)
+    if trace_id is not None:
+        traces = {trace_id: traces[trace_id]} if trace_id in traces else {}
+    ranked = sorted(traces.values(), key=_duration, reverse=True)
+    parts = [f"{len(traces)} traces, {sum(map(len, traces.values()))} spans"]
+    parts.append(format_table(percentile_table(traces.values())))
+    parts += [waterfall(trace) for trace in ranked[:slowest]]
+    return "\n\n".join(parts)
+
+
+async def _demo(num_requests: int, concurrency: int, path=None) -> list[Span]:
+    """Traced requests through the gateway to the mock server, all in this process"""
+    import asyncio
+
+    import aiohttp
+    from aiohttp import web
+
+    import gateway
+    import mock_server
+    from jazz_sse import aiter_json
+
+    async def serve(app) -> tuple[web.AppRunner, str]:
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = runner.addresses[0][:2]
+        return runner, f"http://{host}:{port}"
+
+    tracer = SpanRecorder(path)
+    clients = SpanRecorder()
+    mock, mock_url = await serve(
+        mock_server.make_app(mock_server.MockConfig(max_running_requests=concurrency // 2))
+    )
+    config = gateway.AdmissionConfig(max_concurrency=concurrency // 2)
+    controller = gateway.AdmissionController(config)
+    front, url = await serve(gateway.make_app(mock_url, controller, tracer=tracer))
+
+    async def one(session: aiohttp.ClientSession, i: int):
+        span = clients.start("client")
+        payload = {
+            "messages": [{"role": "user", "content": "word " * (50 * (i % 8 + 1))}],
+            "stream": True,
+            "max_tokens": 16 * (i % 4 + 1),
+        }
+        headers = {TRACEPARENT: span.traceparent}
+        target = url + "/v1/chat/completions"
+        async with session.post(target, json=payload, headers=headers) as r:
+            span.status = r.status
+            async for _ in aiter_json(r.content.iter_any()):
+                if span.first_token is None:
+                    span.mark("first_token")
+                span.events += 1
+        clients.finish(span)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(session, i):
+        async with semaphore:
+            await one(session, i)
+
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(limited(session, i) for i in range(num_requests)))
+    tracer.flush()
+    await front.cleanup()
+    await mock.cleanup()
+    return list(clients.recent) + list(tracer.recent)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("logs", nargs="*", help="Span logs, or directories of them")
+    parser.add_argument("--trace", default=None, help="Show just this trace id")
+    parser.add_argument("--slowest", type=int, default=3, help="Waterfalls to print")
+    parser.add_argument(
+        "--demo", type=int, default=0, help="Trace this many requests to a local mock"
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.demo:
+        import asyncio
+
+        spans = asyncio.run(_demo(args.demo, args.concurrency))
+    elif args.logs:
+        spans = load_spans(args.logs)
+    else:
+        parser.error("no span logs given")
+    print(report(spans, args.slowest, args.trace))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
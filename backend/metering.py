@@ -0,0 +1,345 @@
+"""Per-API-key token metering, from responses as they stream through the gateway.
+
+Each proxied response is scanned chunk by chunk for its `usage` object,
+without keeping the body: chunks go through the incremental SSE decoder and
+only events that carry a non-null `usage` are parsed. Prompt, cached,
+reasoning and completion tokens are then added to per-key counters for the
+current time bucket. A stream that ends without usage (the client didn't set
+`stream_options.include_usage`, or it was cut off) is counted from its event
+count and prompt length instead, and marked as estimated.
+
+Every few seconds the counters are appended to a log of fixed-size records:
+
+    bucket start (uint32, unix s) | key id (6 bytes) | requests | prompt_tokens
+    | cached_tokens | reasoning_tokens | completion_tokens | estimated (uint32 each)
+
+Records are deltas, so a key's bucket may appear several times; reading sums
+them. Records are appended in bucket order, so a query for a time range
+seeks with a binary search instead of reading the whole log.
+
+Each replica appends to its own log. A `shared` meter's queries sum every
+`*.bin` log in its directory, so `/gateway/usage` covers all replicas on the
+`jazz-metering` volume. Other replicas' records show up once the volume has
+committed them and this replica has reloaded it, within a minute or two.
+
+To measure the cost per streamed chunk, or to query logs copied off the volume:
+
+```bash
+python metering.py --bench
+python metering.py usage/*.bin --bucket 3600
+```
+"""
+
+import argparse
+import bisect
+import glob
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from pathlib import Path
+
+from jazz_sse import DONE, SSEDecoder
+
+FIELDS = (
+    "requests",
+    "prompt_tokens",
+    "cached_tokens",
+    "reasoning_tokens",
+    "completion_tokens",
+    "estimated",  # requests counted without a usage object
+)
+RECORD = struct.Struct(f"<I6s{len(FIELDS)}I")
+
+BUCKET_SECONDS = 60
+RELOAD_INTERVAL = 60  # seconds between reloads of a shared log directory
+MAX_BODY_BYTES = 1 << 20  # of a non-streaming response, kept to read its usage
+
+
+def _has_usage(data: bytes) -> bool:
+    """Whether any event in `data` carries usage; most chunks say `"usage":null`"""
+    i = data.find(b'"usage"')
+    while i != -1:
+        if data[i + 7 : i + 10].lstrip(b" :")[:1] == b"{":
+            return True
+        i = data.find(b'"usage"', i + 7)
+    return False
+
+
+def usage_counts(usage: dict) -> tuple[int, int, int, int]:
+    """Prompt, cached, reasoning and completion tokens from an OpenAI usage object"""
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+    reasoning = (usage.get("completion_tokens_details") or {}).get("reasoning_tokens")
+    return (
+        int(usage.get("prompt_tokens") or 0),
+        int(cached or 0),
+        int(reasoning or 0),
+        int(usage.get("completion_tokens") or 0),
+    )
+
+
+class UsageScanner:
+    """Finds the usage in one response as it streams past"""
+
+    __slots__ = ("_decoder", "_body", "events", "usage")
+
+    def __init__(self, streaming: bool = True):
+        self._decoder = SSEDecoder() if streaming else None
+        self._body: list[bytes] | None = None if streaming else []
+        self.events = 0  # data events other than [DONE], about one token each
+        self.usage: dict | None = None
+
+    def feed(self, chunk: bytes):
+        if self._decoder is None:
+            if sum(map(len, self._body)) < MAX_BODY_BYTES:
+                self._body.append(chunk)
+            return
+        decoder = self._decoder
+        if decoder.idle and chunk[-2:] == b"\n\n" and not _has_usage(chunk):
+            # whole events and nothing to parse: the usual token chunk, just count it
+            self.events += chunk.count(b"data:") - chunk.endswith(b"data: [DONE]\n\n")
+            return
+        for event in decoder.feed(chunk):
+            data = event.data
+            if data == DONE:
+                continue
+            self.events += 1
+            if _has_usage(data):
+                try:
+                    self.usage = json.loads(data.decode()).get("usage") or self.usage
+                except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+                    pass
+
+    def finish(self) -> dict | None:
+        if self._body:
+            try:
+                self.usage = json.loads(b"".join(self._body).decode()).get("usage")
+            except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+                pass
+        return self.usage
+
+
+class Meter:
+    """Per-key counters in time buckets, appended to a log at `path`
+
+    With `shared`, other replicas append their own logs next to it, and
+    queries read them all. `reload`, e.g. a Modal Volume's, makes their
+    latest records visible, and is called by `reload_peers`."""
+
+    def __init__(self, path=None, bucket: int = BUCKET_SECONDS, shared: bool = False, reload=None):
+        self.path = None if path is None else Path(path)
+        self.bucket = bucket
+        self.shared = shared
+        self.reload = reload
+        self._reloaded = float("-inf")
+        self._pending: dict[tuple[int, bytes], list[int]] = {}
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def record(
+        self,
+        key: str,
+        usage: dict | None,
+        prompt_estimate: int = 0,
+        events: int = 0,
+        now: float | None = None,
+    ):
+        """Count one finished request for `key`, a hex id like `gateway.api_key_id`"""
+        start = int(now if now is not None else time.time()) // self.bucket * self.bucket
+        counts = self._pending.get((start, key))
+        if counts is None:
+            counts = self._pending[(start, key)] = [0] * len(FIELDS)
+        counts[0] += 1
+        if usage:
+            prompt, cached, reasoning, completion = usage_counts(usage)
+        else:
+            prompt, cached, reasoning, completion = prompt_estimate, 0, 0, events
+            counts[5] += 1
+        counts[1] += prompt
+        counts[2] += cached
+        counts[3] += reasoning
+        counts[4] += completion
+
+    def flush(self):
+        """Append pending counters to the log"""
+        if not self._pending or self.path is None:
+            return
+        records = b"".join(
+            RECORD.pack(start, bytes.fromhex(key), *counts)
+            for (start, key), counts in sorted(self._pending.items())
+        )
+        with open(self.path, "ab") as f:
+            f.write(records)
+        self._pending.clear()
+
+    def reload_peers(self):
+        """Pick up other replicas' latest records, at most every `RELOAD_INTERVAL` s; blocks"""
+        if self.reload is None or time.monotonic() - self._reloaded < RELOAD_INTERVAL:
+            return
+        self._reloaded = time.monotonic()
+        try:
+            self.reload()
+        except Exception as e:  # e.g. a log open for reading; try again next time
+            print(json.dumps({"metering_reload": {"error": f"{type(e).__name__}: {e}"}}))
+
+    def logs(self) -> list[Path]:
+        """The logs a query reads: this replica's, or every one in a shared directory"""
+        if self.path is None:
+            return []
+        if self.shared:
+            return sorted({self.path, *self.path.parent.glob("*.bin")})
+        return [self.path]
+
+    def query(
+        self,
+        key: str | None = None,
+        since: float | None = None,
+        until: float | None = None,
+        bucket: int | None = None,
+    ) -> list[dict]:
+        """Counters from the logs and memory, summed per key into `bucket`-second buckets"""
+        pending = [
+            (start, bytes.fromhex(key_id), *counts)
+            for (start, key_id), counts in self._pending.items()
+        ]
+        return query(self.logs(), key, since, until, bucket or self.bucket, extra=pending)
+
+
+def read_records(path, since: float | None = None):
+    """Records from a log, starting near `since`; ignores a torn last record"""
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:  # nothing flushed yet
+        return
+    count = size // RECORD.size
+    if not count:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        first = 0
+        if since is not None:
+
+            class Starts:  # bucket starts by record index, for bisect
+                def __len__(self):
+                    return count
+
+                def __getitem__(self, i):
+                    return RECORD.unpack_from(buf, i * RECORD.size)[0]
+
+            # records are flushed in bucket order, so one bucket of slack is enough
+            first = bisect.bisect_left(Starts(), since - BUCKET_SECONDS)
+        yield from RECORD.iter_unpack(buf[first * RECORD.size : count * RECORD.size])
+
+
+def query(
+    paths,
+    key: str | None = None,
+    since: float | None = None,
+    until: float | None = None,
+    bucket: int = BUCKET_SECONDS,
+    extra=(),
+) -> list[dict]:
+    """Sum records from logs (and `extra` unflushed ones) by key and bucket"""
+    want = bytes.fromhex(key) if key else None
+    totals: dict[tuple[int, bytes], list[int]] = {}
+
+    def add(records):
+        for start, key_id, *counts in records:
+            if want is not None and key_id != want:
+                continue
+            if since is not None and start < since:
+                continue
+            if until is not None and start >= until:
+                continue
+            slot = (start // bucket * bucket, key_id)
+            total = totals.get(slot)
+            if total is None:
+                totals[slot] = counts
+            else:
+                for i, value in enumerate(counts):
+                    total[i] += value
+
+    for path in paths:
+        add(read_records(path, since))
+    add(extra)
+    return [
+        {"start": start, "key": key_id.hex(), **dict(zip(FIELDS, counts))}
+        for (start, key_id), counts in sorted(totals.items())
+    ]
+
+
+def _bench(num_chunks: int = 100_000, repeat: int = 5) -> dict:
+    """CPU time per streamed chunk for the scanner, and per finished request to record"""
+    chunk = (
+        b"data: "
+        + json.dumps(
+            {
+                "id": "chatcmpl-0123456789abcdef",
+                "object": "chat.completion.chunk",
+                "created": 1767225600,
+                "model": "llm",
+                "choices": [{"index": 0, "delta": {"content": "tok "}, "finish_reason": None}],
+                "usage": None,
+            }
+        ).encode()
+        + b"\n\n"
+    )
+    final = (
+        b'data: {"choices":[],"usage":{"prompt_tokens":50000,"completion_tokens":1000,'
+        b'"prompt_tokens_details":{"cached_tokens":48000},'
+        b'"completion_tokens_details":{"reasoning_tokens":600}}}\n\ndata: [DONE]\n\n'
+    )
+
+    def scan():
+        scanner = UsageScanner()
+        for _ in range(num_chunks):
+            scanner.feed(chunk)
+        scanner.feed(final)
+        assert scanner.finish()["completion_tokens"] == 1000
+
+    meter = Meter()
+
+    def record():
+        for i in range(num_chunks):
+            meter.record("0123456789ab", {"prompt_tokens": 10, "completion_tokens": 5})
+
+    results = {"chunk_bytes": len(chunk)}
+    for name, fn, unit in (("scan", scan, "chunk"), ("record", record, "request")):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.process_time()
+            fn()
+            best = min(best, time.process_time() - start)
+        results[f"{name}_us_per_{unit}"] = round(1e6 * best / num_chunks, 3)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query gateway usage logs")
+    parser.add_argument("logs", nargs="*", help="Usage log files or directories")
+    parser.add_argument("--key", default=None, help="Key id, as in /gateway/usage")
+    parser.add_argument("--since", type=float, default=None, help="Unix seconds")
+    parser.add_argument("--until", type=float, default=None)
+    parser.add_argument("--bucket", type=int, default=3600, help="Seconds per row")
+    parser.add_argument("--bench", action="store_true", help="Time the per-chunk cost")
+    args = parser.parse_args()
+
+    if args.bench:
+        print(json.dumps(_bench(), indent=2))
+        return 0
+    paths = []
+    for log in args.logs:
+        if os.path.isdir(log):
+            paths += sorted(glob.glob(os.path.join(log, "*.bin")))
+        else:
+            paths.append(log)
+    if not paths:
+        parser.error("no usage logs given")
+    for row in query(paths, args.key, args.since, args.until, args.bucket):
+        print(json.dumps(row))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+"""Load signal for scaling decisions, computed from SGLang's Prometheus `/metrics`.
+
+`@modal.concurrent(target_inputs=...)` counts requests, but a 100k-token
+prefill costs as much as dozens of short chats. The sidecar here scrapes
+SGLang's metrics every second inside the `Server` container and turns
+queue depth, running requests, and KV cache usage into one load score,
+where 1.0 means "at capacity":
+
+    score = max(kv_usage / kv_target, running / max_running_requests)
+            + queued / max_running_requests
+
+It serves the score, its inputs, and token throughput as JSON at `/load`.
+
+To compute the same numbers from a recorded scrape, or to poll a live server:
+
+```bash
+python metrics.py fixtures/sglang_metrics.prom --max-running-requests 32
+python metrics.py http://localhost:8000/metrics --watch
+```
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import re
+import threading
+import time
+import urllib.request
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+METRICS_PORT = 8002
+
+SAMPLE_PATTERN = re.compile(
+    r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)(?:\s+-?\d+)?$"
+)
+LABEL_PATTERN = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def parse_prometheus(text: str) -> dict[str, list[tuple[dict, float]]]:
+    """Samples by metric name, each as `(labels, value)`, from the text format"""
+    samples = collections.defaultdict(list)
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        match = SAMPLE_PATTERN.match(line)
+        if match is None:
+            continue
+        name, labels, value = match.groups()
+        try:
+            number = float(value)  # also parses NaN and +Inf
+        except ValueError:
+            continue
+        samples[name].append((dict(LABEL_PATTERN.findall(labels or "")), number))
+    return dict(samples)
+
+
+@dataclass
+class Snapshot:
+    """One scrape, aggregated over scheduler ranks"""
+
+    timestamp: float
+    ranks: int
+    running: float
+    queued: float
+    kv_usage: float  # the fullest rank's, since that's where requests stall first
+    kv_usage_mean: float
+    gen_throughput: float
+    prompt_tokens_total: float
+    generation_tokens_total: float
+    requests_total: float
+    cache_hit_rate: float | None
+    spec_accept_length: float | None  # tokens per verify step, with speculative decoding
+
+
+def _values(samples: dict, name: str) -> list[float]:
+    return [value for _, value in samples.get(f"sglang:{name}", []) if value == value]
+
+
+def snapshot(samples: dict, timestamp: float | None = None) -> Snapshot:
+    usage = _values(samples, "token_usage")
+    hit_rates = _values(samples, "cache_hit_rate")
+    accept = _values(samples, "spec_accept_length")
+    return Snapshot(
+        timestamp=time.time() if timestamp is None else timestamp,
+        ranks=max(len(usage), len(_values(samples, "num_running_reqs")), 1),
+        running=sum(_values(samples, "num_running_reqs")),
+        queued=sum(_values(samples, "num_queue_reqs")),
+        kv_usage=max(usage, default=0.0),
+        kv_usage_mean=sum(usage) / len(usage) if usage else 0.0,
+        gen_throughput=sum(_values(samples, "gen_throughput")),
+        prompt_tokens_total=sum(_values(samples, "prompt_tokens_total")),
+        generation_tokens_total=sum(_values(samples, "generation_tokens_total")),
+        requests_total=sum(_values(samples, "num_requests_total")),
+        cache_hit_rate=sum(hit_rates) / len(hit_rates) if hit_rates else None,
+        spec_accept_length=sum(accept) / len(accept) if accept else None,
+    )
+
+
+class LoadTracker:
+    """Keeps a window of snapshots and derives the load score and token rates"""
+
+    def __init__(
+        self,
+        max_running_requests: int,
+        kv_target: float = 0.9,
+        window: float = 30.0,
+    ):
+        self.max_running_requests = max_running_requests
+        self.kv_target = kv_target
+        self.window = window
+        self.snapshots: collections.deque[Snapshot] = collections.deque()
+        self.scrape_errors = 0
+
+    def observe(self, snap: Snapshot):
+        self.snapshots.append(snap)
+        while snap.timestamp - self.snapshots[0].timestamp > self.window:
+            self.snapshots.popleft()
+
+    def components(self, snap: Snapshot) -> dict[str, float]:
+        return {
+            "kv": snap.kv_usage / self.kv_target,
+            "slots": snap.running / self.max_running_requests,
+            "queue": snap.queued / self.max_running_requests,
+        }
+
+    def score(self, snap: Snapshot) -> float:
+        parts = self.components(snap)
+        return max(parts["kv"], parts["slots"]) + parts["queue"]
+
+    def rates(self) -> dict[str, float | None]:
+        """Per-second rates from counter deltas over the window"""
+        fields = {
+            "prompt_tokens_per_s": "prompt_tokens_total",
+            "generation_tokens_per_s": "generation_tokens_total",
+            "requests_per_s": "requests_total",
+        }
+        if len(self.snapshots) < 2:
+            return dict.fromkeys(fields)
+        first, last = self.snapshots[0], self.snapshots[-1]
+        elapsed = last.timestamp - first.timestamp
+
+        def rate(field: str) -> float | None:
+            delta = getattr(last, field) - getattr(first, field)
+            # a counter going backwards means the server restarted
+            return round(delta / elapsed, 2) if elapsed > 0 and delta >= 0 else None
+
+        return {name: rate(field) for name, field in fields.items()}
+
+    def load(self) -> dict:
+        """The compact JSON served at `/load`"""
+        if not self.snapshots:
+            return {"score": None, "scrape_errors": self.scrape_errors}
+        last = self.snapshots[-1]
+        scores = [self.score(snap) for snap in self.snapshots]
+        return {
+            "score": round(scores[-1], 4),
+            "score_avg": round(sum(scores) / len(scores), 4),
+            "components": {
+                key: round(value, 4) for key, value in self.components(last).items()
+            },
+            "running": last.running,
+            "queued": last.queued,
+            "kv_usage": last.kv_usage,
+            "kv_usage_mean": last.kv_usage_mean,
+            "cache_hit_rate": last.cache_hit_rate,
+            "spec_accept_length": last.spec_accept_length,
+            "gen_throughput": round(last.gen_throughput, 2),
+            **self.rates(),
+            "ranks": last.ranks,
+            "window_s": round(last.timestamp - self.snapshots[0].timestamp, 3),
+            "age_s": round(time.time() - last.timestamp, 3),
+            "scrape_errors": self.scrape_errors,
+        }
+
+
+class MetricsSidecar:
+    """Scrapes `metrics_url` in a background thread and serves `/load` on `port`"""
+
+    def __init__(
+        self,
+        metrics_url: str,
+        tracker: LoadTracker,
+        port: int = METRICS_PORT,
+        interval: float = 1.0,
+        log_interval: float | None = 60.0,
+        spec_stats=None,
+    ):
+        self.metrics_url = metrics_url
+        self.tracker = tracker
+        self.spec_stats = spec_stats  # a `specdec.DecodeStats`, fed from the server log
+        self.port = port
+        self.interval = interval
+        self.log_interval = log_interval
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> "MetricsSidecar":
+        self._thread.start()
+        return self
+
+    def load(self) -> dict:
+        load = self.tracker.load()
+        if self.spec_stats is not None:
+            load["spec_decode"] = self.spec_stats.summary()
+        return load
+
+    def _run(self):
+        asyncio.run(self._main())
+
+    async def _main(self):
+        import aiohttp
+        from aiohttp import web
+
+        async def load(request):
+            return web.json_response(self.load())
+
+        app = web.Application()
+        app.router.add_get("/load", load)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "0.0.0.0", self.port).start()
+        print(f"Serving load signal on :{self.port}/load")
+
+        logged_at = time.monotonic()
+        timeout = aiohttp.ClientTimeout(total=max(self.interval, 1.0))
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            while True:
+                try:
+                    async with session.get(self.metrics_url) as resp:
+                        resp.raise_for_status()
+                        text = await resp.text()
+                    self.tracker.observe(snapshot(parse_prometheus(text)))
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    self.tracker.scrape_errors += 1
+
+                if self.log_interval and time.monotonic() - logged_at > self.log_interval:
+                    print(json.dumps({"load": self.load()}), flush=True)
+                    logged_at = time.monotonic()
+                await asyncio.sleep(self.interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute the load signal from SGLang metrics")
+    parser.add_argument("source", help="A /metrics URL, or a recorded Prometheus text file")
+    parser.add_argument("--max-running-requests", type=int, default=32)
+    parser.add_argument("--kv-target", type=float, default=0.9)
+    parser.add_argument("--watch", action="store_true", help="Keep polling a URL")
+    parser.add_argument("--interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    tracker = LoadTracker(args.max_running_requests, args.kv_target)
+    if not args.source.startswith(("http://", "https://")):
+        tracker.observe(snapshot(parse_prometheus(Path(args.source).read_text())))
+        report = {"snapshot": asdict(tracker.snapshots[-1]), "load": tracker.load()}
+        print(json.dumps(report, indent=2))
+        return
+
+    while True:
+        with urllib.request.urlopen(args.source, timeout=10) as resp:
+            tracker.observe(snapshot(parse_prometheus(resp.read().decode())))
+        print(json.dumps(tracker.load()), flush=True)
+        if not args.watch:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""Stand-in for the SGLang server that runs on a CPU.
+
+Speaks the same `/health`, `/v1/models`, `/v1/chat/completions` and `/metrics`
+surface as the `Server` in `backend.py`, with configurable timing, so the
+clients and frontends in this repo can be exercised without GPUs.
+
+```bash
+python mock_server.py --port 8000 --startup-delay 10 --decode-delay 0.016
+python bench.py http://localhost:8000 --concurrency 32
+```
+
+`--config` reads an SGLang config YAML, so a sweep over server options
+(see `sweep.py`) changes the mock's behavior too: `max-running-requests`
+caps the batch, batches beyond `cuda-graph-max-bs` decode more slowly, and
+`speculative-algorithm` speeds up decoding at small batch sizes.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass, replace
+
+from aiohttp import web
+
+WORDS = (
+    "swing bebop modal cool blue note chord riff solo groove tempo scale "
+    "improvise rhythm bass drum horn trumpet sax piano brush cymbal vamp"
+).split()
+
+
+@dataclass
+class MockConfig:
+    model: str = "llm"
+    startup_delay: float = 0.0  # seconds of 503s before /health turns 200
+    prefill_delay: float = 0.05  # fixed time to first token (seconds)
+    prefill_per_token: float = 0.00002  # extra TTFT per prompt token (seconds)
+    decode_delay: float = 0.016  # per output token at batch size 1 (seconds)
+    batch_slowdown: float = 0.02  # fractional decode slowdown per extra running request
+    max_running_requests: int = 32  # requests beyond this wait in the queue
+    cuda_graph_max_bs: int | None = None  # larger batches decode without CUDA graphs
+    eager_slowdown: float = 0.3  # fractional decode slowdown without CUDA graphs
+    spec_speedup: float = 1.0  # decode speedup from speculative decoding at batch size 1
+    reasoning_tokens: int = 32  # leading output tokens sent as reasoning_content
+    default_max_tokens: int = 256
+    fail_rate: float = 0.0  # fraction of completions answered with a 503, as if overloaded
+    fail_retry_after: int = 1  # seconds, sent as Retry-After with those 503s
+    seed: int | None = None
+
+
+# speedup assumed for `speculative-algorithm` when it isn't set explicitly
+SPEC_SPEEDUP = 1.8
+
+
+def load_server_config(path) -> dict:
+    import yaml
+
+    with open(path) as f:
+        return yaml.safe_load(f) or {}
+
+
+def config_from_server_options(options: dict, base: MockConfig | None = None) -> MockConfig:
+    """Map the SGLang server options the mock models onto a `MockConfig`"""
+    config = base or MockConfig()
+    changes = {}
+    if "max-running-requests" in options:
+        changes["max_running_requests"] = int(options["max-running-requests"])
+    if "cuda-graph-max-bs" in options:
+        changes["cuda_graph_max_bs"] = int(options["cuda-graph-max-bs"])
+    if options.get("speculative-algorithm") and config.spec_speedup == 1.0:
+        changes["spec_speedup"] = SPEC_SPEEDUP
+    return replace(config, **changes)
+
+
+class MockEngine:
+    """Tracks scheduler state and produces timed token streams"""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.started_at = time.monotonic()
+        self.running = 0
+        self.queued = 0
+        self.slots = asyncio.Semaphore(config.max_running_requests)
+        self.rng = random.Random(config.seed)
+        self.counters = {
+            "prompt_tokens": 0,
+            "generation_tokens": 0,
+            "requests": 0,
+        }
+
+    @property
+    def ready(self) -> bool:
+        return time.monotonic() - self.started_at >= self.config.startup_delay
+
+    def decode_delay(self) -> float:
+        config = self.config
+        extra = max(0, self.running - 1)
+        delay = config.decode_delay * (1 + config.batch_slowdown * extra)
+        if config.cuda_graph_max_bs is not None and self.running > config.cuda_graph_max_bs:
+            delay *= 1 + config.eager_slowdown
+        if config.spec_speedup > 1:
+            # verifying drafts competes with the batch, so the gain fades as it fills
+            headroom = max(0.0, 1 - self.running / config.max_running_requests)
+            delay /= 1 + (config.spec_speedup - 1) * headroom
+        return delay
+
+    def prefill_delay(self, prompt_tokens: int) -> float:
+        return self.config.prefill_delay + self.config.prefill_per_token * prompt_tokens
+
+    async def generate(self, prompt_tokens: int, max_tokens: int):
+        """Yield `(kind, text)` pieces, where kind is "reasoning" or "content" """
+        self.queued += 1
+        async with self.slots:
+            self.queued -= 1
+            self.running += 1
+            try:
+                await asyncio.sleep(self.prefill_delay(prompt_tokens))
+                self.counters["prompt_tokens"] += prompt_tokens
+                for i in range(max_tokens):
+                    if i:
+                        await asyncio.sleep(self.decode_delay())
+                    kind = "reasoning" if i < self.config.reasoning_tokens else "content"
+                    self.counters["generation_tokens"] += 1
+                    yield kind, self.rng.choice(WORDS) + " "
+            finally:
+                self.running -= 1
+                self.counters["requests"] += 1
+
+    def metrics(self) -> str:
+        """Render a subset of SGLang's Prometheus metrics"""
+        labels = f'{{model_name="{self.config.model}"}}'
+        running = self.running
+        gauges = {
+            "sglang:num_running_reqs": running,
+            "sglang:num_queue_reqs": self.queued,
+            "sglang:token_usage": running / self.config.max_running_requests,
+            "sglang:gen_throughput": running / self.decode_delay() if running else 0.0,
+        }
+        counters = {
+            "sglang:prompt_tokens_total": self.counters["prompt_tokens"],
+            "sglang:generation_tokens_total": self.counters["generation_tokens"],
+            "sglang:num_requests_total": self.counters["requests"],
+        }
+        lines = []
+        for name, value in gauges.items():
+            lines += [f"# TYPE {name} gauge", f"{name}{labels} {float(value)}"]
+        for name, value in counters.items():
+            lines += [f"# TYPE {name} counter", f"{name}{labels} {float(value)}"]
+        return "\n".join(lines) + "\n"
+
+
+def count_prompt_tokens(messages: list) -> int:
+    """Cheap stand-in for a tokenizer: about four characters per token"""
+    chars = 0
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content)
+        chars += len(content)
+    return max(1, chars // 4)
+
+
+def _chunk(request_id: str, model: str, created: int, delta: dict, finish=None) -> dict:
+    return {
+        "id": request_id,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+    }
+
+
+def _sse(payload) -> bytes:
+    return b"data: " + json.dumps(payload).encode() + b"\n\n"
+
+
+async def chat_completions(request: web.Request) -> web.StreamResponse:
+    engine: MockEngine = request.app["engine"]
+    if not engine.ready:
+        raise web.HTTPServiceUnavailable(text="Server is starting up")
+    if engine.config.fail_rate and engine.rng.random() < engine.config.fail_rate:
+        retry_after = str(engine.config.fail_retry_after)
+        raise web.HTTPServiceUnavailable(text="Overloaded", headers={"Retry-After": retry_after})
+
+    body = await request.json()
+    messages = body.get("messages") or []
+    prompt_tokens = count_prompt_tokens(messages)
+    max_tokens = body.get("max_tokens") or engine.config.default_max_tokens
+    if not body.get("ignore_eos"):
+        max_tokens = min(max_tokens, engine.config.default_max_tokens)
+    model = body.get("model") or engine.config.model
+
+    request_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    usage = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "completion_tokens_details": {"reasoning_tokens": 0},
+    }
+    reasoning_usage = usage["completion_tokens_details"]
+
+    def finish_usage():
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        return usage
+
+    if not body.get("stream"):
+        parts = {"reasoning": [], "content": []}
+        async for kind, text in engine.generate(prompt_tokens, max_tokens):
+            parts[kind].append(text)
+            usage["completion_tokens"] += 1
+            reasoning_usage["reasoning_tokens"] += kind == "reasoning"
+        message = {"role": "assistant", "content": "".join(parts["content"])}
+        if parts["reasoning"]:
+            message["reasoning_content"] = "".join(parts["reasoning"])
+        return web.json_response(
+            {
+                "id": request_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": "length"}],
+                "usage": finish_usage(),
+            }
+        )
+
+    include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+    resp = web.StreamResponse(
+        headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+    )
+    await resp.prepare(request)
+    await resp.write(_sse(_chunk(request_id, model, created, {"role": "assistant"})))
+
+    async for kind, text in engine.generate(prompt_tokens, max_tokens):
+        field = "reasoning_content" if kind == "reasoning" else "content"
+        await resp.write(_sse(_chunk(request_id, model, created, {field: text})))
+        usage["completion_tokens"] += 1
+        reasoning_usage["reasoning_tokens"] += kind == "reasoning"
+
+    await resp.write(_sse(_chunk(request_id, model, created, {}, finish="length")))
+    if include_usage:
+        final = _chunk(request_id, model, created, {})
+        final["choices"] = []
+        final["usage"] = finish_usage()
+        await resp.write(_sse(final))
+    await resp.write(b"data: [DONE]\n\n")
+    await resp.write_eof()
+    return resp
+
+
+async def health(request: web.Request) -> web.Response:
+    if not request.app["engine"].ready:
+        raise web.HTTPServiceUnavailable(text="Server is starting up")
+    return web.Response(text="")
+
+
+async def models(request: web.Request) -> web.Response:
+    engine: MockEngine = request.app["engine"]
+    if not engine.ready:
+        raise web.HTTPServiceUnavailable(text="Server is starting up")
+    return web.json_response(
+        {"object": "list", "data": [{"id": engine.config.model, "object": "model"}]}
+    )
+
+
+async def metrics(request: web.Request) -> web.Response:
+    return web.Response(
+        text=request.app["engine"].metrics(), content_type="text/plain"
+    )
+
+
+def make_app(config: MockConfig | None = None) -> web.Application:
+    """Build the mock server as an aiohttp application, e.g. for in-process use"""
+    app = web.Application()
+
+    async def start_engine(app):
+        app["engine"] = engine = MockEngine(config or MockConfig())
+        # mimic SGLang's log line, which `startup.LogWatcher` listens for
+        asyncio.get_running_loop().call_later(
+            engine.config.startup_delay,
+            lambda: print("The server is fired up and ready to roll!", flush=True),
+        )
+
+    app.on_startup.append(start_engine)
+    app.router.add_get("/health", health)
+    app.router.add_get("/health_generate", health)
+    app.router.add_get("/v1/models", models)
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_get("/metrics", metrics)
+    return app
+
+
+def main():
+    # read --config first, so it sets the defaults that explicit flags override
+    pre_parser = argparse.ArgumentParser(add_help=False)
+    pre_parser.add_argument("--config", default=None)
+    config_path = pre_parser.parse_known_args()[0].config
+
+    defaults = MockConfig()
+    if config_path is not None:
+        defaults = config_from_server_options(load_server_config(config_path), defaults)
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--config", default=None, help="SGLang config YAML to mimic")
+    for name, value in vars(defaults).items():
+        value_type = type(value) if value is not None else int
+        parser.add_argument("--" + name.replace("_", "-"), type=value_type, default=value)
+    args = parser.parse_args()
+
+    config = MockConfig(**{name: getattr(args, name) for name in vars(defaults)})
+    print(f"Starting mock SGLang server on {args.host}:{args.port} with {config}")
+    web.run_app(make_app(config), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
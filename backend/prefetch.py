@@ -0,0 +1,311 @@
+"""Read the model's weight shards into the page cache while SGLang is starting up.
+
+On a cold start SGLang's TP ranks read hundreds of GB of safetensors from the
+`huggingface-cache` Volume, lazily and mostly one shard after another, so a
+network-backed volume sees a handful of sequential streams. Distributed init,
+tokenizer and config loading come first, and take a while. `Prefetcher`
+uses that time: right before SGLang is spawned it starts a thread pool that
+reads every shard in large blocks, spread across many concurrent requests,
+so that the ranks find the weights in memory when they get to them.
+
+- `mode="read"` reads each block with `preadv` into a per-thread buffer,
+  which is what fills the page cache on a FUSE-backed volume.
+- `mode="madvise"` maps each block and asks the kernel to read it ahead
+  (`MADV_WILLNEED`), which costs no copies but is only a hint.
+- `copy_to` copies the snapshot to local disk instead, and must finish before
+  SGLang starts, since the weights are then loaded from there. It needs
+  `ephemeral_disk` for the whole checkpoint. `copy_snapshot` deletes a copy
+  that's missing any bytes and raises, so SGLang never loads a partial one.
+
+To measure it locally, on a directory of synthetic shards:
+
+```bash
+python prefetch.py --bench /tmp/shards --create 8 --shard-mb 512
+```
+"""
+
+import argparse
+import json
+import mmap
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+SHARD_PATTERNS = ("*.safetensors", "*.bin", "*.pt")
+BLOCK_BYTES = 32 << 20  # per read; large enough to keep a network volume streaming
+WORKERS = 32
+
+
+def snapshot_dir(cache_path, repo_id: str, revision: str = "main") -> Path | None:
+    """A model's snapshot directory in a Hugging Face cache, if it's been downloaded"""
+    repo = Path(cache_path) / "hub" / f"models--{repo_id.replace('/', '--')}"
+    ref = repo / "refs" / revision
+    commit = ref.read_text().strip() if ref.exists() else revision
+    path = repo / "snapshots" / commit
+    return path if path.is_dir() else None
+
+
+def list_shards(directory) -> list[Path]:
+    """Weight files in `directory`, by name; snapshot entries are links to blobs"""
+    if directory is None:
+        return []
+    shards = {path for pattern in SHARD_PATTERNS for path in Path(directory).glob(pattern)}
+    return sorted(shards)
+
+
+def _read_fully(fd: int, view: memoryview, offset: int) -> int:
+    """Fill `view` from `offset`, unless the file ends first; bytes read"""
+    done = 0
+    while done < len(view):
+        read = os.preadv(fd, [view[done:]], offset + done)
+        if not read:
+            break
+        done += read
+    return done
+
+
+def _write_fully(fd: int, view: memoryview, offset: int):
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view, offset = view[written:], offset + written
+
+
+def evict(paths):
+    """Drop the files' clean pages from the page cache, for a cold measurement"""
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+class Prefetcher:
+    """Reads `paths` block by block on a thread pool, in the background"""
+
+    def __init__(
+        self,
+        paths,
+        workers: int = WORKERS,
+        block: int = BLOCK_BYTES,
+        mode: str = "read",
+        copy_to=None,
+    ):
+        if mode not in ("read", "madvise"):
+            raise ValueError(f"unknown prefetch mode {mode!r}")
+        self.paths = [Path(path) for path in paths]
+        self.workers = workers
+        self.block = block
+        self.mode = mode
+        self.copy_to = None if copy_to is None else Path(copy_to)
+        self.bytes_done = 0
+        self.errors: list[str] = []
+        self.started: float | None = None  # time.monotonic()
+        self.finished: float | None = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self) -> "Prefetcher":
+        self._thread.start()
+        return self
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Whether the prefetch finished within `timeout` seconds"""
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def run(self):
+        self.started = time.monotonic()
+        tasks = []
+        for path in self.paths:
+            size = path.stat().st_size
+            target = None
+            if self.copy_to is not None:
+                target = self.copy_to / path.name
+                with open(target, "wb") as f:
+                    f.truncate(size)
+            # blocks of every file are interleaved, so all files progress together
+            tasks.append([(path, offset, size, target) for offset in range(0, size, self.block)])
+        blocks = [task for batch in _interleave(tasks) for task in batch]
+
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="prefetch") as pool:
+            for done in pool.map(self._fetch, blocks):
+                with self._lock:
+                    self.bytes_done += done
+        self.finished = time.monotonic()
+
+    def _fetch(self, task) -> int:
+        path, offset, size, target = task
+        length = min(self.block, size - offset)
+        try:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                if self.mode == "madvise" and target is None:
+                    start = offset - offset % mmap.ALLOCATIONGRANULARITY
+                    with mmap.mmap(
+                        fd, length + offset - start, access=mmap.ACCESS_READ, offset=start
+                    ) as view:
+                        view.madvise(mmap.MADV_WILLNEED)
+                    return length
+                buffer = getattr(self._local, "buffer", None)
+                if buffer is None:
+                    buffer = self._local.buffer = bytearray(self.block)
+                view = memoryview(buffer)[:length]
+                read = _read_fully(fd, view, offset)
+                if target is not None:
+                    if read < length:
+                        raise OSError(f"file ended after {offset + read} of {size} bytes")
+                    out = os.open(target, os.O_WRONLY)
+                    try:
+                        _write_fully(out, view, offset)
+                    finally:
+                        os.close(out)
+                return read
+            finally:
+                os.close(fd)
+        except OSError as e:
+            with self._lock:
+                self.errors.append(f"{path}@{offset}: {e}")
+            return 0
+
+    def stats(self) -> dict:
+        total = sum(path.stat().st_size for path in self.paths)
+        end = self.finished or time.monotonic()
+        elapsed = end - self.started if self.started is not None else 0.0
+        return {
+            "files": len(self.paths),
+            "gb": round(total / 1e9, 2),
+            "gb_done": round(self.bytes_done / 1e9, 2),
+            "seconds": round(elapsed, 2),
+            "gb_per_s": round(self.bytes_done / 1e9 / elapsed, 2) if elapsed else None,
+            "done": self.finished is not None,
+            "workers": self.workers,
+            "mode": "copy" if self.copy_to is not None else self.mode,
+            "errors": self.errors[:5],
+        }
+
+
+def _interleave(lists):
+    """Round-robin over lists of unequal length, one item from each per round"""
+    for i in range(max(map(len, lists), default=0)):
+        yield [items[i] for items in lists if i < len(items)]
+
+
+def copy_snapshot(snapshot, target, workers: int = WORKERS) -> dict:
+    """Copy a snapshot to `target`, in the cache's layout, shards in parallel
+
+    Raises `OSError`, with the copy deleted, unless every byte of every shard
+    was copied.
+    """
+    snapshot, target = Path(snapshot), Path(target)
+    repo = snapshot.parent.parent
+    copy = target / "hub" / repo.name
+    local = copy / "snapshots" / snapshot.name
+    try:
+        local.mkdir(parents=True, exist_ok=True)
+        if (repo / "refs").is_dir():
+            shutil.copytree(repo / "refs", copy / "refs", dirs_exist_ok=True)
+        shards = list_shards(snapshot)
+        for path in snapshot.iterdir():
+            if path not in shards and path.is_file():
+                shutil.copy(path, local / path.name)
+        prefetcher = Prefetcher(shards, workers, copy_to=local)
+        prefetcher.run()
+        stats = prefetcher.stats()
+        total = sum(path.stat().st_size for path in shards)
+        if prefetcher.errors or prefetcher.bytes_done < total:
+            raise OSError(f"incomplete copy of {snapshot}: {stats}")
+    except BaseException:
+        shutil.rmtree(copy, ignore_errors=True)
+        raise
+    return stats
+
+
+def read_sequentially(paths, block: int = 16 << 20) -> float:
+    """Seconds for one reader to go through every file in order, like a lazy loader"""
+    start = time.monotonic()
+    buffer = bytearray(block)
+    for path in paths:
+        with open(path, "rb", buffering=0) as f:
+            while f.readinto(buffer):
+                pass
+    return time.monotonic() - start
+
+
+def _bench(directory, workers: list[int], init_seconds: float, mode: str) -> dict:
+    paths = list_shards(directory)
+    if not paths:
+        raise SystemExit(f"no shards in {directory}")
+    gb = sum(path.stat().st_size for path in paths) / 1e9
+
+    evict(paths)
+    sequential = read_sequentially(paths)
+    results = {
+        "gb": round(gb, 2),
+        "sequential": {"seconds": round(sequential, 2), "gb_per_s": round(gb / sequential, 2)},
+        "prefetch": [],
+    }
+    for count in workers:
+        evict(paths)
+        prefetcher = Prefetcher(paths, count, mode=mode)
+        prefetcher.run()
+        results["prefetch"].append(prefetcher.stats())
+
+    # a loader that starts after `init_seconds`, with the prefetch running from the start
+    evict(paths)
+    start = time.monotonic()
+    prefetcher = Prefetcher(paths, max(workers), mode=mode).start()
+    time.sleep(init_seconds)
+    loaded = read_sequentially(paths)
+    total = time.monotonic() - start
+    prefetcher.wait()
+    results["startup"] = {
+        "init_seconds": init_seconds,
+        "load_seconds_cold": round(sequential, 2),
+        "load_seconds_prefetched": round(loaded, 2),
+        "time_saved_s": round(init_seconds + sequential - total, 2),
+    }
+    evict(paths)
+    return results
+
+
+def create_shards(directory, count: int, shard_mb: int):
+    """Write `count` files of random bytes, named like safetensors shards"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    chunk = os.urandom(1 << 20)
+    for i in range(count):
+        path = directory / f"model-{i + 1:05d}-of-{count:05d}.safetensors"
+        if path.exists() and path.stat().st_size == shard_mb << 20:
+            continue
+        with open(path, "wb") as f:
+            for _ in range(shard_mb):
+                f.write(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark weight prefetching")
+    parser.add_argument("--bench", required=True, help="Directory of shards")
+    parser.add_argument("--create", type=int, default=0, help="Write this many shards first")
+    parser.add_argument("--shard-mb", type=int, default=512)
+    parser.add_argument("--workers", default="1,4,16,32", help="Thread counts to try")
+    parser.add_argument("--mode", choices=("read", "madvise"), default="read")
+    parser.add_argument(
+        "--init-seconds", type=float, default=2.0, help="Simulated startup before loading"
+    )
+    args = parser.parse_args()
+
+    if args.create:
+        create_shards(args.bench, args.create, args.shard_mb)
+    workers = [int(count) for count in args.workers.split(",")]
+    print(json.dumps(_bench(args.bench, workers, args.init_seconds, args.mode), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
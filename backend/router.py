@@ -0,0 +1,510 @@
+"""Prefix-affinity router across `Server` replicas.
+
+SGLang's RadixAttention reuses the KV cache of any prompt prefix it has seen,
+but only on the replica that saw it. Agentic sessions resend their whole
+history (often 50k+ tokens) every step, so a session that hops between
+replicas pays for a full prefill each time it lands somewhere new.
+
+The router keeps each conversation on one replica by consistent-hashing a
+fingerprint of its stable prefix: the system prompt plus the first user
+message, or an explicit `X-Jazz-Session` header. Adding or removing a replica
+only moves the sessions that hashed to it. When a session's replica is past
+`max_load` (its `/load` score, or the router's own count of requests in
+flight), the request falls back along the ring to the next replica under
+the limit, which is the same one every time, so the fallback stays warm too.
+
+`/router/stats` reports, per replica, how many requests were routed to it,
+how many went to their ring owner, how many had a prefix the replica had
+already seen, and SGLang's own prefix cache hit rate from `/load`.
+
+Replicas are reached directly, not through a load balancer, so whatever
+autoscales them doesn't see the requests the router sends. Given an
+`overflow` URL, e.g. the load balancer's, the router sends requests there
+when no replica is under `max_load`, so demand past the replicas' capacity
+still reaches it.
+
+To compare hit rates against random routing with in-process fake replicas:
+
+```bash
+python router.py --simulate --replicas 4 --sessions 400
+```
+
+To route between local mock servers:
+
+```bash
+python mock_server.py --port 8001 & python mock_server.py --port 8002 &
+python router.py --replica a=http://localhost:8001 --replica b=http://localhost:8002
+```
+"""
+
+import argparse
+import asyncio
+import bisect
+import collections
+import hashlib
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+
+import aiohttp
+from aiohttp import web
+
+from gateway import ADMITTED_PATHS, HOP_BY_HOP, end_with_error, error_response
+
+ROUTER_PORT = 8000
+SESSION_HEADER = "X-Jazz-Session"
+REPLICA_REGISTRY = "jazz-replicas"  # modal.Dict of replica name -> {"url", "seen"}
+REGISTRY_HEARTBEAT = 15.0  # seconds between a replica's updates of its `seen` time
+REGISTRY_TTL = 60.0  # seconds after which a replica that stopped updating is dropped
+
+PROMPT_PREFIX_CHARS = 4096  # of a raw `/v1/completions` prompt, for its fingerprint
+
+
+def _hash(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+
+def fingerprint(payload: dict, session: str | None = None) -> str | None:
+    """A key for the part of a conversation that stays fixed across its turns"""
+    if session:
+        return session
+    messages = payload.get("messages")
+    if messages:
+        prefix = []
+        for message in messages:
+            prefix.append(message)
+            if message.get("role") not in ("system", "developer"):
+                break  # the first user turn tells sessions with one system prompt apart
+        stable = [payload.get("model"), prefix]
+    elif isinstance(payload.get("prompt"), str):
+        stable = [payload.get("model"), payload["prompt"][:PROMPT_PREFIX_CHARS]]
+    else:
+        return None
+    blob = json.dumps(stable, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.blake2b(blob.encode(), digest_size=8).hexdigest()
+
+
+def live_replicas(entries: dict, now: float, ttl: float = REGISTRY_TTL):
+    """Replica URLs by name from registry entries, and the names of stale entries"""
+    live, stale = {}, []
+    for name, entry in entries.items():
+        if isinstance(entry, dict) and now - entry.get("seen", 0) <= ttl:
+            live[name] = entry["url"]
+        else:  # the replica died without unregistering, or predates heartbeats
+            stale.append(name)
+    return live, stale
+
+
+class Heartbeat:
+    """Keeps a replica's registry entry fresh, on a thread, until `stop()`"""
+
+    def __init__(self, registry, name: str, url: str, interval: float = REGISTRY_HEARTBEAT):
+        self.registry = registry
+        self.name = name
+        self.url = url
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def beat(self):
+        self.registry[self.name] = {"url": self.url, "seen": time.time()}
+
+    def start(self) -> "Heartbeat":
+        self.beat()
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.beat()
+            except Exception as e:  # the entry expires if this keeps failing
+                print(f"Replica heartbeat failed: {type(e).__name__}: {e}")
+
+    def stop(self):
+        """Unregister, so the router stops sending requests here"""
+        self._stopped.set()
+        self._thread.join()
+        self.registry.pop(self.name, None)
+
+
+class HashRing:
+    """Consistent hashing with virtual nodes, so load spreads evenly"""
+
+    def __init__(self, names=(), vnodes: int = 100):
+        points = sorted(
+            (_hash(f"{name}#{i}".encode()), name) for name in names for i in range(vnodes)
+        )
+        self._points = [point for point, _ in points]
+        self._names = [name for _, name in points]
+        self.size = len(set(self._names))
+
+    def candidates(self, key: str) -> list[str]:
+        """Every replica, in the order a key falls back through them"""
+        if not self._points:
+            return []
+        start = bisect.bisect(self._points, _hash(key.encode()))
+        seen = []
+        for i in range(len(self._names)):
+            name = self._names[(start + i) % len(self._names)]
+            if name not in seen:
+                seen.append(name)
+                if len(seen) == self.size:
+                    break
+        return seen
+
+
+@dataclass
+class Replica:
+    name: str
+    url: str
+    capacity: int = 32  # requests in flight that count as fully loaded
+    in_flight: int = 0
+    score: float | None = None  # from the replica's `/load`
+    cache_hit_rate: float | None = None
+    healthy: bool = True
+    failures: int = 0
+    counters: dict = field(
+        default_factory=lambda: {"routed": 0, "owner": 0, "fallback": 0, "prefix_seen": 0}
+    )
+    # fingerprints routed here, most recent last, as a stand-in for its prefix cache
+    prefixes: collections.OrderedDict = field(default_factory=collections.OrderedDict)
+
+    def load(self) -> float:
+        return max(self.score or 0.0, self.in_flight / self.capacity)
+
+    def stats(self) -> dict:
+        routed = self.counters["routed"]
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "load": round(self.load(), 4),
+            **self.counters,
+            "prefix_hit_rate": round(self.counters["prefix_seen"] / routed, 4)
+            if routed
+            else None,
+            "cache_hit_rate": self.cache_hit_rate,
+        }
+
+
+class Router:
+    """Chooses replicas by prefix fingerprint, falling back when they're overloaded"""
+
+    def __init__(
+        self,
+        max_load: float = 1.0,
+        vnodes: int = 100,
+        capacity: int = 32,
+        max_prefixes: int = 10_000,
+    ):
+        self.max_load = max_load
+        self.vnodes = vnodes
+        self.capacity = capacity
+        self.max_prefixes = max_prefixes
+        self.replicas: dict[str, Replica] = {}
+        self.ring = HashRing()
+        self.overflow: Replica | None = None
+
+    def set_overflow(self, url: str | None):
+        """Where to send requests when no replica is under `max_load`"""
+        self.overflow = None if url is None else Replica("overflow", url.rstrip("/"))
+
+    def set_replicas(self, urls: dict[str, str]):
+        """Replace the replica set, keeping the state of replicas that stay"""
+        replicas = {}
+        for name, url in urls.items():
+            replica = self.replicas.get(name)
+            if replica is None or replica.url != url:
+                replica = Replica(name, url.rstrip("/"), capacity=self.capacity)
+            replicas[name] = replica
+        if replicas.keys() != self.replicas.keys():
+            self.ring = HashRing(replicas, self.vnodes)
+        self.replicas = replicas
+
+    def choose(self, key: str | None) -> list[Replica]:
+        """Healthy replicas in the order to try them"""
+        if key is None:
+            ordered = sorted(self.replicas.values(), key=Replica.load)
+        else:
+            ordered = [self.replicas[name] for name in self.ring.candidates(key)]
+        healthy = [replica for replica in ordered if replica.healthy]
+        under = [replica for replica in healthy if replica.load() < self.max_load]
+        over = sorted(
+            (replica for replica in healthy if replica.load() >= self.max_load),
+            key=Replica.load,
+        )
+        overflow = [self.overflow] if self.overflow is not None else []
+        return under + overflow + over
+
+    def record(self, replica: Replica, key: str | None):
+        """Count a request routed to `replica`"""
+        counters = replica.counters
+        counters["routed"] += 1
+        if key is None:
+            return
+        owner = self.ring.candidates(key)[:1]
+        counters["owner" if owner == [replica.name] else "fallback"] += 1
+        prefixes = replica.prefixes
+        if key in prefixes:
+            counters["prefix_seen"] += 1
+            prefixes.move_to_end(key)
+        else:
+            prefixes[key] = None
+            if len(prefixes) > self.max_prefixes:
+                prefixes.popitem(last=False)
+
+    def observe_load(self, replica: Replica, load: dict | None):
+        """Update a replica from its `/load` JSON, or from a failed poll if None"""
+        if load is None:
+            replica.failures += 1
+            replica.healthy = replica.failures < 3
+            return
+        replica.failures = 0
+        replica.healthy = True
+        replica.score = load.get("score")
+        replica.cache_hit_rate = load.get("cache_hit_rate")
+
+    def stats(self) -> dict:
+        return {
+            "max_load": self.max_load,
+            "replicas": {name: replica.stats() for name, replica in self.replicas.items()},
+            "overflow": self.overflow.stats() if self.overflow is not None else None,
+        }
+
+
+def make_app(router: Router, discover=None, interval: float = 1.0) -> web.Application:
+    """Proxy to the replicas chosen by `router`.
+
+    `discover`, if given, is a blocking function returning replica names and URLs,
+    called every `interval` seconds alongside the `/load` polls."""
+    app = web.Application(client_max_size=64 * 1024**2)
+    app["router"] = router
+
+    async def poll(app):
+        session: aiohttp.ClientSession = app["session"]
+        timeout = aiohttp.ClientTimeout(total=max(interval, 1.0))
+
+        async def poll_one(replica: Replica):
+            try:
+                async with session.get(f"{replica.url}/load", timeout=timeout) as resp:
+                    if resp.status == 404:  # no metrics sidecar: healthy, but no score
+                        router.observe_load(replica, {})
+                        return
+                    resp.raise_for_status()
+                    router.observe_load(replica, await resp.json())
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                router.observe_load(replica, None)
+
+        while True:
+            if discover is not None:
+                try:
+                    router.set_replicas(await asyncio.to_thread(discover))
+                except Exception as e:  # keep routing to the replicas we know
+                    print(f"Replica discovery failed: {type(e).__name__}: {e}")
+            await asyncio.gather(*(poll_one(r) for r in list(router.replicas.values())))
+            await asyncio.sleep(interval)
+
+    async def start(app):
+        app["session"] = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=10),
+            auto_decompress=False,
+        )
+        app["poller"] = asyncio.create_task(poll(app))
+
+    async def stop(app):
+        app["poller"].cancel()
+        await app["session"].close()
+
+    async def stats(request):
+        return web.json_response(router.stats())
+
+    async def proxy(request: web.Request) -> web.StreamResponse:
+        body = await request.read()
+        key = request.headers.get(SESSION_HEADER)
+        if request.method == "POST" and request.path in ADMITTED_PATHS:
+            try:
+                key = fingerprint(json.loads(body) if body else {}, key)
+            except (json.JSONDecodeError, AttributeError):
+                pass
+
+        headers = {
+            name: value
+            for name, value in request.headers.items()
+            if name.lower() not in HOP_BY_HOP
+        }
+        attempts = router.choose(key)
+        if not attempts:
+            return error_response(503, "No healthy replicas", "server_error", 1)
+
+        for i, replica in enumerate(attempts):
+            last = i == len(attempts) - 1
+            replica.in_flight += 1
+            resp = None
+            try:
+                async with request.app["session"].request(
+                    request.method,
+                    replica.url + request.path_qs,
+                    headers=headers,
+                    data=body,
+                ) as upstream:
+                    if upstream.status == 503 and not last:  # draining or starting up
+                        replica.healthy = False
+                        continue
+                    router.record(replica, key)
+                    resp = web.StreamResponse(
+                        status=upstream.status,
+                        headers={
+                            name: value
+                            for name, value in upstream.headers.items()
+                            if name.lower() not in HOP_BY_HOP
+                        },
+                    )
+                    await resp.prepare(request)
+                    async for chunk in upstream.content.iter_any():
+                        await resp.write(chunk)
+                    await resp.write_eof()
+                    return resp
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError) as e:
+                if request.transport is None or request.transport.is_closing():
+                    raise  # the client is gone, not the replica
+                replica.healthy = False
+                if resp is not None and resp.prepared:
+                    # the client has part of this replica's response, so another
+                    # replica's can't follow it; end it the way a drained stream ends
+                    error = {
+                        "message": "Replica connection lost; resend the request to resume",
+                        "type": "server_error",
+                        "code": 502,
+                        "resumable": True,
+                    }
+                    return await end_with_error(resp, error)
+                if last:
+                    message = f"Replica error: {type(e).__name__}"
+                    return error_response(502, message, "server_error")
+            finally:
+                replica.in_flight -= 1
+        return error_response(503, "No healthy replicas", "server_error", 1)
+
+    app.on_startup.append(start)
+    app.on_cleanup.append(stop)
+    app.router.add_get("/router/stats", stats)
+    app.router.add_route("*", "/{tail:.*}", proxy)
+    return app
+
+
+def simulate(
+    replicas: int = 4,
+    sessions: int = 400,
+    turns: int = 10,
+    cache_sessions: int = 64,
+    concurrency: int = 32,
+    seed: int = 0,
+) -> dict:
+    """Route sessions to in-process fake replicas and compare prefix hits by policy.
+
+    `concurrency` sessions are active at a time, each sending `turns` requests in a
+    random interleaving. Each fake replica keeps the prefixes of its last
+    `cache_sessions` sessions, and a request stays in flight for the next
+    `concurrency` requests."""
+    rng = random.Random(seed)
+    system = {"role": "system", "content": "You are a coding agent. " * 200}
+    keys = [
+        fingerprint({"messages": [system, {"role": "user", "content": f"Task {i}"}]})
+        for i in range(sessions)
+    ]
+    order, active, started = [], [], 0
+    while active or started < sessions:
+        while len(active) < concurrency and started < sessions:
+            active.append([started, turns])
+            started += 1
+        i = rng.randrange(len(active))
+        order.append(active[i][0])
+        active[i][1] -= 1
+        if not active[i][1]:
+            active.pop(i)
+
+    names = {f"replica-{i}": f"fake://{i}" for i in range(replicas)}
+    results = {}
+    for policy in ("random", "least_loaded", "affinity"):
+        # twice an even share of the load, so affinity can be a little uneven
+        router = Router(capacity=max(1, 2 * concurrency // replicas))
+        router.set_replicas(names)
+        caches = {name: collections.OrderedDict() for name in names}
+        in_flight = collections.deque()
+        hits = 0
+        for session in order:
+            key = keys[session]
+            if policy == "random":
+                replica = router.replicas[rng.choice(list(names))]
+            elif policy == "least_loaded":
+                replica = router.choose(None)[0]
+            else:
+                replica = router.choose(key)[0]
+            router.record(replica, key)
+
+            cache = caches[replica.name]
+            if key in cache:
+                hits += 1
+                cache.move_to_end(key)
+            else:
+                cache[key] = None
+                if len(cache) > cache_sessions:
+                    cache.popitem(last=False)
+
+            replica.in_flight += 1
+            in_flight.append(replica)
+            if len(in_flight) > concurrency:
+                in_flight.popleft().in_flight -= 1
+
+        counters = [replica.counters for replica in router.replicas.values()]
+        fallbacks = sum(c["fallback"] for c in counters)
+        results[policy] = {
+            "prefix_hit_rate": round(hits / len(order), 4),
+            "max_share": round(max(c["routed"] for c in counters) / len(order), 4),
+            "fallback_rate": round(fallbacks / len(order), 4) if policy == "affinity" else None,
+        }
+
+    # how many sessions move when a replica joins: ideally 1 / (replicas + 1)
+    before = HashRing(names)
+    after = HashRing({**names, "replica-new": ""})
+    moved = sum(before.candidates(key)[0] != after.candidates(key)[0] for key in keys)
+    results["moved_on_scale_up"] = round(moved / len(keys), 4)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefix-affinity router across replicas")
+    parser.add_argument(
+        "--replica", action="append", default=[], help="name=url, repeatable"
+    )
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=ROUTER_PORT)
+    parser.add_argument("--max-load", type=float, default=1.0)
+    parser.add_argument("--capacity", type=int, default=32, help="Requests per replica")
+    parser.add_argument("--overflow", help="URL for requests when every replica is loaded")
+    parser.add_argument("--simulate", action="store_true", help="Use in-process fakes")
+    parser.add_argument("--replicas", type=int, default=4)
+    parser.add_argument("--sessions", type=int, default=400)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--cache-sessions", type=int, default=64)
+    args = parser.parse_args()
+
+    if args.simulate:
+        report = simulate(args.replicas, args.sessions, args.turns, args.cache_sessions)
+        print(json.dumps(report, indent=2))
+        return
+
+    router = Router(max_load=args.max_load, capacity=args.capacity)
+    router.set_replicas(dict(replica.split("=", 1) for replica in args.replica))
+    router.set_overflow(args.overflow)
+    print(f"Routing between {list(router.replicas)}")
+    app = make_app(router)
+    web.run_app(app, host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
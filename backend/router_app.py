@@ -0,0 +1,62 @@
+"""The prefix-affinity router (see `router.py`) as its own small Modal app.
+
+`Server` replicas deployed with `APP_USE_ROUTER=1` open a tunnel to their
+gateway and register its URL in a `modal.Dict`, which the router polls.
+Replicas refresh their entry every `REGISTRY_HEARTBEAT` seconds, and the
+router deletes entries that go `REGISTRY_TTL` seconds without a refresh, e.g.
+from a replica that crashed before it could unregister.
+
+Requests through a tunnel bypass the `Server`'s web endpoint, so Modal's
+autoscaler doesn't count them: routed traffic neither scales replicas up
+nor keeps them from being scaled down after `scaledown_window`. The router
+sends requests to that endpoint instead when every replica is past its load
+limit, so the autoscaler sees demand beyond the replicas it has. Keep the
+`Server`'s `min_containers` at the number of replicas the routed load needs,
+since a replica that only serves routed requests looks idle.
+
+```bash
+APP_USE_ROUTER=1 modal deploy backend.py
+modal deploy router_app.py
+```
+"""
+
+import time
+
+import modal
+
+from client import server_url
+from gateway import Gateway
+from router import REPLICA_REGISTRY, ROUTER_PORT, Router, live_replicas, make_app
+
+image = (
+    modal.Image.debian_slim(python_version="3.12")
+    .uv_pip_install("aiohttp")
+    .add_local_python_source(
+        "gateway", "router", "metering", "jazz_sse", "jazz_trace", "coalesce", "client"
+    )
+)
+
+app = modal.App("jazz-router", image=image)
+
+replica_registry = modal.Dict.from_name(REPLICA_REGISTRY, create_if_missing=True)
+
+
+def discover() -> dict[str, str]:
+    live, stale = live_replicas(dict(replica_registry.items()), time.time())
+    for name in stale:
+        replica_registry.pop(name, None)
+        print(f"Dropped replica {name}: no heartbeat")
+    return live
+
+
+# one router keeps an exact view of load; more would still agree on ring owners
+@app.function(min_containers=1, max_containers=1)
+@modal.concurrent(max_inputs=1000)
+@modal.web_server(port=ROUTER_PORT, startup_timeout=60)
+def serve():
+    router = Router()
+    try:
+        router.set_overflow(server_url())
+    except Exception as e:  # route between registered replicas only
+        print(f"No overflow URL: {type(e).__name__}: {e}")
+    Gateway(make_app(router, discover), ROUTER_PORT).start()
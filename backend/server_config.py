@@ -0,0 +1,264 @@
+"""Typed, validated options for `sglang.launch_server`.
+
+Options are merged from three layers, later ones winning:
+
+1. code defaults from `backend.py` (model, parallelism, port, ...)
+2. the YAML config (`config.yaml`, or `APP_LOCAL_CONFIG_PATH`)
+3. environment overrides like `APP_SERVER_MAX_RUNNING_REQUESTS=64`
+
+`backend.py` builds and validates the merged config on import, so a bad
+combination fails locally in milliseconds rather than after a GPU cold start.
+The server is then launched from an argv list, without a shell.
+
+To check a config without Modal:
+
+```bash
+python server_config.py config_fa4.yaml
+```
+"""
+
+import argparse
+import os
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+
+ENV_PREFIX = "APP_SERVER_"
+
+# performance-sensitive options we check; anything else is passed through as-is
+OPTION_TYPES = {
+    "port": int,
+    "tp": int,
+    "dp": int,
+    "enable-dp-attention": bool,
+    "max-running-requests": int,
+    "cuda-graph-max-bs": int,
+    "chunked-prefill-size": int,
+    "mem-fraction-static": float,
+    "page-size": int,
+    "attention-backend": str,
+    "kv-cache-dtype": str,
+    "speculative-algorithm": str,
+    "speculative-num-steps": int,
+    "speculative-eagle-topk": int,
+    "speculative-num-draft-tokens": int,
+}
+
+# attention backends that only run with particular KV cache page sizes
+BACKEND_PAGE_SIZES = {
+    "fa4": {128},
+    "flashmla": {64},
+    "cutlass_mla": {128},
+    "trtllm_mla": {32, 64},
+}
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def default_options(
+    repo_id: str,
+    gpu_count: int,
+    port: int,
+    dummy_weights: bool = False,
+) -> dict:
+    """The options `backend.py` sets in code"""
+    options = {
+        "host": "0.0.0.0",
+        "port": port,
+        "model-path": repo_id,
+        "served-model-name": "llm",
+        "tp": gpu_count,
+        "dp": gpu_count,
+        "enable-dp-attention": True,
+    }
+    if dummy_weights:
+        options["load-format"] = "dummy"
+    return options
+
+
+def env_overrides(environ=None) -> dict[str, str]:
+    """Options set as `APP_SERVER_<OPTION>` environment variables"""
+    environ = os.environ if environ is None else environ
+    return {
+        key[len(ENV_PREFIX) :].lower().replace("_", "-"): value
+        for key, value in environ.items()
+        if key.startswith(ENV_PREFIX)
+    }
+
+
+def coerce(name: str, value):
+    """Convert an option to its known type, e.g. from an environment string"""
+    kind = OPTION_TYPES.get(name)
+    if kind is not None and kind is not bool and isinstance(value, bool):
+        # a bool is an int to Python, but `max-running-requests: true` is a mistake
+        raise ConfigError(f"{name}: expected {kind.__name__}, got {value!r}")
+    if kind is None or value is None or isinstance(value, kind):
+        return value
+    if kind is bool:
+        text = str(value).strip().lower()
+        if text in ("1", "true", "yes", "on"):
+            return True
+        if text in ("0", "false", "no", "off"):
+            return False
+        raise ConfigError(f"{name}: expected a boolean, got {value!r}")
+    if kind is float and isinstance(value, int):
+        return float(value)
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        raise ConfigError(f"{name}: expected {kind.__name__}, got {value!r}") from None
+
+
+def load_yaml(path) -> dict:
+    import yaml
+
+    with open(path) as f:
+        options = yaml.safe_load(f) or {}
+    if not isinstance(options, dict):
+        raise ConfigError(f"{path}: expected a mapping of options")
+    return options
+
+
+@dataclass
+class ServerConfig:
+    options: dict
+    sources: dict[str, str] = field(default_factory=dict)  # option -> layer it came from
+    gpu_count: int | None = None
+
+    @classmethod
+    def load(
+        cls,
+        defaults: dict,
+        config_path=None,
+        environ=None,
+        gpu_count: int | None = None,
+        config: dict | None = None,
+    ) -> "ServerConfig":
+        """Merge the layers; `config` stands in for an already-parsed YAML file"""
+        layers = [("default", defaults)]
+        if config is not None:
+            layers.append(("config", config))
+        elif config_path is not None:
+            layers.append((Path(config_path).name, load_yaml(config_path)))
+        layers.append(("env", env_overrides(environ)))
+
+        options, sources = {}, {}
+        for source, layer in layers:
+            for name, value in layer.items():
+                options[name] = coerce(name, value)
+                sources[name] = source
+        return cls(options, sources, gpu_count)
+
+    def get(self, name: str, default=None):
+        return self.options.get(name, default)
+
+    def _describe(self, name: str) -> str:
+        return f"{name}={self.options[name]} (from {self.sources.get(name, '?')})"
+
+    def problems(self) -> tuple[list[str], list[str]]:
+        """Errors that would fail or cripple the server, and softer warnings"""
+        errors, warnings = [], []
+        get = self.options.get
+        show = self._describe
+
+        tp, dp = get("tp", 1), get("dp", 1)
+        if tp < 1 or dp < 1:
+            errors.append(f"tp and dp must be positive: {show('tp')}, {show('dp')}")
+        elif tp % dp:
+            errors.append(f"dp must divide tp: {show('tp')}, {show('dp')}")
+        if self.gpu_count is not None and tp > self.gpu_count:
+            errors.append(f"{show('tp')} needs more than the {self.gpu_count} GPUs requested")
+        if get("enable-dp-attention") and dp == 1:
+            warnings.append("enable-dp-attention has no effect with dp=1")
+
+        running, graph_bs = get("max-running-requests"), get("cuda-graph-max-bs")
+        if running is not None and graph_bs is not None and graph_bs < running:
+            errors.append(
+                "cuda-graph-max-bs must be at least max-running-requests, or full batches "
+                f"decode without CUDA graphs: {show('cuda-graph-max-bs')}, "
+                f"{show('max-running-requests')}"
+            )
+
+        backend = get("attention-backend")
+        if backend in BACKEND_PAGE_SIZES:
+            page_size = get("page-size", 1)
+            allowed = sorted(BACKEND_PAGE_SIZES[backend])
+            if page_size not in allowed:
+                source = self.sources.get("page-size", "SGLang default")
+                errors.append(
+                    f"attention-backend={backend} needs page-size in {allowed}, "
+                    f"got {page_size} (from {source})"
+                )
+
+        fraction = get("mem-fraction-static")
+        if fraction is not None and not 0 < fraction < 1:
+            errors.append(f"mem-fraction-static must be in (0, 1): {show('mem-fraction-static')}")
+
+        chunk = get("chunked-prefill-size")
+        if chunk is not None and chunk != -1 and chunk <= 0:
+            errors.append(
+                "chunked-prefill-size must be positive, or -1 to disable: "
+                f"{show('chunked-prefill-size')}"
+            )
+
+        if not get("speculative-algorithm"):
+            stray = [name for name in self.options if name.startswith("speculative-")]
+            if stray:
+                errors.append(
+                    f"speculative options set without speculative-algorithm: {', '.join(stray)}"
+                )
+
+        return errors, warnings
+
+    def validate(self, out=sys.stderr) -> "ServerConfig":
+        """Raise `ConfigError` listing every error; print warnings to `out`"""
+        errors, warnings = self.problems()
+        for warning in warnings:
+            print(f"Server config warning: {warning}", file=out)
+        if errors:
+            raise ConfigError("Invalid server config:\n  " + "\n  ".join(errors))
+        return self
+
+    def argv(self) -> list[str]:
+        """Command-line flags for `sglang.launch_server` and friends
+
+        A list, like `cuda-graph-bs: [1, 2, 4, 8]`, becomes one flag followed by
+        each value, for SGLang's multi-value (`nargs="+"`) options."""
+        args = []
+        for name, value in self.options.items():
+            if value is None or value is False or value == []:
+                continue
+            args.append(f"--{name}")
+            if isinstance(value, (list, tuple)):
+                args.extend(map(str, value))
+            elif value is not True:
+                args.append(str(value))
+        return args
+
+    def launch_command(self, module: str = "sglang.launch_server") -> list[str]:
+        return ["python", "-m", module, *self.argv()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate an SGLang server config")
+    parser.add_argument("config", nargs="?", default=Path(__file__).parent / "config.yaml")
+    parser.add_argument("--repo-id", default="zai-org/GLM-5-FP8")
+    parser.add_argument("--gpu-count", type=int, default=8)
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    defaults = default_options(args.repo_id, args.gpu_count, args.port)
+    try:
+        config = ServerConfig.load(defaults, args.config, gpu_count=args.gpu_count)
+        config.validate()
+    except ConfigError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(" ".join(config.launch_command()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
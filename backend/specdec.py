@@ -0,0 +1,320 @@
+"""Speculative decoding telemetry, and when speculation pays off at our batch sizes.
+
+With `speculative-algorithm: EAGLE` (multi-token prediction, for GLM), each
+decode step drafts `speculative-num-steps` tokens and the target model
+verifies them in one pass. At small batches decode is memory-bound, so
+verifying several tokens per request costs about as much as decoding one.
+At large batches verification is compute-bound and the rejected drafts are
+wasted work. Where the crossover lies depends on the acceptance rate and
+on how busy the replica is.
+
+SGLang reports the mean accept length (tokens emitted per verify step,
+bonus token included) on every `Decode batch.` log line, next to the running
+batch size and throughput, and as the `spec_accept_length` gauge. `DecodeStats`
+buckets those samples by running batch size: `Server` feeds it its log, and the
+metrics sidecar serves its summary at `/load`.
+SGLang doesn't log accept lengths per request, so each bucket averages batch
+means, and requests that draft well or badly are only visible in aggregate.
+
+Offline, `recommend` fits a per-token acceptance rate to the observed accept
+length and uses a simple step-time model to estimate the speedup for each
+draft step count at the observed concurrency. Here `t(n)` is the time of a
+forward pass over `n` tokens, flat until `saturation` tokens, then linear:
+
+    speedup(B, k) = accept_len(k) * t(B) / (t(B * (k + 1)) + k * draft_cost * t(B))
+
+If logs from a run without speculation are given as a `--baseline`, the
+measured per-request throughput ratio is reported next to the model.
+
+```bash
+python specdec.py fixtures/sglang_decode.log --baseline fixtures/sglang_decode_nospec.log
+python specdec.py default=logs/a.log fa4=logs/b.log fixtures/sglang_metrics.prom --steps 3
+```
+"""
+
+import argparse
+import json
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+from metrics import parse_prometheus, snapshot
+
+BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+DECODE_LINE = "Decode batch"
+RUNNING_PATTERN = re.compile(r"#running-req: (\d+)")
+# a number, so a truncated line like "accept len: ." is skipped rather than
+# raising in float() on the log watcher's thread
+ACCEPT_PATTERN = re.compile(r"accept len: (\d+(?:\.\d+)?)")
+THROUGHPUT_PATTERN = re.compile(r"gen throughput \(token/s\): (\d+(?:\.\d+)?)")
+
+DRAFT_COST = 0.1  # one draft step, relative to a memory-bound target decode step
+SATURATION_TOKENS = 64  # tokens per forward pass where decode turns compute-bound
+MIN_SPEEDUP = 1.05  # below this, speculation isn't worth its memory and complexity
+
+
+@dataclass
+class DecodeSample:
+    running: int
+    gen_throughput: float | None
+    accept_len: float | None  # None when speculation is off
+
+
+def parse_decode_line(line: str) -> DecodeSample | None:
+    if DECODE_LINE not in line:
+        return None
+    running = RUNNING_PATTERN.search(line)
+    if running is None:
+        return None
+    accept = ACCEPT_PATTERN.search(line)
+    throughput = THROUGHPUT_PATTERN.search(line)
+    return DecodeSample(
+        int(running.group(1)),
+        float(throughput.group(1)) if throughput else None,
+        float(accept.group(1)) if accept else None,
+    )
+
+
+def sample_from_metrics(samples: dict) -> DecodeSample | None:
+    """One sample from a scrape, parsed by `metrics.parse_prometheus`"""
+    snap = snapshot(samples)
+    accept = [value for _, value in samples.get("sglang:spec_accept_length", [])]
+    if not snap.running:
+        return None
+    return DecodeSample(
+        round(snap.running),
+        snap.gen_throughput,
+        sum(accept) / len(accept) if accept else None,
+    )
+
+
+def bucket(running: int) -> int:
+    """The smallest bucket that holds a batch of `running` requests"""
+    return next((b for b in BUCKETS if running <= b), BUCKETS[-1])
+
+
+class DecodeStats:
+    """Accept length and per-request throughput by running batch size
+
+    Thread-safe: `Server`'s log thread adds samples while the metrics sidecar
+    reads the summary.
+    """
+
+    def __init__(self, steps: int | None = None):
+        self.steps = steps  # speculative-num-steps, for the draft efficiency
+        # bucket -> [samples, accept sum, accept samples, per-request tps sum, tps samples]
+        self.buckets: dict[int, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, sample: DecodeSample):
+        if sample.running < 1:
+            return
+        with self._lock:
+            totals = self.buckets.setdefault(bucket(sample.running), [0, 0.0, 0, 0.0, 0])
+            totals[0] += 1
+            if sample.accept_len is not None:
+                totals[1] += sample.accept_len
+                totals[2] += 1
+            if sample.gen_throughput:
+                totals[3] += sample.gen_throughput / sample.running
+                totals[4] += 1
+
+    def observe_line(self, line: str):
+        """Feed one server log line; for `LogWatcher(listeners=...)`"""
+        sample = parse_decode_line(line)
+        if sample is not None:
+            self.add(sample)
+
+    @property
+    def samples(self) -> int:
+        return sum(int(totals[0]) for totals in self.buckets.values())
+
+    def accept_len(self) -> float | None:
+        """Mean accept length over all samples with one"""
+        count = sum(totals[2] for totals in self.buckets.values())
+        if not count:
+            return None
+        return sum(totals[1] for totals in self.buckets.values()) / count
+
+    def concurrency(self) -> dict[int, float]:
+        """Fraction of decode samples in each batch size bucket"""
+        total = self.samples
+        return {b: self.buckets[b][0] / total for b in sorted(self.buckets)} if total else {}
+
+    def per_request_tps(self) -> dict[int, float]:
+        return {
+            b: totals[3] / totals[4] for b, totals in sorted(self.buckets.items()) if totals[4]
+        }
+
+    def copy(self) -> "DecodeStats":
+        """A snapshot, consistent even while samples are being added"""
+        clone = DecodeStats(self.steps)
+        with self._lock:
+            clone.buckets = {b: list(totals) for b, totals in self.buckets.items()}
+        return clone
+
+    def summary(self, steps: int | None = None) -> dict:
+        """Telemetry for `/load`; `steps` defaults to the one given at construction"""
+        stats = self.copy()
+        steps = steps or self.steps
+        accept = stats.accept_len()
+        tps = stats.per_request_tps()
+        return {
+            "samples": stats.samples,
+            "accept_len": _round(accept),
+            # drafted tokens that were accepted; the bonus token isn't drafted
+            "draft_efficiency": _round((accept - 1) / steps) if accept and steps else None,
+            "by_batch": {
+                f"<={b}": {
+                    "samples": int(totals[0]),
+                    "accept_len": _round(totals[1] / totals[2]) if totals[2] else None,
+                    "per_request_tps": _round(tps.get(b)),
+                }
+                for b, totals in sorted(stats.buckets.items())
+            },
+        }
+
+
+def _round(value, digits: int = 3):
+    return None if value is None else round(value, digits)
+
+
+def expected_accept_len(alpha: float, steps: int) -> float:
+    """Tokens per verify step if each draft token is accepted with probability `alpha`"""
+    if alpha >= 1:
+        return steps + 1.0
+    return (1 - alpha ** (steps + 1)) / (1 - alpha)
+
+
+def acceptance_rate(accept_len: float, steps: int) -> float:
+    """The per-token `alpha` that explains a mean accept length, by bisection"""
+    low, high = 0.0, 1.0
+    for _ in range(60):
+        mid = (low + high) / 2
+        if expected_accept_len(mid, steps) < accept_len:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2
+
+
+def step_time(tokens: float, saturation: float) -> float:
+    """Forward pass time over `tokens` tokens, in units of a memory-bound pass"""
+    return max(1.0, tokens / saturation)
+
+
+def modeled_speedup(
+    running: int,
+    alpha: float,
+    steps: int,
+    draft_cost: float = DRAFT_COST,
+    saturation: float = SATURATION_TOKENS,
+) -> float:
+    base = step_time(running, saturation)
+    spec = step_time(running * (steps + 1), saturation) + steps * draft_cost * base
+    return expected_accept_len(alpha, steps) * base / spec
+
+
+def recommend(
+    stats: DecodeStats,
+    steps: int,
+    baseline: DecodeStats | None = None,
+    draft_cost: float = DRAFT_COST,
+    saturation: float = SATURATION_TOKENS,
+    max_steps: int = 6,
+) -> dict:
+    """Whether to speculate, and how many draft steps, at the observed concurrency"""
+    accept = stats.accept_len()
+    if accept is None:
+        return {"error": "no accept lengths in the samples; is speculation on?"}
+    alpha = acceptance_rate(accept, steps)
+    mix = stats.concurrency()
+
+    def weighted(k: int) -> float:
+        return sum(
+            share * modeled_speedup(b, alpha, k, draft_cost, saturation)
+            for b, share in mix.items()
+        )
+
+    by_steps = {k: weighted(k) for k in range(1, max_steps + 1)}
+    best = max(by_steps, key=by_steps.get)
+    crossover = next(
+        (b for b in BUCKETS if modeled_speedup(b, alpha, best, draft_cost, saturation) < 1),
+        None,
+    )
+    report = {
+        "accept_len": round(accept, 3),
+        "acceptance_rate": round(alpha, 3),
+        "modeled_speedup_by_steps": {k: round(v, 3) for k, v in by_steps.items()},
+        "recommended_steps": best if by_steps[best] >= MIN_SPEEDUP else None,
+        "speculate": by_steps[best] >= MIN_SPEEDUP,
+        "modeled_crossover_batch": crossover,  # speculation loses from this batch size on
+        "concurrency": {f"<={b}": round(share, 3) for b, share in mix.items()},
+    }
+    if baseline is not None:
+        spec_tps, base_tps = stats.per_request_tps(), baseline.per_request_tps()
+        measured = {b: spec_tps[b] / base_tps[b] for b in spec_tps if base_tps.get(b)}
+        report["measured_speedup_by_batch"] = {f"<={b}": round(v, 3) for b, v in measured.items()}
+        if measured:
+            shares = {b: mix.get(b, 0.0) for b in measured}
+            total = sum(shares.values())
+            if total:
+                report["measured_speedup"] = round(
+                    sum(shares[b] * measured[b] for b in measured) / total, 3
+                )
+    return report
+
+
+def load_stats(paths) -> DecodeStats:
+    """Samples from SGLang logs and Prometheus scrapes (`.prom`) or directories of them"""
+    stats = DecodeStats()
+    files = []
+    for path in map(Path, paths):
+        files += sorted(p for p in path.iterdir() if p.is_file()) if path.is_dir() else [path]
+    for path in files:
+        if path.suffix == ".prom":
+            sample = sample_from_metrics(parse_prometheus(path.read_text()))
+            if sample is not None:
+                stats.add(sample)
+            continue
+        with open(path, errors="replace") as f:
+            for line in f:
+                stats.observe_line(line)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "inputs", nargs="+", help="Logs or .prom dumps, as [class=]path; a class per replica kind"
+    )
+    parser.add_argument("--baseline", nargs="*", default=[], help="Logs from a run without it")
+    parser.add_argument("--steps", type=int, default=3, help="speculative-num-steps in the logs")
+    parser.add_argument("--draft-cost", type=float, default=DRAFT_COST)
+    parser.add_argument("--saturation-tokens", type=float, default=SATURATION_TOKENS)
+    args = parser.parse_args()
+
+    classes: dict[str, list[str]] = {}
+    for spec in args.inputs:
+        name, _, path = spec.rpartition("=")
+        classes.setdefault(name or "default", []).append(path)
+    baseline = load_stats(args.baseline) if args.baseline else None
+
+    report = {}
+    for name, paths in classes.items():
+        stats = load_stats(paths)
+        report[name] = {
+            "telemetry": stats.summary(args.steps),
+            "recommendation": recommend(
+                stats, args.steps, baseline, args.draft_cost, args.saturation_tokens
+            ),
+        }
+    if baseline is not None:
+        report["baseline"] = baseline.summary()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
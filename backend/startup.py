@@ -0,0 +1,313 @@
+"""Readiness checks and cold start profiling for the SGLang server subprocess.
+
+Rather than polling `/health` on a fixed interval, we tail the server's log
+output and poll with exponential backoff, checking immediately whenever
+the log says the server is up and failing fast if the process dies.
+
+The same log stream is parsed into startup phases (weight loading, kernel JIT,
+CUDA graph capture, ...), which `StartupProfiler` combines with phases timed
+in `Server.start` into a cold start timeline.
+
+To check a recorded log, e.g. after bumping the SGLang image or the patch:
+
+```bash
+python startup.py sglang.log
+```
+"""
+
+import argparse
+import collections
+import contextlib
+import datetime
+import http.client
+import json
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+import urllib.request
+
+# phase name -> (begin pattern, end pattern); a phase spans from the first
+# begin match to the last end match, since every rank logs its own lines
+PHASES = {
+    "distributed_init": (r"Init torch distributed begin", r"Init torch distributed ends"),
+    "weight_load": (r"Load weight begin", r"Load weight end"),
+    "kv_cache_alloc": (r"Memory pool end|KV Cache is allocated", r"KV Cache is allocated"),
+    "kernel_jit": (r"DeepGEMM|JIT [Cc]ompil", r"DeepGEMM|JIT [Cc]ompil"),
+    "cuda_graph_capture": (r"Capture cuda graph begin", r"Capture cuda graph end"),
+    "server_warmup": (r"Uvicorn running on", r"The server is fired up and ready to roll"),
+}
+
+READY_PATTERN = re.compile(
+    r"The server is fired up and ready to roll|Uvicorn running on"
+)
+
+# SGLang prefixes log lines like "[2026-02-07 00:12:34 DP0 TP0] ..."
+LOG_TIMESTAMP_PATTERN = re.compile(
+    r"^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?)"
+)
+
+
+def log_timestamp(line: str) -> float | None:
+    """Wall-clock time of an SGLang log line, if it has a timestamp prefix"""
+    match = LOG_TIMESTAMP_PATTERN.match(line)
+    if match is None:
+        return None
+    return datetime.datetime.fromisoformat(match.group(1)).timestamp()
+
+
+class LogParser:
+    """Extracts startup phases from SGLang log lines"""
+
+    def __init__(self, phases: dict[str, tuple[str, str]] = PHASES):
+        self.phases: dict[str, dict[str, float]] = {}
+        self.ready_at: float | None = None
+        self._patterns = {
+            name: (re.compile(begin), re.compile(end))
+            for name, (begin, end) in phases.items()
+        }
+
+    def feed(self, line: str, t: float):
+        """Record a single log line, observed at time `t`"""
+        for name, (begin, end) in self._patterns.items():
+            if begin.search(line):
+                self.phases.setdefault(name, {"start": t, "end": t})
+            if end.search(line) and name in self.phases:
+                self.phases[name]["end"] = t
+
+        if self.ready_at is None and READY_PATTERN.search(line):
+            self.ready_at = t
+
+    def phase_timings(self) -> dict[str, dict[str, float]]:
+        """Start, end, and duration of each phase seen so far"""
+        return {
+            name: {**span, "duration": span["end"] - span["start"]}
+            for name, span in self.phases.items()
+        }
+
+
+def parse_log(lines) -> LogParser:
+    """Parse a recorded log, timing phases relative to its first timestamp"""
+    parser = LogParser()
+    origin = last = None
+    for line in lines:
+        t = log_timestamp(line)
+        if t is None:
+            t = last  # continuation lines belong with the previous entry
+        if t is None:
+            continue
+        if origin is None:
+            origin = t
+        parser.feed(line, t - origin)
+        last = t
+    return parser
+
+
+class LogWatcher:
+    """Tees a subprocess's output to stdout while tracking startup progress"""
+
+    def __init__(
+        self,
+        stream,
+        parser: LogParser | None = None,
+        origin: float | None = None,
+        tail_lines: int = 200,
+        out=sys.stdout,
+        listeners=(),
+    ):
+        self.stream = stream
+        self.listeners = list(listeners)  # also called with every line
+        self.parser = parser or LogParser()
+        self.origin = time.monotonic() if origin is None else origin
+        self.out = out
+        self.tail = collections.deque(maxlen=tail_lines)
+        self.log_says_ready = threading.Event()
+        self._failed: set = set()  # callbacks that raised, reported once each
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> "LogWatcher":
+        self._thread.start()
+        return self
+
+    def _run(self):
+        for line in self.stream:
+            self.out.write(line)
+            self.out.flush()
+            self.observe(line.rstrip("\n"))
+
+    def observe(self, line: str):
+        self.tail.append(line)
+        self._call(self.parser.feed, line, time.monotonic() - self.origin)
+        for listener in self.listeners:
+            self._call(listener, line)
+        if self.parser.ready_at is not None:
+            self.log_says_ready.set()
+
+    def _call(self, callback, *args):
+        # if the tee stopped, the server would block once the pipe buffer filled
+        try:
+            callback(*args)
+        except Exception:
+            if callback not in self._failed:
+                self._failed.add(callback)
+                print(f"LogWatcher: {callback!r} raised (shown only once):", file=sys.stderr)
+                traceback.print_exc()
+
+    def phase_timings(self) -> dict[str, dict[str, float]]:
+        return self.parser.phase_timings()
+
+    def format_tail(self, n: int = 50) -> str:
+        return "\n".join(list(self.tail)[-n:])
+
+
+def process_age() -> float:
+    """Seconds since this process started, or 0 if /proc is unavailable"""
+    try:
+        with open("/proc/self/stat") as f:
+            # the command name may contain spaces, so split after its closing paren
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        return max(0.0, uptime - started)
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+class StartupProfiler:
+    """Collects a cold start timeline, measured from container process start"""
+
+    def __init__(self):
+        self.origin = time.monotonic() - process_age()
+        self.spans: dict[str, dict[str, float]] = {}
+        self.log = LogParser()
+
+    def now(self) -> float:
+        return time.monotonic() - self.origin
+
+    def mark(self, name: str):
+        """Record an instantaneous event"""
+        t = self.now()
+        self.spans[name] = {"start": t, "end": t}
+
+    def record(self, name: str, start: float, end: float | None = None):
+        """Record a phase timed elsewhere, from `time.monotonic()` readings"""
+        end = time.monotonic() if end is None else end
+        self.spans[name] = {"start": start - self.origin, "end": end - self.origin}
+
+    @contextlib.contextmanager
+    def span(self, name: str):
+        """Time the body of a `with` block"""
+        start = self.now()
+        try:
+            yield
+        finally:
+            self.spans[name] = {"start": start, "end": self.now()}
+
+    def watch(self, stream, **kwargs) -> LogWatcher:
+        """Start tailing the server's log into this profiler's timeline"""
+        return LogWatcher(stream, parser=self.log, origin=self.origin, **kwargs).start()
+
+    def timeline(self) -> list[dict]:
+        return sort_timeline({**self.log.phases, **self.spans})
+
+    def report(self, out=sys.stdout):
+        """Print the timeline as one JSON line, then as a table"""
+        timeline = self.timeline()
+        print(json.dumps({"startup_timeline": timeline}), file=out)
+        print(format_timeline(timeline), file=out)
+
+
+def sort_timeline(spans: dict[str, dict[str, float]]) -> list[dict]:
+    return sorted(
+        (
+            {"phase": name, **span, "duration": span["end"] - span["start"]}
+            for name, span in spans.items()
+        ),
+        key=lambda event: (event["start"], event["end"]),
+    )
+
+
+def format_timeline(timeline: list[dict]) -> str:
+    width = max([len("phase"), *(len(event["phase"]) for event in timeline)])
+    lines = [f"{'phase':<{width}}  {'start':>8}  {'end':>8}  {'duration':>8}"]
+    for event in timeline:
+        lines.append(
+            f"{event['phase']:<{width}}  {event['start']:>8.1f}  "
+            f"{event['end']:>8.1f}  {event['duration']:>8.1f}"
+        )
+    return "\n".join(lines)
+
+
+def check_health(url: str, timeout: float = 5.0) -> bool:
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as resp:
+            return resp.status == 200
+    # a server still starting up may close the connection or send a garbled
+    # status line, which http.client raises as HTTPException, not OSError
+    except (OSError, http.client.HTTPException):
+        return False
+
+
+def wait_for_server_ready(
+    proc,
+    url: str,
+    watcher: LogWatcher | None = None,
+    timeout: float = 30 * 60,
+    initial_delay: float = 0.05,
+    max_delay: float = 1.0,
+    backoff: float = 1.5,
+):
+    """Block until `url` returns 200, raising if `proc` exits or `timeout` passes"""
+    print(f"Waiting for server to be ready at {url}")
+    start = time.monotonic()
+    deadline = start + timeout
+    delay = initial_delay
+
+    while True:
+        if (returncode := proc.poll()) is not None:
+            tail = watcher.format_tail() if watcher else "(no log captured)"
+            raise RuntimeError(
+                f"SGLang server exited with code {returncode} during startup. "
+                f"Last log lines:\n{tail}"
+            )
+
+        if check_health(url):
+            elapsed = time.monotonic() - start
+            print(f"Server is ready! ({elapsed:.1f}s)")
+            return
+
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Server at {url} not ready within {timeout} seconds")
+
+        if watcher is not None and watcher.log_says_ready.is_set():
+            time.sleep(initial_delay)  # the log says we're up, so keep checking
+            continue
+
+        if watcher is not None:
+            watcher.log_says_ready.wait(delay)  # wakes early once the log says we're up
+        else:
+            time.sleep(delay)
+        delay = min(delay * backoff, max_delay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print startup phases from a recorded SGLang log")
+    parser.add_argument("log", help="Path to the log file, or - for stdin")
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    args = parser.parse_args()
+
+    with open(sys.stdin.fileno() if args.log == "-" else args.log, errors="replace") as f:
+        phases = parse_log(line.rstrip("\n") for line in f).phases
+
+    timeline = sort_timeline(phases)
+    if args.json:
+        print(json.dumps({"startup_timeline": timeline}, indent=2))
+    else:
+        print(format_timeline(timeline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""Sweep a grid of SGLang server options and compare throughput vs p99 latency.
+
+Each cell of the grid is a base config (e.g. `config.yaml` or `config_fa4.yaml`)
+with some options overridden. For every cell we render the config, start a
+server with it, drive the same concurrent streaming load with `bench.py`, and
+then print a table marking the cells on the Pareto front of output throughput
+vs p99 request latency.
+
+On Modal, each cell runs in its own GPU container:
+
+```bash
+uvx modal run backend.py::sweep --base config.yaml,config_fa4.yaml \\
+    --grid "max-running-requests=16,32,64;speculative-algorithm=EAGLE,none"
+```
+
+Run locally, the same sweep runs against `mock_server.py`, which reads the
+rendered config, so rendering and aggregation can be checked without GPUs:
+
+```bash
+python sweep.py --base config.yaml --grid "max-running-requests=8,16,32"
+```
+
+A grid is `;`-separated `option=value,value` pairs, or a YAML file mapping
+options to lists of values. A value of `none` removes the option from the
+config; removing `speculative-algorithm` drops the other `speculative-*`
+options with it.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+from pathlib import Path
+
+from bench import run_benchmark
+from server_config import ConfigError, ServerConfig, default_options, load_yaml
+from startup import LogWatcher, wait_for_server_ready
+
+here = Path(__file__).parent
+
+DEFAULT_GRID = {
+    "max-running-requests": [16, 32, 64],
+    "cuda-graph-max-bs": [16, 32, 64],
+    "chunked-prefill-size": [8192, 32768],
+    "mem-fraction-static": [0.85],
+    "speculative-algorithm": ["EAGLE", None],
+}
+
+
+def parse_value(text: str):
+    """Parse a grid value the way YAML would, with `none` meaning "unset" """
+    text = text.strip()
+    if text.lower() in ("none", "null", "~"):
+        return None
+    if text.lower() in ("true", "false"):
+        return text.lower() == "true"
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+
+def parse_grid(spec: str) -> dict[str, list]:
+    """Read a grid from a YAML file, or from `option=v1,v2;option=v1` pairs"""
+    if os.path.isfile(spec):
+        import yaml
+
+        with open(spec) as f:
+            grid = yaml.safe_load(f) or {}
+        return {
+            key: values if isinstance(values, list) else [values]
+            for key, values in grid.items()
+        }
+
+    grid = {}
+    for part in spec.split(";"):
+        if not part.strip():
+            continue
+        key, sep, values = part.partition("=")
+        if not sep:
+            raise ValueError(f"Grid entries look like option=v1,v2, not {part!r}")
+        grid[key.strip()] = [parse_value(value) for value in values.split(",")]
+    return grid
+
+
+def expand_grid(grid: dict[str, list]) -> list[dict]:
+    """Every combination of the grid's values, in a stable order"""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*grid.values())]
+
+
+def render_config(base: dict, overrides: dict) -> dict:
+    """Apply a cell's overrides to a base config"""
+    options = dict(base)
+    for key, value in overrides.items():
+        if value is None:
+            options.pop(key, None)
+            if key == "speculative-algorithm":
+                for option in list(options):
+                    if option.startswith("speculative-"):
+                        options.pop(option)
+        else:
+            options[key] = value
+    return options
+
+
+def dump_config(options: dict) -> str:
+    import yaml
+
+    return yaml.safe_dump(options, sort_keys=False)
+
+
+def cell_name(base_name: str, overrides: dict) -> str:
+    parts = [Path(base_name).stem]
+    parts += [
+        f"{key}={'none' if value is None else value}" for key, value in overrides.items()
+    ]
+    return ",".join(parts)
+
+
+def make_cells(base_paths: list[str], grid: dict[str, list]) -> list[dict]:
+    """Rendered configs for the grid crossed with each base config"""
+    cells = []
+    for base_path in base_paths:
+        base = load_yaml(base_path)
+        for overrides in expand_grid(grid):
+            cells.append(
+                {
+                    "name": cell_name(base_path, overrides),
+                    "base": Path(base_path).name,
+                    "overrides": overrides,
+                    "options": render_config(base, overrides),
+                }
+            )
+    return cells
+
+
+def valid_cells(cells: list[dict], defaults: dict, gpu_count: int | None = None) -> list[dict]:
+    """The cells whose config, on top of `defaults`, passes `server_config`'s checks"""
+    valid = []
+    for cell in cells:
+        try:
+            ServerConfig.load(defaults, config=cell["options"], gpu_count=gpu_count).validate()
+        except ConfigError as e:
+            print(f"Skipping {cell['name']}: {e}", file=sys.stderr)
+        else:
+            valid.append(cell)
+    return valid
+
+
+def summarize_cell(cell: dict, report: dict | None, error: str | None = None) -> dict:
+    """One row of the sweep table"""
+    row = {"cell": cell["name"], "base": cell["base"], "overrides": cell["overrides"]}
+    if report is None:
+        return {**row, "error": error or "no report"}
+    return {
+        **row,
+        "output_tokens_per_s": report["throughput"]["output_tokens_per_s"],
+        "requests_per_s": report["throughput"]["requests_per_s"],
+        "latency_p99_s": report["latency_s"]["p99"],
+        "ttft_p99_s": report["ttft_s"]["p99"],
+        "itl_p99_s": report["itl_s"]["p99"],
+        "error_rate": report["requests"]["error_rate"],
+    }
+
+
+def pareto_front(rows: list[dict]) -> list[dict]:
+    """Mark rows that no other row beats on both throughput and p99 latency"""
+    scored = [
+        row
+        for row in rows
+        if row.get("output_tokens_per_s") is not None and row.get("latency_p99_s") is not None
+    ]
+    for row in rows:
+        row["pareto"] = row in scored and not any(
+            other["output_tokens_per_s"] >= row["output_tokens_per_s"]
+            and other["latency_p99_s"] <= row["latency_p99_s"]
+            and (
+                other["output_tokens_per_s"] > row["output_tokens_per_s"]
+                or other["latency_p99_s"] < row["latency_p99_s"]
+            )
+            for other in scored
+        )
+    return rows
+
+
+def format_table(rows: list[dict]) -> str:
+    """Cells sorted by throughput, with the Pareto front starred"""
+
+    def fmt(value, spec):
+        return "-" if value is None else format(value, spec)
+
+    ordered = sorted(rows, key=lambda row: -(row.get("output_tokens_per_s") or 0))
+    width = max([len("cell"), *(len(row["cell"]) for row in ordered)])
+    lines = [
+        f"  {'cell':<{width}}  {'tok/s':>9}  {'p99 lat':>8}  {'p99 ttft':>8}  "
+        f"{'p99 itl':>8}  {'errors':>6}"
+    ]
+    for row in ordered:
+        if "error" in row:
+            lines.append(f"  {row['cell']:<{width}}  failed: {row['error']}")
+            continue
+        star = "*" if row.get("pareto") else " "
+        lines.append(
+            f"{star} {row['cell']:<{width}}  {fmt(row['output_tokens_per_s'], '9.1f')}  "
+            f"{fmt(row['latency_p99_s'], '8.2f')}  {fmt(row['ttft_p99_s'], '8.3f')}  "
+            f"{fmt(row['itl_p99_s'], '8.4f')}  {row['error_rate']:>6.1%}"
+        )
+    lines.append("* on the Pareto front of throughput vs p99 latency")
+    return "\n".join(lines)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class MockLauncher:
+    """Runs each cell against a local `mock_server.py` started with its config"""
+
+    def __init__(self, work_dir, extra_args: list[str] | None = None):
+        self.work_dir = Path(work_dir)
+        self.extra_args = extra_args or []
+
+    async def run(self, cell: dict, bench_kwargs: dict) -> dict:
+        cell_dir = self.work_dir / _slug(cell["name"])
+        cell_dir.mkdir(parents=True, exist_ok=True)
+        config_path = cell_dir / "config.yaml"
+        config_path.write_text(dump_config(cell["options"]))
+
+        port = _free_port()
+        proc = subprocess.Popen(
+            [
+                sys.executable,
+                str(here / "mock_server.py"),
+                "--host",
+                "127.0.0.1",
+                "--port",
+                str(port),
+                "--config",
+                str(config_path),
+                *self.extra_args,
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+        )
+        with open(cell_dir / "server.log", "w") as log:
+            watcher = LogWatcher(proc.stdout, out=log).start()
+            try:
+                url = f"http://127.0.0.1:{port}"
+                await asyncio.to_thread(
+                    wait_for_server_ready, proc, f"{url}/health", watcher, 60
+                )
+                return await run_benchmark(url, **bench_kwargs)
+            finally:
+                proc.terminate()
+                proc.wait()
+
+
+def _slug(name: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_.=" else "_" for c in name)
+
+
+async def run_sweep(cells: list[dict], run_cell, bench_kwargs: dict, out_dir=None) -> list[dict]:
+    """Benchmark each cell in turn with `run_cell(cell, bench_kwargs)`"""
+    rows = []
+    for index, cell in enumerate(cells, start=1):
+        print(f"[{index}/{len(cells)}] {cell['name']}", file=sys.stderr, flush=True)
+        try:
+            report = await run_cell(cell, bench_kwargs)
+            row = summarize_cell(cell, report)
+        except Exception as e:  # a config that fails to start is a result too
+            report = None
+            row = summarize_cell(cell, None, f"{type(e).__name__}: {e}")
+        rows.append(row)
+
+        if out_dir is not None:
+            cell_dir = Path(out_dir) / _slug(cell["name"])
+            cell_dir.mkdir(parents=True, exist_ok=True)
+            (cell_dir / "config.yaml").write_text(dump_config(cell["options"]))
+            (cell_dir / "report.json").write_text(json.dumps(report, indent=2) + "\n")
+
+    pareto_front(rows)
+    if out_dir is not None:
+        (Path(out_dir) / "sweep.json").write_text(json.dumps(rows, indent=2) + "\n")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweep server options against mock_server.py "
+        "(use `modal run backend.py::sweep` for GPUs)"
+    )
+    parser.add_argument(
+        "--base",
+        default=str(here / "config.yaml"),
+        help="Comma-separated base config YAMLs",
+    )
+    parser.add_argument("--grid", default=None, help="Grid spec or YAML file")
+    parser.add_argument("--mock-args", default="", help="Extra mock_server.py flags")
+    parser.add_argument("--out-dir", default="sweep-results")
+    parser.add_argument("--num-requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--input-len", default="512")
+    parser.add_argument("--output-len", default="256")
+    parser.add_argument("--dry-run", action="store_true", help="Only render the configs")
+    args = parser.parse_args()
+
+    grid = parse_grid(args.grid) if args.grid else DEFAULT_GRID
+    cells = make_cells(args.base.split(","), grid)
+    # the same checks `backend.py::sweep` runs, for the deployment's 8 GPUs
+    cells = valid_cells(cells, default_options("zai-org/GLM-5-FP8", 8, 8000), gpu_count=8)
+    if args.dry_run:
+        for cell in cells:
+            print(f"# {cell['name']}\n{dump_config(cell['options'])}")
+        return
+
+    bench_kwargs = dict(
+        num_requests=args.num_requests,
+        concurrency=args.concurrency,
+        input_len=args.input_len,
+        output_len=args.output_len,
+    )
+    launcher = MockLauncher(args.out_dir, args.mock_args.split())
+    rows = asyncio.run(run_sweep(cells, launcher.run, bench_kwargs, args.out_dir))
+    print(format_table(rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+# the modules are imported flat, the way Modal's add_local_python_source ships them
+sys.path.insert(0, str(BACKEND))
+
+
+async def serve(app) -> tuple:
+    """Run an aiohttp app on a free local port; the runner, to clean up, and its URL"""
+    from aiohttp import web
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}"
+
+
+def sse_events(body: bytes) -> list:
+    """The `data:` payloads of an SSE body, JSON-decoded except for `[DONE]`"""
+    import json
+
+    events = []
+    for block in body.decode().split("\n\n"):
+        if block.startswith("data: "):
+            data = block[len("data: ") :]
+            events.append(data if data == "[DONE]" else json.loads(data))
+    return events
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import random
+import sys
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web  # noqa: E402
+from conftest import serve  # noqa: E402
+
+import bench  # noqa: E402
+import mock_server  # noqa: E402
+
+
+def test_length_specs():
+    rng = random.Random(0)
+    assert bench.parse_length("128")(rng) == 128
+    assert all(4 <= bench.parse_length("4-8")(rng) <= 8 for _ in range(50))
+    assert bench.parse_length("exp:100")(rng) >= 1
+    with pytest.raises(ValueError):
+        bench.parse_length("8-4")
+
+
+def test_nearest_rank_percentiles():
+    summary = bench.percentiles([float(i) for i in range(1, 101)])
+    assert summary["p50"] == 50 and summary["p99"] == 99 and summary["mean"] == 50.5
+    assert bench.percentiles([])["p90"] is None
+
+
+def test_report_against_the_mock_server():
+    config = mock_server.MockConfig(
+        prefill_delay=0.02, decode_delay=0.002, fail_rate=0.25, seed=1
+    )
+
+    async def run():
+        runner, url = await serve(mock_server.make_app(config))
+        try:
+            return await bench.run_benchmark(
+                url, num_requests=16, concurrency=4, input_len="64", output_len="8"
+            )
+        finally:
+            await runner.cleanup()
+
+    report = asyncio.run(run())
+    requests = report["requests"]
+    assert requests["total"] == 16 and 0 < requests["failed"] < 16
+    assert sum(requests["errors"].values()) == requests["failed"]
+    assert report["ttft_s"]["p50"] >= 0.02
+    assert report["itl_s"]["p50"] > 0 and report["throughput"]["output_tokens_per_s"] > 0
+
+
+@pytest.mark.parametrize("error", ["boom", {"type": "server_shutdown"}, {"message": "no type"}])
+def test_stream_errors_of_any_shape(error):
+    async def chat(request):
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        await resp.write(b"data: " + json.dumps({"error": error}).encode() + b"\n\n")
+        return resp
+
+    async def run():
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", chat)
+        runner, url = await serve(app)
+        try:
+            async with aiohttp.ClientSession(base_url=url) as session:
+                return await bench.send_request(session, "hi", 8)
+        finally:
+            await runner.cleanup()
+
+    result = asyncio.run(run())
+    assert not result.ok
+    expected = error.get("type") if isinstance(error, dict) else None
+    assert result.error == (expected or "stream error")
+
+
+@pytest.mark.parametrize("header", ["X-Jazz-Priority batch", ": batch"])
+def test_malformed_header_is_a_usage_error(monkeypatch, capsys, header):
+    monkeypatch.setattr(sys, "argv", ["bench.py", "http://127.0.0.1:9", "--header", header])
+    with pytest.raises(SystemExit) as exit:
+        bench.main()
+    assert exit.value.code == 2
+    assert "--header must look like" in capsys.readouterr().err
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from coalesce import Coalescer, CoalesceConfig, Flight, Overrun, deterministic, fingerprint
+
+
+def test_only_deterministic_requests_coalesce():
+    assert deterministic({"temperature": 0})
+    assert deterministic({"seed": 7, "temperature": 1.0})
+    assert not deterministic({"temperature": 0.7})
+    assert not deterministic({})
+    assert not deterministic({"temperature": 0, "n": 2})
+    body = {"messages": [], "temperature": 0}
+    assert fingerprint("key", "/v1/chat/completions", body) == fingerprint(
+        "key", "/v1/chat/completions", dict(reversed(body.items()))
+    )
+    assert fingerprint("key", "/p", body) != fingerprint("other", "/p", body)
+
+
+def test_join_and_land():
+    coalescer = Coalescer()
+    leader, leads = coalescer.join("fp")
+    follower, follows = coalescer.join("fp")
+    assert leads and not follows and follower is leader
+    coalescer.land(leader, complete=True)
+    _, leads_again = coalescer.join("fp")
+    assert leads_again
+    assert coalescer.stats()["followers"] == 1
+
+
+def test_buffer_stays_bounded_without_followers():
+    async def run():
+        flight = Flight("fp", max_buffer_bytes=100)
+        for _ in range(50):
+            flight.publish(b"x" * 10)
+        return flight
+
+    flight = asyncio.run(run())
+    assert not flight.joinable and flight.buffered <= 100 and flight.size == 500
+
+
+def test_follower_gets_whole_response_past_buffer_limit():
+    async def run():
+        flight = Flight("fp", max_buffer_bytes=100)
+        follower = flight.attach()
+        received = []
+
+        async def follow():
+            async for chunk in flight.replay(follower):
+                received.append(chunk)
+
+        task = asyncio.create_task(follow())
+        for i in range(50):
+            flight.publish(b"%09d\n" % i)
+            await asyncio.sleep(0)
+        flight.finish(complete=True)
+        await task
+        return flight, received
+
+    flight, received = asyncio.run(run())
+    assert received == [b"%09d\n" % i for i in range(50)]
+    assert flight.buffered <= 100
+
+
+def test_slow_follower_is_cut_off():
+    async def run():
+        flight = Flight("fp", max_buffer_bytes=100)
+        replay = flight.replay(flight.attach())
+        flight.publish(b"x" * 10)
+        await replay.__anext__()  # then stalls, e.g. on a slow client
+        for _ in range(20):
+            flight.publish(b"x" * 10)
+        with pytest.raises(Overrun):
+            while True:
+                await replay.__anext__()
+        return flight
+
+    flight = asyncio.run(run())
+    assert flight.buffered <= 100
+
+
+def test_late_joiners_past_limit_lead_their_own():
+    coalescer = Coalescer(CoalesceConfig(max_buffer_bytes=10))
+
+    async def run():
+        flight, _ = coalescer.join("fp")
+        flight.publish(b"x" * 20)
+        return coalescer.join("fp")
+
+    flight, leads = asyncio.run(run())
+    assert leads
@@ -0,0 +1,34 @@
+import subprocess
+
+import dg_cache
+
+
+def commit(repo, message: str):
+    author = ["-c", "user.name=test", "-c", "user.email=test@example.com"]
+    subprocess.run(
+        ["git", "-C", str(repo), *author, "commit", "-q", "--allow-empty", "-m", message],
+        check=True,
+    )
+
+
+def test_new_sglang_commit_makes_the_cache_stale(tmp_path):
+    source, cache = tmp_path / "sglang", tmp_path / "deep_gemm"
+    source.mkdir()
+    subprocess.run(["git", "init", "-q", str(source)], check=True)
+    commit(source, "pr head")
+    patch = tmp_path / "glm5_support.patch"
+    patch.write_text("")
+    (cache / dg_cache.KERNEL_DIR / "kernel.a").mkdir(parents=True)
+
+    def key():
+        return dg_cache.cache_key("image", patch, {"tp": 8}, "org/model", 8, source)
+
+    dg_cache.write_manifest(cache, key())
+    assert dg_cache.validate(cache, key())["status"] == "hit"
+    commit(source, "the pull request moved")
+    result = dg_cache.validate(cache, key())
+    assert result["status"] == "stale" and result["mismatched"] == ["sglang_commit"]
+
+
+def test_no_checkout_has_no_commit(tmp_path):
+    assert dg_cache.source_commit(tmp_path / "missing") is None
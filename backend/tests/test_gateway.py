@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web  # noqa: E402
+from conftest import serve, sse_events  # noqa: E402
+
+import gateway  # noqa: E402
+
+CHAT = "/v1/chat/completions"
+PAYLOAD = {"messages": [{"role": "user", "content": "hi"}], "stream": True}
+
+
+def upstream_app(drop_after: int | None = None) -> web.Application:
+    """SGLang's chat endpoint, streaming three tokens, or dying after `drop_after`"""
+
+    async def chat(request):
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        for i in range(3):
+            if i == drop_after:
+                request.transport.close()
+                return resp
+            await resp.write(b'data: {"choices": [{"delta": {"content": "tok"}}]}\n\n')
+        await resp.write(b"data: [DONE]\n\n")
+        await resp.write_eof()
+        return resp
+
+    app = web.Application()
+    app.router.add_post(CHAT, chat)
+    return app
+
+
+async def post(upstream: web.Application, payload=PAYLOAD, **kwargs):
+    runner, upstream_url = await serve(upstream)
+    front, url = await serve(gateway.make_app(upstream_url, **kwargs))
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(url + CHAT, json=payload) as resp:
+                return resp.status, await resp.read()
+    finally:
+        await front.cleanup()
+        await runner.cleanup()
+
+
+def test_stream_passes_through():
+    status, body = asyncio.run(post(upstream_app()))
+    assert status == 200
+    assert sse_events(body)[-1] == "[DONE]" and len(sse_events(body)) == 4
+
+
+def test_upstream_dies_mid_stream():
+    status, body = asyncio.run(post(upstream_app(drop_after=2)))
+    assert status == 200  # already sent when the upstream went away
+    events = sse_events(body)
+    assert [e["choices"][0]["delta"]["content"] for e in events[:2]] == ["tok", "tok"]
+    error = events[2]["error"]
+    assert error["code"] == 502 and error["resumable"] and error["tokens_streamed"] == 2
+    assert events[3] == "[DONE]"
+
+
+def test_upstream_down_is_a_502():
+    async def run():
+        runner, upstream_url = await serve(upstream_app())
+        await runner.cleanup()  # nothing listens there now
+        front, url = await serve(gateway.make_app(upstream_url))
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(url + CHAT, json=PAYLOAD) as resp:
+                    return resp.status, await resp.json()
+        finally:
+            await front.cleanup()
+
+    status, body = asyncio.run(run())
+    assert status == 502 and body["error"]["type"] == "server_error"
+
+
+def test_admission_rejects_past_queue_limit():
+    controller = gateway.AdmissionController(
+        gateway.AdmissionConfig(max_concurrency=1, max_queue_interactive=0)
+    )
+
+    async def run():
+        ticket = await controller.acquire("key", "interactive", 1)
+        with pytest.raises(gateway.Rejected) as rejected:
+            await controller.acquire("other", "interactive", 1)
+        controller.release(ticket)
+        return rejected.value
+
+    rejected = asyncio.run(run())
+    assert rejected.status == 429 and rejected.retry_after > 0
+
+
+def test_followers_outlive_the_leaders_client():
+    async def chat(request):
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        for _ in range(20):
+            await resp.write(b'data: {"choices": [{"delta": {"content": "tok"}}]}\n\n')
+            await asyncio.sleep(0.02)
+        await resp.write(b"data: [DONE]\n\n")
+        await resp.write_eof()
+        return resp
+
+    upstream = web.Application()
+    upstream.router.add_post(CHAT, chat)
+    payload = {**PAYLOAD, "temperature": 0}
+
+    async def run():
+        runner, upstream_url = await serve(upstream)
+        coalescer = gateway.Coalescer()
+        front, url = await serve(gateway.make_app(upstream_url, coalescer=coalescer))
+        try:
+            async with aiohttp.ClientSession() as leader, aiohttp.ClientSession() as follower:
+                resp = await leader.post(url + CHAT, json=payload)
+                await resp.content.readany()
+                joined = await follower.post(url + CHAT, json=payload)
+                await asyncio.sleep(0.05)
+                resp.close()  # the leader's client goes away mid-stream
+                await leader.close()
+                return joined.headers.get("X-Jazz-Coalesced"), await joined.read()
+        finally:
+            await front.cleanup()
+            await runner.cleanup()
+
+    coalesced, body = asyncio.run(run())
+    events = sse_events(body)
+    assert coalesced == "1"
+    assert len(events) == 21 and events[-1] == "[DONE]"
@@ -0,0 +1,22 @@
+import importtime
+from conftest import BACKEND
+
+
+def test_client_stays_off_modal_and_the_image_definitions():
+    report = importtime.measure("client", cwd=BACKEND)
+    assert "client" in report["packages"]
+    assert "modal" not in report["packages"]
+    assert "backend" not in report["packages"]
+
+
+def test_parse_importtime():
+    stderr = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   json.decoder\n"
+        "import time:       300 |        420 | json\n"
+        "not an importtime line\n"
+    )
+    assert importtime.parse_importtime(stderr) == [
+        ("json.decoder", 120, 120, 1),
+        ("json", 300, 420, 0),
+    ]
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+import jazz_sse
+
+# CRLF line endings throughout, a comment, every field type, multi-line data,
+# and a final event with no trailing blank line
+STREAM = (
+    b": keep-alive\r\n"
+    b"retry: 3000\r\n"
+    b"id: 1\r\n"
+    b'data: {"n": 1}\r\n'
+    b"\r\n"
+    b"event: update\r\n"
+    b"data: line one\r\n"
+    b"data:line two\r\n"
+    b"\r\n"
+    b"id: 2\r\n"
+    b'data: {"n": 3}'
+)
+
+EXPECTED = [
+    (b"message", b'{"n": 1}', b"1", 3000),
+    (b"update", b"line one\nline two", b"1", 3000),
+    (b"message", b'{"n": 3}', b"2", 3000),
+]
+
+CHUNK_SIZES = [1, 2, 3, 5, 7, 16, len(STREAM)]
+
+
+def chunked(body: bytes, size: int) -> list[bytes]:
+    return [body[i : i + size] for i in range(0, len(body), size)]
+
+
+def fields(events) -> list[tuple]:
+    return [(e.event, e.data, e.id, e.retry) for e in events]
+
+
+async def agen(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def acollect(aiterator) -> list:
+    return [item async for item in aiterator]
+
+
+@pytest.mark.parametrize("size", CHUNK_SIZES)
+def test_events_are_independent_of_chunking(size):
+    chunks = chunked(STREAM, size)
+    assert fields(jazz_sse.iter_events(chunks)) == EXPECTED
+    assert fields(asyncio.run(acollect(jazz_sse.aiter_events(agen(chunks))))) == EXPECTED
+
+
+def test_crlf_split_between_chunks():
+    chunks = [b"data: a\r", b"\n\r", b"\n", b"data: b\r\n\r", b"\n"]
+    assert [e.data for e in jazz_sse.iter_events(chunks)] == [b"a", b"b"]
+
+
+JSON_STREAM = (
+    b'data: {"choices": [{"delta": {"content": "Hel"}}]}\r\n\r\n'
+    b"data: not json\r\n\r\n"
+    b'data: {"choices": [{"delta": {"content": "lo"}, "finish_reason": "stop"}]}\r\n\r\n'
+    b"data: [DONE]\r\n\r\n"
+    b'data: {"after": "done"}\r\n\r\n'
+)
+
+
+@pytest.mark.parametrize("size", CHUNK_SIZES[:-1] + [len(JSON_STREAM)])
+def test_json_payloads_stop_at_done(size):
+    chunks = chunked(JSON_STREAM, size)
+    for parsed in (
+        list(jazz_sse.iter_json(chunks)),
+        asyncio.run(acollect(jazz_sse.aiter_json(agen(chunks)))),
+    ):
+        assert [jazz_sse.delta_text(evt)[1] for evt in parsed] == ["Hel", "lo"]
+        assert jazz_sse.finish_reason(parsed[-1]) == "stop"
+
+
+def test_json_without_done_or_trailing_blank_line():
+    chunks = chunked(b'data: {"n": 1}\n\ndata: {"n": 2}', 4)
+    assert list(jazz_sse.iter_json(chunks)) == [{"n": 1}, {"n": 2}]
+    assert asyncio.run(acollect(jazz_sse.aiter_json(agen(chunks)))) == [{"n": 1}, {"n": 2}]
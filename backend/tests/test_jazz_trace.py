@@ -0,0 +1,56 @@
+import ast
+
+from conftest import BACKEND
+from jazz_trace import Span, SpanRecorder, breakdown, new_traceparent, parse_traceparent
+
+
+def test_traceparent_round_trip():
+    header = new_traceparent()
+    trace_id, span_id = parse_traceparent(header)
+    assert header == f"00-{trace_id}-{span_id}-01"
+    assert parse_traceparent(header.upper()) == (trace_id, span_id)
+
+
+def test_invalid_traceparent():
+    assert parse_traceparent(None) is None
+    assert parse_traceparent("00-" + "0" * 32 + "-" + "1" * 16 + "-01") is None
+    assert parse_traceparent("ff-" + "1" * 32 + "-" + "1" * 16 + "-01") is None
+    assert parse_traceparent("00-abc-def-01") is None
+
+
+def test_child_span_joins_trace():
+    recorder = SpanRecorder()
+    parent = recorder.start("proxy")
+    child = recorder.start("gateway", parent.traceparent)
+    assert (child.trace_id, child.parent_id) == (parent.trace_id, parent.span_id)
+    assert recorder.start("gateway", "garbage").trace_id != parent.trace_id
+
+
+def test_record_round_trip():
+    span = Span("a" * 32, "b" * 16, None, "gateway", 1.0, 2.0, 40.0, 90.0, 200, 12)
+    assert Span.from_record(span.record()) == span
+    assert span.phases() == {"queue": 2.0, "ttft": 38.0, "decode": 50.0, "total": 90.0}
+
+
+def test_breakdown_keeps_repeated_hops():
+    spans = [
+        Span("a" * 32, "b" * 16, None, "gateway", 1.0, 0.0, 10.0, 20.0),
+        Span("a" * 32, "c" * 16, None, "gateway", 1.0, 0.0, 15.0, 30.0),
+    ]
+    assert len(breakdown(spans)) > len(breakdown(spans[:1]))
+
+
+def test_shared_modules_run_on_python_39():
+    # the llm plugin ships these, and supports Python 3.9: no `X | None` at runtime
+    for name in ("jazz_trace", "jazz_sse"):
+        tree = ast.parse((BACKEND / f"{name}.py").read_text())
+        for node in ast.walk(tree):
+            annotations = []
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                args = node.args.posonlyargs + node.args.args + node.args.kwonlyargs
+                annotations += [a.annotation for a in args] + [node.returns]
+            elif isinstance(node, ast.AnnAssign):
+                annotations.append(node.annotation)
+            for annotation in filter(None, annotations):
+                unions = [n for n in ast.walk(annotation) if isinstance(n, ast.BinOp)]
+                assert not unions, f"{name}.py:{annotation.lineno}"
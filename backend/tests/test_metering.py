@@ -0,0 +1,68 @@
+import metering
+
+KEY, OTHER = "ab" * 6, "cd" * 6
+USAGE = {
+    "prompt_tokens": 100,
+    "completion_tokens": 20,
+    "prompt_tokens_details": {"cached_tokens": 64},
+    "completion_tokens_details": {"reasoning_tokens": 5},
+}
+
+
+def test_scanner_finds_usage_split_across_chunks():
+    body = (
+        b'data: {"choices": [{"delta": {"content": "hi"}}], "usage": null}\n\n'
+        b'data: {"choices": [], "usage": {"prompt_tokens": 100, "completion_tokens": 20}}\n\n'
+        b"data: [DONE]\n\n"
+    )
+    scanner = metering.UsageScanner()
+    for i in range(0, len(body), 7):
+        scanner.feed(body[i : i + 7])
+    assert scanner.events == 2
+    assert scanner.finish() == {"prompt_tokens": 100, "completion_tokens": 20}
+
+
+def test_records_sum_across_flushes(tmp_path):
+    meter = metering.Meter(tmp_path / "a.bin")
+    meter.record(KEY, USAGE, now=120)
+    meter.flush()
+    meter.record(KEY, None, prompt_estimate=40, events=9, now=130)  # unflushed
+    meter.record(OTHER, USAGE, now=130)
+    [row] = meter.query(KEY)
+    assert row == {
+        "start": 120,
+        "key": KEY,
+        "requests": 2,
+        "prompt_tokens": 140,
+        "cached_tokens": 64,
+        "reasoning_tokens": 5,
+        "completion_tokens": 29,
+        "estimated": 1,
+    }
+    assert meter.query(KEY, since=180) == []
+
+
+def test_shared_meter_reads_every_replica(tmp_path):
+    mine = metering.Meter(tmp_path / "replica-a.bin", shared=True)
+    theirs = metering.Meter(tmp_path / "replica-b.bin")
+    mine.record(KEY, USAGE, now=60)
+    theirs.record(KEY, USAGE, now=90)
+    theirs.flush()
+    [row] = mine.query(KEY, bucket=3600)
+    assert row["requests"] == 2 and row["prompt_tokens"] == 200
+    # a replica-local meter only sees its own
+    alone = metering.Meter(tmp_path / "replica-a.bin")
+    assert alone.query(KEY) == []
+
+
+def test_reload_is_rate_limited_and_survives_errors(tmp_path):
+    calls = []
+
+    def reload():
+        calls.append(1)
+        raise RuntimeError("there are open files")
+
+    meter = metering.Meter(tmp_path / "a.bin", shared=True, reload=reload)
+    meter.reload_peers()
+    meter.reload_peers()
+    assert len(calls) == 1
@@ -0,0 +1,45 @@
+import pytest
+
+import metrics
+from conftest import BACKEND
+
+SCRAPE = (BACKEND / "fixtures" / "sglang_metrics.prom").read_text()
+
+
+def test_recorded_scrape():
+    samples = metrics.parse_prometheus(SCRAPE)
+    assert samples["sglang:time_to_first_token_seconds_bucket"][-1] == (
+        {"le": "+Inf", "model_name": "llm"},
+        2317.0,
+    )
+    snap = metrics.snapshot(samples, timestamp=0)
+    assert snap.ranks == 2 and snap.running == 23 and snap.queued == 3
+    assert snap.kv_usage == 0.81 and snap.kv_usage_mean == pytest.approx(0.54)
+    assert snap.cache_hit_rate == pytest.approx(0.55)
+    assert snap.spec_accept_length == pytest.approx(2.54)
+
+
+def test_load_score_from_the_recorded_scrape():
+    tracker = metrics.LoadTracker(max_running_requests=32)
+    tracker.observe(metrics.snapshot(metrics.parse_prometheus(SCRAPE), timestamp=100))
+    load = tracker.load()
+    # the fullest rank's KV cache dominates the busy slots, plus the queue
+    assert load["components"] == {"kv": 0.9, "slots": 0.7188, "queue": 0.0938}
+    assert load["score"] == pytest.approx(0.9 + 3 / 32, abs=1e-4)
+
+
+def test_rates_from_counter_deltas():
+    tracker = metrics.LoadTracker(max_running_requests=32, window=30)
+    first = metrics.snapshot(metrics.parse_prometheus(SCRAPE), timestamp=100)
+    later = metrics.parse_prometheus(
+        SCRAPE.replace("1.402e+06", "1.412e+06").replace("2317.0\n# HELP", "2337.0\n# HELP", 1)
+    )
+    tracker.observe(first)
+    tracker.observe(metrics.snapshot(later, timestamp=110))
+    rates = tracker.rates()
+    assert rates["generation_tokens_per_s"] == 1000.0
+    assert rates["requests_per_s"] == 2.0
+    assert rates["prompt_tokens_per_s"] == 0.0
+    # a server restart resets the counters
+    tracker.observe(metrics.snapshot({}, timestamp=120))
+    assert tracker.rates()["generation_tokens_per_s"] is None
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from conftest import serve, sse_events  # noqa: E402
+
+import mock_server  # noqa: E402
+
+FAST = mock_server.MockConfig(prefill_delay=0, decode_delay=0.001, reasoning_tokens=2, seed=0)
+CHAT = {"messages": [{"role": "user", "content": "hi " * 40}], "max_tokens": 5}
+
+
+async def with_server(config, run):
+    runner, url = await serve(mock_server.make_app(config))
+    try:
+        async with aiohttp.ClientSession(base_url=url) as session:
+            return await run(session)
+    finally:
+        await runner.cleanup()
+
+
+def test_stream_has_reasoning_content_and_usage():
+    async def run(session):
+        payload = {**CHAT, "stream": True, "stream_options": {"include_usage": True}}
+        async with session.post("/v1/chat/completions", json=payload) as resp:
+            return await resp.read()
+
+    events = sse_events(asyncio.run(with_server(FAST, run)))
+    assert events[-1] == "[DONE]"
+    deltas = [e["choices"][0]["delta"] for e in events[:-1] if e.get("choices")]
+    fields = [field for delta in deltas for field in delta if field != "role"]
+    assert fields == ["reasoning_content"] * 2 + ["content"] * 3
+    usage = events[-2]["usage"]
+    assert usage["completion_tokens"] == 5 and usage["prompt_tokens"] > 0
+
+
+def test_startup_503s_then_metrics():
+    async def run(session):
+        async with session.get("/health") as early:
+            early_status = early.status
+        await asyncio.sleep(0.15)
+        async with session.get("/health") as ready:
+            ready_status = ready.status
+        async with session.post("/v1/chat/completions", json=CHAT) as resp:
+            body = await resp.json()
+        async with session.get("/metrics") as resp:
+            scrape = await resp.text()
+        return early_status, ready_status, body, scrape
+
+    config = mock_server.MockConfig(**{**FAST.__dict__, "startup_delay": 0.1})
+    early, ready, body, scrape = asyncio.run(with_server(config, run))
+    assert (early, ready) == (503, 200)
+    assert body["usage"]["completion_tokens"] == 5
+    assert 'sglang:generation_tokens_total{model_name="llm"} 5.0' in scrape
+
+
+def test_server_options_shape_the_engine():
+    config = mock_server.config_from_server_options(
+        {"max-running-requests": 8, "cuda-graph-max-bs": 4, "speculative-algorithm": "EAGLE"}
+    )
+    engine = mock_server.MockEngine(config)
+    engine.running = 6  # past the CUDA graphs
+    eager = engine.decode_delay()
+    engine.running = 4
+    assert eager > engine.decode_delay() * 1.2
+    assert config.spec_speedup == mock_server.SPEC_SPEEDUP
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+import prefetch
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    repo = tmp_path / "cache" / "hub" / "models--org--model"
+    (repo / "refs").mkdir(parents=True)
+    (repo / "refs" / "main").write_text("abc123")
+    path = repo / "snapshots" / "abc123"
+    path.mkdir(parents=True)
+    for i, size in enumerate((3000, 5000)):
+        (path / f"model-{i + 1:05d}-of-00002.safetensors").write_bytes(os.urandom(size))
+    (path / "config.json").write_text("{}")
+    return path
+
+
+def test_snapshot_dir(snapshot, tmp_path):
+    assert prefetch.snapshot_dir(tmp_path / "cache", "org/model") == snapshot
+    assert prefetch.snapshot_dir(tmp_path / "cache", "org/other") is None
+    assert [path.name for path in prefetch.list_shards(snapshot)] == [
+        "model-00001-of-00002.safetensors",
+        "model-00002-of-00002.safetensors",
+    ]
+
+
+def test_prefetch_reads_every_byte(snapshot):
+    shards = prefetch.list_shards(snapshot)
+    prefetcher = prefetch.Prefetcher(shards, workers=2, block=1024)
+    prefetcher.run()
+    assert prefetcher.bytes_done == 8000
+    assert prefetcher.stats()["done"] and not prefetcher.errors
+
+
+def test_copy_survives_short_reads(snapshot, tmp_path, monkeypatch):
+    preadv = os.preadv
+
+    def short_preadv(fd, buffers, offset):
+        return preadv(fd, [buffers[0][:100]], offset)  # like a FUSE mount might
+
+    monkeypatch.setattr(os, "preadv", short_preadv)
+    stats = prefetch.copy_snapshot(snapshot, tmp_path / "local", workers=2)
+    copy = tmp_path / "local" / "hub" / "models--org--model" / "snapshots" / "abc123"
+    for path in snapshot.iterdir():
+        assert (copy / path.name).read_bytes() == path.read_bytes()
+    assert (copy.parent.parent / "refs" / "main").read_text() == "abc123"
+    assert stats["gb_done"] == stats["gb"]
+
+
+def test_failed_copy_is_deleted(snapshot, tmp_path, monkeypatch):
+    def failing_pwrite(fd, data, offset):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(os, "pwrite", failing_pwrite)
+    with pytest.raises(OSError, match="incomplete copy"):
+        prefetch.copy_snapshot(snapshot, tmp_path / "local", workers=2)
+    assert not (tmp_path / "local" / "hub" / "models--org--model").exists()
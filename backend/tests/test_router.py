@@ -0,0 +1,137 @@
+import asyncio
+import time
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web  # noqa: E402
+from conftest import serve, sse_events  # noqa: E402
+
+from router import (  # noqa: E402
+    HashRing,
+    Heartbeat,
+    Router,
+    fingerprint,
+    live_replicas,
+    make_app,
+)
+
+
+def replica_app(calls: list, name: str, drop: bool = False) -> web.Application:
+    async def chat(request):
+        calls.append(name)
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        await resp.write(b'data: {"choices": [{"delta": {"content": "hi"}}]}\n\n')
+        if drop:  # the replica dies mid-stream
+            request.transport.close()
+            return resp
+        await resp.write(b"data: [DONE]\n\n")
+        await resp.write_eof()
+        return resp
+
+    async def load(request):
+        return web.json_response({"score": 0.0})
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat)
+    app.router.add_get("/load", load)
+    return app
+
+
+def test_fingerprint_ignores_later_turns():
+    system = {"role": "system", "content": "be brief"}
+    first = {"messages": [system, {"role": "user", "content": "task 1"}]}
+    later = {"messages": first["messages"] + [{"role": "assistant", "content": "ok"}]}
+    other = {"messages": [system, {"role": "user", "content": "task 2"}]}
+    assert fingerprint(first) == fingerprint(later) != fingerprint(other)
+    assert fingerprint(first, "session-1") == "session-1"
+    assert fingerprint({}) is None
+
+
+def test_ring_moves_few_keys():
+    names = {f"r{i}": "" for i in range(4)}
+    before, after = HashRing(names), HashRing({**names, "r4": ""})
+    keys = [f"key-{i}" for i in range(1000)]
+    moved = sum(before.candidates(k)[0] != after.candidates(k)[0] for k in keys)
+    assert moved < 350
+    assert sorted(before.candidates("key-0")) == sorted(names)
+
+
+def test_overloaded_owner_falls_back():
+    router = Router(capacity=1)
+    router.set_replicas({"a": "http://a", "b": "http://b"})
+    owner, other = router.choose("key")
+    owner.in_flight = 1
+    assert [r.name for r in router.choose("key")] == [other.name, owner.name]
+
+
+def test_no_retry_after_response_started():
+    async def run():
+        calls = []
+        a, a_url = await serve(replica_app(calls, "a", drop=True))
+        b, b_url = await serve(replica_app(calls, "b"))
+        router = Router()
+        router.set_replicas({"a": a_url, "b": b_url})
+        # make "a" the first choice for this request
+        key = fingerprint({"messages": [{"role": "user", "content": "hi"}]}, "s")
+        if router.choose(key)[0].name != "a":
+            router.set_replicas({"a": b_url, "b": a_url})
+        front, url = await serve(make_app(router, interval=60))
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(
+                    url + "/v1/chat/completions",
+                    json={"messages": [{"role": "user", "content": "hi"}]},
+                    headers={"X-Jazz-Session": "s"},
+                ) as resp:
+                    assert resp.status == 200
+                    body = await resp.read()
+        finally:
+            await front.cleanup()
+            await a.cleanup()
+            await b.cleanup()
+        return calls, body
+
+    calls, body = asyncio.run(run())
+    assert len(calls) == 1  # not retried on the other replica
+    events = sse_events(body)
+    assert events[0]["choices"][0]["delta"]["content"] == "hi"
+    assert events[1]["error"]["resumable"] and events[1]["error"]["code"] == 502
+    assert events[-1] == "[DONE]"
+
+
+def test_stale_registry_entries():
+    entries = {
+        "fresh": {"url": "http://a", "seen": 100.0},
+        "dead": {"url": "http://b", "seen": 10.0},
+        "old": "http://c",  # registered before heartbeats
+    }
+    live, stale = live_replicas(entries, now=110.0, ttl=60.0)
+    assert live == {"fresh": "http://a"}
+    assert sorted(stale) == ["dead", "old"]
+
+
+def test_heartbeat_registers_until_stopped():
+    registry = {}
+    heartbeat = Heartbeat(registry, "r1", "http://r1", interval=0.01).start()
+    first = registry["r1"]["seen"]
+    time.sleep(0.05)
+    assert registry["r1"]["url"] == "http://r1" and registry["r1"]["seen"] > first
+    heartbeat.stop()
+    assert "r1" not in registry
+
+
+def test_overflow_when_every_replica_is_loaded():
+    router = Router(capacity=1)
+    router.set_overflow("http://pool/")
+    assert [r.name for r in router.choose("key")] == ["overflow"]  # nothing registered
+    router.set_replicas({"a": "http://a", "b": "http://b"})
+    owner = router.choose("key")[0]
+    assert [r.name for r in router.choose("key")][2] == "overflow"
+    for replica in router.replicas.values():
+        replica.in_flight = 1
+    assert router.choose("key")[0].name == "overflow"
+    assert router.choose(None)[0].name == "overflow"
+    owner.healthy = False
+    assert owner not in router.choose("key")
@@ -0,0 +1,45 @@
+import ast
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from conftest import BACKEND
+
+
+def shipped_modules(path) -> list[str]:
+    """The modules an app file passes to `add_local_python_source`"""
+    modules = []
+    for node in ast.walk(ast.parse(path.read_text())):
+        if isinstance(node, ast.Call) and getattr(node.func, "attr", None) == "add_local_python_source":
+            modules += [arg.value for arg in node.args]
+    return modules
+
+
+def local_imports(path) -> set[str]:
+    """The modules from this directory that an app file imports"""
+    names = set()
+    for node in ast.walk(ast.parse(path.read_text())):
+        if isinstance(node, ast.ImportFrom) and node.level == 0:
+            names.add(node.module)
+        elif isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+    return {name for name in names if (BACKEND / f"{name}.py").exists()}
+
+
+def test_router_image_imports(tmp_path):
+    pytest.importorskip("aiohttp")
+    modules = shipped_modules(BACKEND / "router_app.py")
+    for name in modules:
+        shutil.copy(BACKEND / f"{name}.py", tmp_path)
+    imports = local_imports(BACKEND / "router_app.py")
+    assert imports <= set(modules)
+    # only the shipped modules are importable, as in the router's container
+    result = subprocess.run(
+        [sys.executable, "-c", f"import {', '.join(sorted(imports))}"],
+        cwd=tmp_path,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
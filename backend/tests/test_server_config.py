@@ -0,0 +1,61 @@
+import pytest
+
+from conftest import BACKEND
+from server_config import ConfigError, ServerConfig, coerce, default_options
+
+DEFAULTS = default_options("zai-org/GLM-5-FP8", 8, 8000)
+
+
+@pytest.mark.parametrize("name", ["config.yaml", "config_fa4.yaml"])
+def test_shipped_configs_are_valid(name):
+    pytest.importorskip("yaml")
+    config = ServerConfig.load(DEFAULTS, BACKEND / name, environ={}, gpu_count=8).validate()
+    argv = config.argv()
+    assert argv[argv.index("--max-running-requests") + 1] == "32"
+    assert config.sources["max-running-requests"] == name
+
+
+def test_environment_overrides_are_typed():
+    environ = {"APP_SERVER_MAX_RUNNING_REQUESTS": "64", "APP_SERVER_ENABLE_DP_ATTENTION": "off"}
+    config = ServerConfig.load(DEFAULTS, config={"max-running-requests": 32}, environ=environ)
+    assert config.get("max-running-requests") == 64
+    assert config.sources["max-running-requests"] == "env"
+    assert config.get("enable-dp-attention") is False
+
+
+def test_bools_are_not_numbers():
+    with pytest.raises(ConfigError, match="max-running-requests"):
+        coerce("max-running-requests", True)
+    with pytest.raises(ConfigError, match="mem-fraction-static"):
+        coerce("mem-fraction-static", False)
+    assert coerce("mem-fraction-static", 1) == 1.0
+
+
+def test_lists_become_repeated_values():
+    config = ServerConfig.load(
+        DEFAULTS, config={"cuda-graph-bs": [1, 2, 4, 8], "disable-radix-cache": False}, environ={}
+    )
+    argv = config.argv()
+    start = argv.index("--cuda-graph-bs")
+    assert argv[start : start + 5] == ["--cuda-graph-bs", "1", "2", "4", "8"]
+    assert "--disable-radix-cache" not in argv
+
+
+def test_bad_combinations_are_all_reported():
+    config = ServerConfig.load(
+        DEFAULTS,
+        config={
+            "dp": 3,
+            "max-running-requests": 64,
+            "cuda-graph-max-bs": 32,
+            "attention-backend": "fa4",
+            "speculative-num-steps": 3,
+        },
+        environ={},
+        gpu_count=8,
+    )
+    with pytest.raises(ConfigError) as error:
+        config.validate()
+    message = str(error.value)
+    for problem in ("dp must divide tp", "cuda-graph-max-bs", "page-size", "speculative"):
+        assert problem in message
@@ -0,0 +1,58 @@
+import threading
+
+import specdec
+from conftest import BACKEND
+
+FIXTURES = BACKEND / "fixtures"
+
+
+def test_recorded_logs_recommend_speculating():
+    stats = specdec.load_stats([FIXTURES / "sglang_decode.log"])
+    baseline = specdec.load_stats([FIXTURES / "sglang_decode_nospec.log"])
+    assert stats.samples > 300 and baseline.accept_len() is None  # prefill lines are skipped
+    report = specdec.recommend(stats, steps=3, baseline=baseline)
+    assert report["speculate"] and report["recommended_steps"] == 3
+    assert 2.4 < report["accept_len"] < 2.8
+    # measured, speculation helps least at the largest batches
+    measured = report["measured_speedup_by_batch"]
+    assert measured["<=32"] < measured["<=1"] and report["measured_speedup"] > 1
+
+
+def test_summary_uses_the_configured_steps():
+    stats = specdec.DecodeStats(steps=3)
+    stats.observe_line(
+        "[2026-02-07 00:12:37 DP0 TP0] Decode batch. #running-req: 2, #token: 4698, "
+        "token usage: 0.02, accept len: 2.50, cuda graph: True, "
+        "gen throughput (token/s): 243.13, #queue-req: 0, "
+    )
+    summary = stats.summary()
+    assert summary["draft_efficiency"] == 0.5
+    assert summary["by_batch"]["<=2"]["per_request_tps"] == 121.565
+
+
+def test_summary_while_samples_arrive():
+    stats = specdec.DecodeStats(steps=3)
+    done = threading.Event()
+
+    def feed():
+        running = 1
+        while not done.is_set():
+            stats.add(specdec.DecodeSample(running, 100.0 * running, 2.5))
+            running = running % 300 + 1  # keeps adding buckets
+
+    thread = threading.Thread(target=feed)
+    thread.start()
+    try:
+        for _ in range(200):
+            summary = stats.summary()
+            assert summary["samples"] == sum(b["samples"] for b in summary["by_batch"].values())
+    finally:
+        done.set()
+        thread.join()
+
+
+def test_malformed_numbers_are_skipped():
+    sample = specdec.parse_decode_line(
+        "Decode batch. #running-req: 4, accept len: ., gen throughput (token/s): ."
+    )
+    assert sample == specdec.DecodeSample(4, None, None)
@@ -0,0 +1,88 @@
+import io
+import socket
+import threading
+
+import pytest
+
+import startup
+from conftest import BACKEND
+
+FIXTURES = BACKEND / "fixtures"
+
+
+def test_recorded_log_phases():
+    with open(FIXTURES / "sglang_startup.log") as f:
+        parser = startup.parse_log(line.rstrip("\n") for line in f)
+    phases = parser.phase_timings()
+    # from the first rank's begin line to the last rank's end line
+    assert phases["weight_load"]["start"] == 15 and phases["weight_load"]["end"] == 103
+    assert phases["cuda_graph_capture"]["start"] == 212
+    assert phases["cuda_graph_capture"]["duration"] == 50
+    assert phases["server_warmup"]["start"] == 264 and phases["server_warmup"]["end"] == 272
+    assert parser.ready_at == 264
+    timeline = [event["phase"] for event in startup.sort_timeline(parser.phases)]
+    assert timeline == [
+        "distributed_init",
+        "weight_load",
+        "kv_cache_alloc",
+        "kernel_jit",
+        "cuda_graph_capture",
+        "server_warmup",
+    ]
+
+
+def test_progress_bars_belong_to_the_previous_line():
+    parser = startup.parse_log(
+        [
+            "[2026-02-07 00:00:00 DP0 TP0] Load weight begin. avail mem=176.38 GB",
+            "\rLoading safetensors checkpoint shards: 100% Completed | 142/142",
+            "[2026-02-07 00:01:00 DP0 TP0] Load weight end. type=GlmMoeDsaForCausalLM",
+        ]
+    )
+    assert parser.phase_timings()["weight_load"]["duration"] == 60
+
+
+class ExitedProcess:
+    def poll(self):
+        return 1
+
+
+def test_wait_fails_fast_when_the_server_exits():
+    watcher = startup.LogWatcher(iter(()), out=io.StringIO())
+    watcher.observe("RuntimeError: CUDA out of memory")
+    with pytest.raises(RuntimeError, match="CUDA out of memory"):
+        startup.wait_for_server_ready(ExitedProcess(), "http://127.0.0.1:9/health", watcher)
+
+
+def test_a_failing_listener_does_not_stop_the_tee(capsys):
+    def broken(line):
+        raise ValueError(line)
+
+    seen = []
+    out = io.StringIO()
+    lines = ["first\n", "The server is fired up and ready to roll\n", "last\n"]
+    watcher = startup.LogWatcher(iter(lines), out=out, listeners=[broken, seen.append])
+    watcher.start()._thread.join(timeout=5)
+
+    assert out.getvalue() == "".join(lines)
+    assert seen == [line.rstrip("\n") for line in lines]
+    assert watcher.log_says_ready.is_set()
+    assert capsys.readouterr().err.count("Traceback") == 1  # reported once
+
+
+@pytest.mark.parametrize("reply", [b"", b"garbage\r\n\r\n"])
+def test_health_check_survives_a_misbehaving_server(reply):
+    listener = socket.create_server(("127.0.0.1", 0))
+    port = listener.getsockname()[1]
+
+    def answer():
+        conn, _ = listener.accept()
+        with conn:
+            conn.recv(4096)
+            conn.sendall(reply)
+
+    thread = threading.Thread(target=answer, daemon=True)
+    thread.start()
+    with listener:
+        assert not startup.check_health(f"http://127.0.0.1:{port}/health", timeout=5)
+    thread.join(timeout=5)
@@ -0,0 +1,84 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("yaml")
+pytest.importorskip("aiohttp")
+
+import sweep  # noqa: E402
+from conftest import BACKEND  # noqa: E402
+from server_config import default_options  # noqa: E402
+
+DEFAULTS = default_options("zai-org/GLM-5-FP8", 8, 8000)
+
+
+def test_render_config_merges_and_validates():
+    base = {
+        "max-running-requests": 32,
+        "speculative-algorithm": "EAGLE",
+        "speculative-num-steps": 3,
+    }
+    overrides = {"max-running-requests": 64, "speculative-algorithm": None}
+    rendered = sweep.render_config(base, overrides)
+    assert rendered == {"max-running-requests": 64}
+    assert base["speculative-algorithm"] == "EAGLE"  # the base is left alone
+
+    good = {"name": "good", "options": {**rendered, "cuda-graph-max-bs": 64}}
+    bad = {"name": "bad", "options": {**rendered, "cuda-graph-max-bs": 16}}
+    assert sweep.valid_cells([good, bad], DEFAULTS, gpu_count=8) == [good]
+
+
+def test_make_cells_crosses_the_grid_with_each_base():
+    grid = sweep.parse_grid("max-running-requests=16,32;speculative-algorithm=EAGLE,none")
+    bases = [str(BACKEND / "config.yaml"), str(BACKEND / "config_fa4.yaml")]
+    cells = sweep.make_cells(bases, grid)
+    assert len(cells) == 8
+    assert cells[1]["name"] == "config,max-running-requests=16,speculative-algorithm=none"
+    assert cells[1]["base"] == "config.yaml"
+    assert not any(name.startswith("speculative-") for name in cells[1]["options"])
+    assert cells[-1]["options"]["max-running-requests"] == 32
+
+
+def row(name, tps, p99):
+    return {"cell": name, "output_tokens_per_s": tps, "latency_p99_s": p99}
+
+
+def test_pareto_front_drops_dominated_rows_and_keeps_ties():
+    rows = sweep.pareto_front(
+        [
+            row("fast", 1000, 2.0),
+            row("tie", 1000, 2.0),
+            row("snappy", 500, 1.0),
+            row("dominated", 400, 2.5),
+            {"cell": "failed", "error": "boom"},
+        ]
+    )
+    assert [r["cell"] for r in rows if r["pareto"]] == ["fast", "tie", "snappy"]
+
+
+def test_failed_cell_is_a_row():
+    cell = {"name": "bad", "base": "config.yaml", "overrides": {"tp": 3}}
+    failed = sweep.summarize_cell(cell, None, "RuntimeError: exited")
+    assert failed == {
+        "cell": "bad",
+        "base": "config.yaml",
+        "overrides": {"tp": 3},
+        "error": "RuntimeError: exited",
+    }
+    assert "failed: RuntimeError: exited" in sweep.format_table(sweep.pareto_front([failed]))
+
+
+def test_sweep_against_the_mock_server(tmp_path):
+    grid = {"max-running-requests": [2, 8]}
+    cells = sweep.make_cells([str(BACKEND / "config.yaml")], grid)
+    mock_args = ["--decode-delay", "0.001", "--prefill-delay", "0"]
+    launcher = sweep.MockLauncher(tmp_path / "work", mock_args)
+    bench_kwargs = dict(num_requests=8, concurrency=8, input_len="32", output_len="8")
+    rows = asyncio.run(sweep.run_sweep(cells, launcher.run, bench_kwargs, tmp_path / "out"))
+    assert [r["cell"] for r in rows] == [cell["name"] for cell in cells]
+    assert all(r["error_rate"] == 0 and r["output_tokens_per_s"] > 0 for r in rows)
+    assert any(r["pareto"] for r in rows)
+    saved = json.loads((tmp_path / "out" / "sweep.json").read_text())
+    assert saved == rows
+    assert (tmp_path / "out" / sweep._slug(cells[0]["name"]) / "report.json").exists()
@@ -0,0 +1,205 @@
+"""Measure the latency and memory the Messages API proxy adds to a stream.
+
+Starts the backend's mock SGLang server as a stand-in, with no per-token
+delay so that any extra time is proxy overhead, then streams the same
+requests straight at it and through `translator.py`. Reports time to first
+token, streaming time per token, and the proxy's resident memory. If
+`litellm` is on the PATH, the LiteLLM proxy is measured the same way.
+
+```bash
+python bench_proxy.py
+python bench_proxy.py --requests 50 --concurrency 8 --tokens 2000
+python bench_proxy.py --requests 200 --tokens 100 --fail-rate 0.5
+```
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiohttp
+
+from translator import StreamTranslator
+
+HERE = Path(__file__).resolve().parent
+MOCK_SERVER = HERE.parent.parent / "backend" / "mock_server.py"
+
+LITELLM_CONFIG = """\
+model_list:
+  - model_name: claude-sonnet-4-5-20250929
+    litellm_params:
+      model: openai/llm
+      api_base: {backend}
+      api_key: none
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_mb(pid: int) -> float | None:
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    except FileNotFoundError:
+        pass
+    return None
+
+
+async def wait_ready(url: str, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(url) as resp:
+                    if resp.status < 500:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"{url} did not come up")
+
+
+async def stream_one(session, url: str, body: dict) -> tuple[float, float] | None:
+    """Seconds to the first network chunk, and from there to the end of the stream"""
+    start = time.perf_counter()
+    first = None
+    async with session.post(url, json=body) as resp:
+        if resp.status != 200:
+            await resp.read()
+            return None
+        async for _ in resp.content.iter_any():
+            if first is None:
+                first = time.perf_counter()
+    return first - start, time.perf_counter() - first
+
+
+async def run(url: str, body: dict, requests: int, concurrency: int, tokens: int) -> dict:
+    limit = asyncio.Semaphore(concurrency)
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=600)) as session:
+        while await stream_one(session, url, body) is None:  # warm up the pool
+            pass
+
+        async def one():
+            async with limit:
+                return await stream_one(session, url, body)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+    errors = results.count(None)
+    results = [result for result in results if result is not None]
+    # network chunks batch a varying number of tokens, so time the stream per token
+    return {
+        "errors": errors,
+        "ttft_ms_p50": round(1000 * statistics.median(ttft for ttft, _ in results), 2),
+        "us_per_token": round(1e6 * statistics.fmean(r for _, r in results) / tokens, 1),
+        "wall_s": round(elapsed, 2),
+    }
+
+
+def translate_cpu(num_chunks: int = 100_000, repeat: int = 5) -> float:
+    """CPU microseconds to translate one parsed chunk, without any I/O"""
+    chunk = {"choices": [{"index": 0, "delta": {"content": "tok "}, "finish_reason": None}]}
+    best = float("inf")
+    for _ in range(repeat):
+        translator = StreamTranslator("claude-sonnet-4-5-20250929")
+        start = time.process_time()
+        translator.start()
+        for _ in range(num_chunks):
+            translator.feed(chunk)
+        translator.finish()
+        best = min(best, time.process_time() - start)
+    return round(1e6 * best / num_chunks, 3)
+
+
+def spawn(args: list[str], **kwargs) -> subprocess.Popen:
+    return subprocess.Popen(
+        args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **kwargs
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--tokens", type=int, default=1000, help="Output tokens per request")
+    parser.add_argument(
+        "--fail-rate", type=float, default=0.0, help="Fraction of backend requests to fail"
+    )
+    args = parser.parse_args()
+
+    processes = []
+    try:
+        backend_port = free_port()
+        backend = f"http://127.0.0.1:{backend_port}/v1"
+        processes.append(
+            spawn(
+                [sys.executable, str(MOCK_SERVER), "--port", str(backend_port)]
+                + ["--decode-delay", "0", "--prefill-delay", "0"]
+                + ["--max-running-requests", "1000", "--default-max-tokens", str(args.tokens)]
+                + ["--fail-rate", str(args.fail_rate), "--fail-retry-after", "0"]
+            )
+        )
+        await wait_ready(f"http://127.0.0.1:{backend_port}/health")
+
+        prompt = [{"role": "user", "content": "Write a long story about jazz."}]
+        openai_body = {"model": "llm", "messages": prompt, "stream": True}
+        anthropic_body = {
+            "model": "claude-sonnet-4-5-20250929",
+            "max_tokens": args.tokens,
+            "messages": prompt,
+            "stream": True,
+        }
+
+        load = (args.requests, args.concurrency, args.tokens)
+        report = {"direct": await run(f"{backend}/chat/completions", openai_body, *load)}
+
+        proxies = {"translator": [sys.executable, str(HERE / "translator.py")]}
+        if shutil.which("litellm"):
+            config = Path(tempfile.mkdtemp()) / "config.yaml"
+            config.write_text(LITELLM_CONFIG.format(backend=backend))
+            proxies["litellm"] = ["litellm", "--config", str(config)]
+        else:
+            report["litellm"] = "skipped: litellm not installed"
+
+        for name, command in proxies.items():
+            port = free_port()
+            proxy = spawn(
+                command + ["--host", "127.0.0.1", "--port", str(port)],
+                env={**os.environ, "LLM_BACKEND_URL": backend},
+            )
+            processes.append(proxy)
+            await wait_ready(f"http://127.0.0.1:{port}/health")
+            url = f"http://127.0.0.1:{port}/v1/messages"
+            result = await run(url, anthropic_body, *load)
+            result["rss_mb"] = rss_mb(proxy.pid)
+            if name == "translator":
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(f"http://127.0.0.1:{port}/proxy/stats") as resp:
+                        result["retries"] = await resp.json()
+            report[name] = result
+
+        report["translate_cpu_us_per_chunk"] = translate_cpu()
+        print(json.dumps(report, indent=2))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
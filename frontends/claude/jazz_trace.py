@@ -0,0 +1 @@
+../../backend/jazz_trace.py
\ No newline at end of file
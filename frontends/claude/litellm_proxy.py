@@ -31,7 +31,6 @@ def serve():
     subprocess.Popen(
         [
             "litellm",
-            "--debug",
             "--config", "/app/config.yaml",
             "--host", "0.0.0.0",
             "--port", str(LITELLM_PORT),
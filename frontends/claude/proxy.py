@@ -0,0 +1,24 @@
+import modal
+
+from translator import PROXY_PORT
+
+proxy_image = (
+    modal.Image.debian_slim(python_version="3.12")
+    .uv_pip_install("aiohttp")
+    .add_local_python_source("translator", "upstream", "jazz_sse", "jazz_trace")
+)
+
+app = modal.App("claude-proxy", image=proxy_image)
+
+
+@app.function(
+    scaledown_window=300,
+    timeout=600,
+    secrets=[modal.Secret.from_dotenv()],
+)
+@modal.concurrent(max_inputs=100)
+@modal.web_server(port=PROXY_PORT, startup_timeout=30)
+def serve():
+    import subprocess
+
+    subprocess.Popen(["python", "-m", "translator", "--port", str(PROXY_PORT)])
@@ -0,0 +1,28 @@
+import sys
+from pathlib import Path
+
+# the modules are imported flat, the way `proxy.py` ships them with add_local_python_source
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+async def serve(app) -> tuple:
+    """Run an aiohttp app on a free local port; the runner, to clean up, and its URL"""
+    from aiohttp import web
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}"
+
+
+def sse_events(body: bytes) -> list[tuple[str, dict]]:
+    """The `event:` names and JSON `data:` of a Messages API stream"""
+    import json
+
+    events = []
+    for block in body.decode().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
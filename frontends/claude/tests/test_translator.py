@@ -0,0 +1,250 @@
+import asyncio
+import json
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web  # noqa: E402
+from conftest import serve, sse_events  # noqa: E402
+
+import translator  # noqa: E402
+
+REQUEST = {
+    "model": "claude-sonnet-4-5",
+    "max_tokens": 64,
+    "stream": True,
+    "system": "Be brief.",
+    "messages": [{"role": "user", "content": "hi"}],
+}
+
+
+def chunk(delta: dict, finish_reason=None, usage=None) -> bytes:
+    data = {"choices": [{"delta": delta, "finish_reason": finish_reason}], "usage": usage}
+    return b"data: " + json.dumps(data).encode() + b"\n\n"
+
+
+def backend_app(chunks: list[bytes], drop: bool = False) -> web.Application:
+    """A chat completions endpoint streaming `chunks`, then [DONE] or a dropped connection"""
+
+    async def chat(request):
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        for data in chunks:
+            await resp.write(data)
+        if drop:
+            request.transport.close()
+            return resp
+        await resp.write(b"data: [DONE]\n\n")
+        await resp.write_eof()
+        return resp
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat)
+    return app
+
+
+async def post(backend: web.Application, body=REQUEST):
+    runner, backend_url = await serve(backend)
+    front, url = await serve(translator.make_app(backend_url + "/v1"))
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(url + "/v1/messages", json=body) as resp:
+                return resp.status, await resp.read()
+    finally:
+        await front.cleanup()
+        await runner.cleanup()
+
+
+def test_request_translation():
+    payload = translator.to_openai({**REQUEST, "thinking": {"type": "enabled"}})
+    assert payload["messages"] == [
+        {"role": "system", "content": "Be brief."},
+        {"role": "user", "content": "hi"},
+    ]
+    assert payload["stream_options"] == {"include_usage": True}
+    assert payload["chat_template_kwargs"] == {"clear_thinking": False, "enable_thinking": True}
+
+
+def test_stream_translation():
+    chunks = [
+        chunk({"reasoning_content": "Hm."}),
+        chunk({"content": "Hi"}),
+        chunk({}, "stop", {"prompt_tokens": 10, "completion_tokens": 3}),
+    ]
+    status, body = asyncio.run(post(backend_app(chunks)))
+    assert status == 200
+    events = sse_events(body)
+    names = [name for name, _ in events]
+    assert names[:2] == ["message_start", "ping"] and names[-1] == "message_stop"
+    deltas = [data["delta"] for name, data in events if name == "content_block_delta"]
+    assert deltas == [
+        {"type": "thinking_delta", "thinking": "Hm."},
+        {"type": "text_delta", "text": "Hi"},
+    ]
+    [(_, message_delta)] = [event for event in events if event[0] == "message_delta"]
+    assert message_delta["delta"]["stop_reason"] == "end_turn"
+    assert message_delta["usage"]["output_tokens"] == 3
+
+
+def test_backend_dies_mid_stream():
+    status, body = asyncio.run(post(backend_app([chunk({"content": "Hi"})], drop=True)))
+    assert status == 200  # already sent when the backend went away
+    events = sse_events(body)
+    name, error = events[-1]
+    assert name == "error" and error["error"]["type"] == "api_error"
+    assert "message_stop" not in [name for name, _ in events]
+
+
+def test_assistant_turn_with_thinking_and_tool_use():
+    message = translator._assistant_message(
+        [
+            {"type": "thinking", "thinking": "Need the weather.", "signature": "sig"},
+            {"type": "text", "text": "Checking."},
+            {"type": "tool_use", "id": "toolu_1", "name": "weather", "input": {"city": "Oslo"}},
+        ]
+    )
+    assert message == {
+        "role": "assistant",
+        "content": "Checking.",
+        "reasoning_content": "Need the weather.",
+        "tool_calls": [
+            {
+                "id": "toolu_1",
+                "type": "function",
+                "function": {"name": "weather", "arguments": '{"city":"Oslo"}'},
+            }
+        ],
+    }
+
+
+def test_tool_results_come_before_the_user_text():
+    messages = translator._user_messages(
+        [
+            {"type": "text", "text": "And tomorrow?"},
+            {"type": "tool_result", "tool_use_id": "toolu_1", "content": "Rain"},
+            {
+                "type": "tool_result",
+                "tool_use_id": "toolu_2",
+                "content": [{"type": "text", "text": "timeout"}],
+                "is_error": True,
+            },
+        ]
+    )
+    assert messages == [
+        {"role": "tool", "tool_call_id": "toolu_1", "content": "Rain"},
+        {"role": "tool", "tool_call_id": "toolu_2", "content": "Error: timeout"},
+        {"role": "user", "content": "And tomorrow?"},
+    ]
+
+
+@pytest.mark.parametrize(
+    "choice, expected",
+    [
+        ({"type": "auto"}, "auto"),
+        ({"type": "any"}, "required"),
+        ({"type": "none"}, "none"),
+        (
+            {"type": "tool", "name": "weather"},
+            {"type": "function", "function": {"name": "weather"}},
+        ),
+    ],
+)
+def test_tool_choice(choice, expected):
+    assert translator._tool_choice(choice) == expected
+
+
+def test_streamed_tool_calls():
+    def call(index, id=None, name=None, arguments=None):
+        function = {"name": name, "arguments": arguments} if name else {"arguments": arguments}
+        return {"tool_calls": [{"index": index, "id": id, "function": function}]}
+
+    chunks = [
+        chunk({"content": "Let me check."}),
+        chunk(call(0, "call_a", "weather", "")),
+        chunk(call(0, arguments='{"city":')),
+        chunk(call(0, arguments='"Oslo"}')),
+        chunk(call(1, "call_b", "time", '{"tz":"CET"}')),
+        chunk({}, "tool_calls", {"prompt_tokens": 10, "completion_tokens": 20}),
+    ]
+    status, body = asyncio.run(post(backend_app(chunks)))
+    assert status == 200
+    events = sse_events(body)
+
+    starts = [data for name, data in events if name == "content_block_start"]
+    assert [(s["index"], s["content_block"]["type"]) for s in starts] == [
+        (0, "text"),
+        (1, "tool_use"),
+        (2, "tool_use"),
+    ]
+    assert [s["content_block"].get("id") for s in starts[1:]] == ["call_a", "call_b"]
+    assert [s["content_block"].get("name") for s in starts[1:]] == ["weather", "time"]
+
+    arguments = {}
+    for name, data in events:
+        if name == "content_block_delta" and data["delta"]["type"] == "input_json_delta":
+            partial = data["delta"]["partial_json"]
+            arguments[data["index"]] = arguments.get(data["index"], "") + partial
+    assert {index: json.loads(text) for index, text in arguments.items()} == {
+        1: {"city": "Oslo"},
+        2: {"tz": "CET"},
+    }
+
+    stops = [data["index"] for name, data in events if name == "content_block_stop"]
+    assert stops == [0, 1, 2]
+    [(_, message_delta)] = [event for event in events if event[0] == "message_delta"]
+    assert message_delta["delta"]["stop_reason"] == "tool_use"
+
+
+def test_non_streaming_response():
+    response = {
+        "choices": [
+            {
+                "message": {
+                    "reasoning_content": "Hm.",
+                    "content": "Calling it.",
+                    "tool_calls": [
+                        {
+                            "id": "call_a",
+                            "function": {"name": "weather", "arguments": '{"city":"Oslo"}'},
+                        }
+                    ],
+                },
+                "finish_reason": "tool_calls",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": 100,
+            "completion_tokens": 7,
+            "prompt_tokens_details": {"cached_tokens": 64},
+        },
+    }
+    message = translator.to_anthropic(response, "claude-sonnet-4-5")
+    assert message["model"] == "claude-sonnet-4-5"
+    assert message["content"] == [
+        {"type": "thinking", "thinking": "Hm.", "signature": ""},
+        {"type": "text", "text": "Calling it."},
+        {"type": "tool_use", "id": "call_a", "name": "weather", "input": {"city": "Oslo"}},
+    ]
+    assert message["stop_reason"] == "tool_use"
+    assert message["usage"] == {
+        "input_tokens": 36,
+        "cache_read_input_tokens": 64,
+        "cache_creation_input_tokens": 0,
+        "output_tokens": 7,
+    }
+
+
+def test_count_tokens_rejects_invalid_json():
+    async def count(data: bytes):
+        front, url = await serve(translator.make_app("http://127.0.0.1:9/v1"))
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(url + "/v1/messages/count_tokens", data=data) as resp:
+                    return resp.status, await resp.json()
+        finally:
+            await front.cleanup()
+
+    status, body = asyncio.run(count(b"{not json"))
+    assert status == 400 and body["error"]["type"] == "invalid_request_error"
+    status, body = asyncio.run(count(json.dumps(REQUEST).encode()))
+    assert status == 200 and body["input_tokens"] > 0
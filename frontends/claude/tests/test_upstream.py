@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web  # noqa: E402
+from conftest import serve  # noqa: E402
+
+import translator  # noqa: E402
+from upstream import CircuitBreaker, RetryBudget, RetryPolicy, Upstream  # noqa: E402
+
+REQUEST = {"max_tokens": 8, "messages": [{"role": "user", "content": "hi"}]}
+
+
+def test_breaker_opens_then_probes_once():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0)
+    breaker.record(False)
+    assert breaker.state == "closed"
+    breaker.record(False)
+    assert breaker.state == "half_open"  # open for reset_timeout, here none
+    assert breaker.allow() and not breaker.allow()  # one probe at a time
+    breaker.record(True)
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_probe_without_a_verdict_lets_another_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record(False)
+    assert breaker.allow()
+    breaker.record(None)  # e.g. the probe was cancelled
+    assert breaker.state == "half_open" and breaker.allow()
+
+
+def test_budget_limits_retries():
+    budget = RetryBudget(ratio=0.5, min_per_second=0, cap=1)
+    assert budget.withdraw() and not budget.withdraw()
+    budget.deposit()
+    budget.deposit()
+    assert budget.withdraw()
+
+
+def test_long_retry_after_goes_back_to_the_client():
+    upstream = Upstream(RetryPolicy(max_delay=2))
+    assert upstream.retry_delay(1, retry_after=30) is None
+    assert 1 <= upstream.retry_delay(1, retry_after=1) <= 2
+
+
+def test_cancelled_probe_releases_the_breaker():
+    async def slow(request):
+        await asyncio.sleep(1)
+        return web.json_response({})
+
+    backend = web.Application()
+    backend.router.add_post("/v1/chat/completions", slow)
+
+    async def run():
+        runner, backend_url = await serve(backend)
+        app = translator.make_app(backend_url + "/v1", policy=RetryPolicy(reset_timeout=0))
+        # cancel handlers whose client goes away, as a shutdown would
+        front = web.AppRunner(app, handler_cancellation=True)
+        await front.setup()
+        site = web.TCPSite(front, "127.0.0.1", 0)
+        await site.start()
+        url = site.name
+        breaker = app["upstream"].breaker(backend_url + "/v1")
+        breaker.opened_at = 0.0  # open long ago, so the next request is a probe
+        try:
+            async with aiohttp.ClientSession() as session:
+                with pytest.raises(asyncio.TimeoutError):
+                    await session.post(
+                        url + "/v1/messages",
+                        json=REQUEST,
+                        timeout=aiohttp.ClientTimeout(total=0.2),
+                    )
+                await asyncio.sleep(0.1)
+                return breaker.probing
+        finally:
+            await front.cleanup()
+            await runner.cleanup()
+
+    assert asyncio.run(run()) is False
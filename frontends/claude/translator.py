@@ -0,0 +1,590 @@
+"""Anthropic Messages API in front of an OpenAI-compatible backend.
+
+Claude clients speak `/v1/messages`, and the jazz backend speaks
+`/v1/chat/completions`. This proxy translates between them in one small
+asyncio process, streaming as it goes:
+
+- system prompts, text, images, `tool_use`/`tool_result` blocks and tool
+  definitions become OpenAI messages, `tool_calls` and functions
+- `thinking` blocks round-trip as `reasoning_content`, so earlier turns'
+  reasoning stays in the prompt and the prefix cache stays warm
+- `usage` comes back with cached prompt tokens as `cache_read_input_tokens`
+- each request gets a `proxy` span (see `jazz_trace.py`), whose `traceparent`
+  goes to the backend, continuing the client's trace if it sent one
+
+Every Claude model name is served by the one backend model.
+
+```bash
+python translator.py --backend-url http://localhost:8000/v1
+ANTHROPIC_BASE_URL=http://localhost:4000 claude
+```
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+import uuid
+
+import aiohttp
+from aiohttp import web
+
+from jazz_sse import aiter_json
+from jazz_trace import FLUSH_INTERVAL, TRACEPARENT, Span, SpanRecorder
+from upstream import RETRYABLE_STATUSES, RetryPolicy, Upstream, parse_retry_after
+
+PROXY_PORT = 4000
+BACKEND_MODEL = "zai-org/GLM-5-FP8"
+
+STOP_REASONS = {
+    "stop": "end_turn",
+    "length": "max_tokens",
+    "tool_calls": "tool_use",
+    "function_call": "tool_use",
+    "content_filter": "refusal",
+}
+
+ERROR_TYPES = {
+    400: "invalid_request_error",
+    401: "authentication_error",
+    403: "permission_error",
+    404: "not_found_error",
+    413: "request_too_large",
+    429: "rate_limit_error",
+    503: "overloaded_error",
+    529: "overloaded_error",
+}
+
+# passed through to the backend, e.g. the gateway's priority and session headers
+FORWARDED_HEADER_PREFIX = "x-jazz-"
+
+_dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+def _text(content) -> str:
+    """The text of a string or a list of content blocks"""
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block.get("text", "") for block in content or [] if block.get("type") == "text"
+    )
+
+
+def _image_url(source: dict) -> str:
+    if source.get("type") == "base64":
+        return f"data:{source.get('media_type')};base64,{source.get('data')}"
+    return source.get("url", "")
+
+
+def _user_messages(content: list) -> list[dict]:
+    """An Anthropic user turn: tool results first, as `tool` messages, then the rest"""
+    messages, parts = [], []
+    for block in content:
+        kind = block.get("type")
+        if kind == "tool_result":
+            result = _text(block.get("content"))
+            if block.get("is_error"):
+                result = f"Error: {result}"
+            messages.append(
+                {"role": "tool", "tool_call_id": block.get("tool_use_id"), "content": result}
+            )
+        elif kind == "text":
+            parts.append({"type": "text", "text": block.get("text", "")})
+        elif kind == "image":
+            url = _image_url(block.get("source") or {})
+            parts.append({"type": "image_url", "image_url": {"url": url}})
+    if parts:
+        if all(part["type"] == "text" for part in parts):
+            messages.append({"role": "user", "content": "".join(p["text"] for p in parts)})
+        else:
+            messages.append({"role": "user", "content": parts})
+    return messages
+
+
+def _assistant_message(content: list) -> dict:
+    text, reasoning, calls = [], [], []
+    for block in content:
+        kind = block.get("type")
+        if kind == "text":
+            text.append(block.get("text", ""))
+        elif kind == "thinking":
+            reasoning.append(block.get("thinking", ""))
+        elif kind == "tool_use":
+            arguments = _dumps(block.get("input") or {})
+            calls.append(
+                {
+                    "id": block.get("id"),
+                    "type": "function",
+                    "function": {"name": block.get("name"), "arguments": arguments},
+                }
+            )
+    message = {"role": "assistant", "content": "".join(text) or None}
+    if reasoning:
+        message["reasoning_content"] = "".join(reasoning)
+    if calls:
+        message["tool_calls"] = calls
+    return message
+
+
+def _tool_choice(choice: dict):
+    kind = choice.get("type")
+    if kind == "tool":
+        return {"type": "function", "function": {"name": choice.get("name")}}
+    return {"any": "required", "none": "none"}.get(kind, "auto")
+
+
+def to_openai(body: dict, model: str = BACKEND_MODEL) -> dict:
+    """Translate a Messages API request into a chat completions request"""
+    messages = []
+    if body.get("system"):
+        messages.append({"role": "system", "content": _text(body["system"])})
+    for message in body.get("messages") or []:
+        content = message.get("content")
+        if isinstance(content, str):
+            messages.append({"role": message.get("role"), "content": content})
+        elif message.get("role") == "assistant":
+            messages.append(_assistant_message(content or []))
+        else:
+            messages.extend(_user_messages(content or []))
+
+    request = {"model": model, "messages": messages, "stream": bool(body.get("stream"))}
+    if body.get("max_tokens") is not None:
+        request["max_tokens"] = body["max_tokens"]
+    for name in ("temperature", "top_p", "top_k"):
+        if body.get(name) is not None:
+            request[name] = body[name]
+    if body.get("stop_sequences"):
+        request["stop"] = body["stop_sequences"]
+    if request["stream"]:
+        request["stream_options"] = {"include_usage": True}
+
+    tools = [
+        {
+            "type": "function",
+            "function": {
+                "name": tool["name"],
+                "description": tool.get("description", ""),
+                "parameters": tool["input_schema"],
+            },
+        }
+        for tool in body.get("tools") or []
+        if "input_schema" in tool  # server tools like web search have none
+    ]
+    if tools:
+        request["tools"] = tools
+        if body.get("tool_choice"):
+            request["tool_choice"] = _tool_choice(body["tool_choice"])
+
+    # keep earlier turns' reasoning in the rendered prompt (GLM "preserved thinking")
+    template_kwargs = {"clear_thinking": False}
+    thinking = (body.get("thinking") or {}).get("type")
+    if thinking in ("enabled", "disabled"):
+        template_kwargs["enable_thinking"] = thinking == "enabled"
+    request["chat_template_kwargs"] = template_kwargs
+    return request
+
+
+def anthropic_usage(usage: dict | None) -> dict:
+    usage = usage or {}
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    return {
+        "input_tokens": (usage.get("prompt_tokens") or 0) - cached,
+        "cache_read_input_tokens": cached,
+        "cache_creation_input_tokens": 0,
+        "output_tokens": usage.get("completion_tokens") or 0,
+    }
+
+
+def to_anthropic(response: dict, model: str) -> dict:
+    """Translate a (non-streaming) chat completion into a Messages API response"""
+    choice = (response.get("choices") or [{}])[0]
+    message = choice.get("message") or {}
+    content = []
+    if message.get("reasoning_content"):
+        content.append(
+            {"type": "thinking", "thinking": message["reasoning_content"], "signature": ""}
+        )
+    if message.get("content"):
+        content.append({"type": "text", "text": message["content"]})
+    for call in message.get("tool_calls") or []:
+        function = call.get("function") or {}
+        try:
+            arguments = json.loads(function.get("arguments") or "{}")
+        except json.JSONDecodeError:
+            arguments = {}
+        content.append(
+            {
+                "type": "tool_use",
+                "id": call.get("id") or f"toolu_{uuid.uuid4().hex[:24]}",
+                "name": function.get("name", ""),
+                "input": arguments,
+            }
+        )
+    return {
+        "id": f"msg_{uuid.uuid4().hex[:24]}",
+        "type": "message",
+        "role": "assistant",
+        "model": model,
+        "content": content,
+        "stop_reason": STOP_REASONS.get(choice.get("finish_reason"), "end_turn"),
+        "stop_sequence": None,
+        "usage": anthropic_usage(response.get("usage")),
+    }
+
+
+def _event(name: str, payload: dict) -> bytes:
+    return f"event: {name}\ndata: ".encode() + _dumps(payload).encode() + b"\n\n"
+
+
+class StreamTranslator:
+    """Turns chat completion chunks into Messages API stream events, as bytes"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.index = -1  # of the open content block
+        self.block = None  # its type
+        self.tools: dict[int, int] = {}  # OpenAI tool call index -> block index
+        self.stop_reason = None
+        self.usage = None
+        # the per-token events are formatted by hand, around a JSON-encoded string
+        self._delta_prefix = b""
+
+    def start(self) -> bytes:
+        message = {
+            "id": f"msg_{uuid.uuid4().hex[:24]}",
+            "type": "message",
+            "role": "assistant",
+            "model": self.model,
+            "content": [],
+            "stop_reason": None,
+            "stop_sequence": None,
+            "usage": anthropic_usage(None),
+        }
+        return _event("message_start", {"type": "message_start", "message": message}) + (
+            _event("ping", {"type": "ping"})
+        )
+
+    def _open(self, block: dict) -> bytes:
+        out = self._close()
+        self.index += 1
+        self.block = block["type"]
+        self._delta_prefix = (
+            b'event: content_block_delta\ndata: {"type":"content_block_delta","index":%d,'
+            b'"delta":{"type":"%s","%s":'
+            % (
+                self.index,
+                b"thinking_delta" if self.block == "thinking" else b"text_delta",
+                b"thinking" if self.block == "thinking" else b"text",
+            )
+        )
+        start = {"type": "content_block_start", "index": self.index, "content_block": block}
+        return out + _event("content_block_start", start)
+
+    def _close(self) -> bytes:
+        if self.block is None:
+            return b""
+        self.block = None
+        return _event("content_block_stop", {"type": "content_block_stop", "index": self.index})
+
+    def _delta(self, text: str) -> bytes:
+        return self._delta_prefix + _dumps(text).encode() + b"}}\n\n"
+
+    def feed(self, chunk: dict) -> bytes:
+        """Events for one chat completion chunk"""
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+        choices = chunk.get("choices")
+        if not choices:
+            return b""
+        choice = choices[0]
+        delta = choice.get("delta") or {}
+        out = b""
+
+        reasoning = delta.get("reasoning_content")
+        if reasoning:
+            if self.block != "thinking":
+                out += self._open({"type": "thinking", "thinking": "", "signature": ""})
+            out += self._delta(reasoning)
+
+        content = delta.get("content")
+        if content:
+            if self.block != "text":
+                out += self._open({"type": "text", "text": ""})
+            out += self._delta(content)
+
+        for call in delta.get("tool_calls") or ():
+            function = call.get("function") or {}
+            position = call.get("index", 0)
+            if position not in self.tools:
+                out += self._open(
+                    {
+                        "type": "tool_use",
+                        "id": call.get("id") or f"toolu_{uuid.uuid4().hex[:24]}",
+                        "name": function.get("name", ""),
+                        "input": {},
+                    }
+                )
+                self.tools[position] = self.index
+            if function.get("arguments"):
+                out += _event(
+                    "content_block_delta",
+                    {
+                        "type": "content_block_delta",
+                        "index": self.tools[position],
+                        "delta": {
+                            "type": "input_json_delta",
+                            "partial_json": function["arguments"],
+                        },
+                    },
+                )
+
+        if choice.get("finish_reason"):
+            self.stop_reason = STOP_REASONS.get(choice["finish_reason"], "end_turn")
+        return out
+
+    def finish(self) -> bytes:
+        delta = {"stop_reason": self.stop_reason or "end_turn", "stop_sequence": None}
+        return (
+            self._close()
+            + _event(
+                "message_delta",
+                {"type": "message_delta", "delta": delta, "usage": anthropic_usage(self.usage)},
+            )
+            + _event("message_stop", {"type": "message_stop"})
+        )
+
+
+def error_body(status: int, message: str) -> dict:
+    kind = ERROR_TYPES.get(status, "api_error")
+    return {"type": "error", "error": {"type": kind, "message": message}}
+
+
+def error_response(status: int, message: str, retry_after=None) -> web.Response:
+    headers = {"Retry-After": str(retry_after)} if retry_after is not None else None
+    return web.json_response(error_body(status, message), status=status, headers=headers)
+
+
+def estimate_tokens(body: dict) -> int:
+    """About four characters per token, for `/v1/messages/count_tokens`"""
+    parts = [body.get("system"), body.get("messages"), body.get("tools")]
+    return max(1, len(_dumps(parts)) // 4)
+
+
+def make_app(
+    backend_url: str,
+    api_key: str | None = None,
+    model: str = BACKEND_MODEL,
+    policy: RetryPolicy | None = None,
+    tracer: SpanRecorder | None = None,
+) -> web.Application:
+    """Serve the Messages API, proxying to `backend_url` (including `/v1`).
+
+    Spans are kept in `tracer`, in memory only unless it has a path."""
+    backend_url = backend_url.rstrip("/")
+    app = web.Application(client_max_size=64 * 1024**2)
+    app["upstream"] = upstream = Upstream(policy)
+    app["tracer"] = tracer = tracer or SpanRecorder()
+
+    async def flush_spans():
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            tracer.flush()
+
+    async def start_session(app):
+        app["flusher"] = asyncio.create_task(flush_spans())
+        app["session"] = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=10),
+        )
+
+    async def close_session(app):
+        app["flusher"].cancel()
+        tracer.flush()
+        await app["session"].close()
+
+    def backend_headers(request: web.Request) -> dict:
+        key = api_key or request.headers.get("x-api-key")
+        headers = {
+            name: value
+            for name, value in request.headers.items()
+            if name.lower().startswith(FORWARDED_HEADER_PREFIX)
+        }
+        if key:
+            headers["Authorization"] = f"Bearer {key}"
+        elif "Authorization" in request.headers:
+            headers["Authorization"] = request.headers["Authorization"]
+        return headers
+
+    async def backend_error(response: aiohttp.ClientResponse) -> web.Response:
+        text = await response.text()
+        try:
+            message = json.loads(text)["error"]["message"]
+        except (json.JSONDecodeError, KeyError, TypeError):
+            message = text[:1000] or response.reason
+        return error_response(response.status, message, response.headers.get("Retry-After"))
+
+    async def post(data: bytes, headers: dict):
+        """The backend's response, retried within the budget, or an error for the client"""
+        url = f"{backend_url}/chat/completions"
+        breaker = upstream.breaker(backend_url)
+        upstream.counts["requests"] += 1
+        upstream.budget.deposit()
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                upstream.counts["short_circuited"] += 1
+                retry_after = math.ceil(breaker.retry_after()) or 1
+                return None, error_response(503, "Backend is unavailable", retry_after)
+            attempt += 1
+            upstream.counts["attempts"] += 1
+            ok = failure = None
+            try:
+                response = await app["session"].post(url, data=data, headers=headers)
+                # a 429 is about the caller's share, not the backend's health
+                ok = response.status < 500
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                ok = False
+                retry_after, failure = None, error_response(502, f"Backend unreachable: {e}")
+            finally:
+                breaker.record(ok)  # even if cancelled, so a probe can't stay out forever
+            if failure is None:
+                if response.status not in RETRYABLE_STATUSES:
+                    return response, None
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                failure = await backend_error(response)
+            delay = upstream.retry_delay(attempt, retry_after)
+            if delay is None:
+                return None, failure
+            await asyncio.sleep(delay)
+
+    async def messages(request: web.Request) -> web.StreamResponse:
+        span = tracer.start("proxy", request.headers.get(TRACEPARENT))
+        try:
+            resp = await translate(request, span)
+            span.status = resp.status
+            return resp
+        finally:
+            tracer.finish(span)
+
+    async def translate(request: web.Request, span: Span) -> web.StreamResponse:
+        try:
+            body = await request.json()
+        except json.JSONDecodeError:
+            return web.json_response(error_body(400, "Invalid JSON"), status=400)
+        requested_model = body.get("model") or model
+        payload = to_openai(body, model)
+
+        headers = {
+            **backend_headers(request),
+            "Content-Type": "application/json",
+            TRACEPARENT: span.traceparent,
+        }
+        response, failure = await post(_dumps(payload).encode(), headers)
+        if failure is not None:
+            return failure
+        async with response:
+            if response.status != 200:
+                return await backend_error(response)
+
+            if not payload["stream"]:
+                completion = await response.json(content_type=None)
+                span.mark("first_token")
+                resp = web.json_response(to_anthropic(completion, requested_model))
+                resp.headers[TRACEPARENT] = span.traceparent
+                return resp
+
+            resp = web.StreamResponse(
+                headers={
+                    "Content-Type": "text/event-stream",
+                    "Cache-Control": "no-cache",
+                    TRACEPARENT: span.traceparent,
+                }
+            )
+            await resp.prepare(request)
+            translator = StreamTranslator(requested_model)
+            await resp.write(translator.start())
+            try:
+                async for chunk in aiter_json(response.content.iter_any()):
+                    if span.first_token is None:
+                        span.mark("first_token")
+                    span.events += 1
+                    if chunk.get("error"):  # e.g. a draining gateway cutting the stream off
+                        error = chunk["error"]
+                        status = error.get("code") if isinstance(error.get("code"), int) else 500
+                        await resp.write(
+                            _event("error", error_body(status, error.get("message", "")))
+                        )
+                        break
+                    events = translator.feed(chunk)
+                    if events:
+                        await resp.write(events)
+                else:
+                    await resp.write(translator.finish())
+            except (aiohttp.ClientPayloadError, aiohttp.ClientConnectionError) as e:
+                if request.transport is None or request.transport.is_closing():
+                    return resp  # the client went away, and it's what failed
+                # the status line is sent, so the error has to go in the stream
+                message = f"Backend stream broke off: {type(e).__name__}"
+                await resp.write(_event("error", error_body(502, message)))
+            await resp.write_eof()
+            return resp
+
+    async def count_tokens(request: web.Request) -> web.Response:
+        try:
+            body = await request.json()
+        except json.JSONDecodeError:
+            return web.json_response(error_body(400, "Invalid JSON"), status=400)
+        return web.json_response({"input_tokens": estimate_tokens(body)})
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "time": time.time()})
+
+    async def stats(request: web.Request) -> web.Response:
+        return web.json_response(upstream.stats())
+
+    async def traces(request: web.Request) -> web.Response:
+        return web.json_response({"spans": tracer.query(request.query.get("trace"))})
+
+    app.on_startup.append(start_session)
+    app.on_cleanup.append(close_session)
+    app.router.add_post("/v1/messages", messages)
+    app.router.add_post("/v1/messages/count_tokens", count_tokens)
+    app.router.add_get("/health", health)
+    app.router.add_get("/proxy/stats", stats)
+    app.router.add_get("/proxy/traces", traces)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Anthropic Messages API proxy")
+    parser.add_argument(
+        "--backend-url",
+        default=os.environ.get("LLM_BACKEND_URL", "http://localhost:8000/v1"),
+        help="OpenAI-compatible API base, including /v1",
+    )
+    parser.add_argument(
+        "--api-key",
+        default=os.environ.get("LLM_BACKEND_API_KEY") or None,
+        help="Backend key; by default the client's x-api-key is passed through",
+    )
+    parser.add_argument("--model", default=os.environ.get("LLM_BACKEND_MODEL", BACKEND_MODEL))
+    parser.add_argument("--max-attempts", type=int, default=RetryPolicy.max_attempts)
+    parser.add_argument(
+        "--retry-ratio", type=float, default=RetryPolicy.ratio, help="Retries per request"
+    )
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=PROXY_PORT)
+    parser.add_argument("--trace-log", default=None, help="Record request spans to this file")
+    args = parser.parse_args()
+
+    print(f"Serving the Messages API on :{args.port}, backed by {args.backend_url}")
+    policy = RetryPolicy(max_attempts=args.max_attempts, ratio=args.retry_ratio)
+    tracer = SpanRecorder(args.trace_log)
+    app = make_app(args.backend_url, args.api_key, args.model, policy, tracer)
+    web.run_app(app, host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Retries for the proxy's backend requests that can't pile onto an overloaded replica.
+
+A proxy that retries every failure a fixed number of times multiplies the
+load on a backend exactly when it is shedding load with 503s. Here:
+
+- retries draw from a budget that grows by `ratio` per request (10%, so at
+  most ~1.1 backend attempts per request), plus a small floor per second so
+  a quiet proxy can still retry the occasional blip
+- the delay before a retry is jittered exponential backoff, and never less
+  than the backend's `Retry-After`; a `Retry-After` longer than `max_delay`
+  goes back to the client instead
+- each backend URL has a circuit breaker: after `failure_threshold` failures
+  in a row it fails requests fast, for `reset_timeout` seconds, then lets one
+  probe through to decide whether to close again
+
+Only the request before any response bytes reach the client is retried.
+"""
+
+import random
+import time
+from dataclasses import dataclass
+
+# overloaded or briefly unreachable; anything else goes straight back to the client
+RETRYABLE_STATUSES = frozenset({429, 502, 503, 504, 529})
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 3  # per request, the first included
+    ratio: float = 0.1  # retries allowed per request
+    min_per_second: float = 1.0  # retries allowed regardless of traffic
+    base_delay: float = 0.25  # seconds, doubled per attempt before jitter
+    max_delay: float = 8.0  # longest wait before a retry, Retry-After included
+    failure_threshold: int = 5  # consecutive failures that open a breaker
+    reset_timeout: float = 10.0  # seconds a breaker stays open before a probe
+
+
+class RetryBudget:
+    """A token bucket of retries, filled by requests and by the passing of time"""
+
+    def __init__(self, ratio: float = 0.1, min_per_second: float = 1.0, cap: float = 10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.cap = cap
+        self.balance = cap
+        self._refilled_at = time.monotonic()
+
+    def _refill(self, amount: float):
+        self.balance = min(self.cap, self.balance + amount)
+
+    def deposit(self):
+        """Count one request"""
+        self._refill(self.ratio)
+
+    def withdraw(self) -> bool:
+        """Take one retry from the budget, if there is one"""
+        now = time.monotonic()
+        self._refill(self.min_per_second * (now - self._refilled_at))
+        self._refilled_at = now
+        if self.balance < 1:
+            return False
+        self.balance -= 1
+        return True
+
+
+class CircuitBreaker:
+    """Closed, open for `reset_timeout` after repeated failures, then half open"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.probing = False
+        self.opens = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.retry_after() == 0 else "open"
+
+    def retry_after(self) -> float:
+        """Seconds until a probe may go through, 0 unless open"""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True  # just one request tests the backend
+            return True
+        return False
+
+    def record(self, ok: bool | None):
+        """The outcome of a request `allow` let through; None if it ended without
+        one, e.g. it was cancelled, which only lets another probe through"""
+        self.probing = False
+        if ok is None:
+            return
+        if ok:
+            self.failures = 0
+            self.opened_at = None
+            return
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                self.opens += 1
+            self.opened_at = time.monotonic()  # a failed probe opens it again
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds from a `Retry-After` header; HTTP dates are ignored"""
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def backoff(attempt: int, policy: RetryPolicy, retry_after: float | None = None) -> float:
+    """Seconds to wait before retry number `attempt` (from 1), with full jitter"""
+    delay = random.uniform(0, min(policy.max_delay, policy.base_delay * 2**attempt))
+    if retry_after is not None:
+        # spread clients told the same Retry-After over the following second
+        delay = retry_after + random.uniform(0, min(1.0, policy.base_delay * 2**attempt))
+    return delay
+
+
+class Upstream:
+    """Retry bookkeeping for the proxy: a shared budget and a breaker per backend"""
+
+    def __init__(self, policy: RetryPolicy | None = None):
+        self.policy = policy or RetryPolicy()
+        self.budget = RetryBudget(self.policy.ratio, self.policy.min_per_second)
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self.counts = dict.fromkeys(
+            ("requests", "attempts", "retries", "budget_exhausted", "short_circuited"), 0
+        )
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        breaker = self.breakers.get(url)
+        if breaker is None:
+            breaker = self.breakers[url] = CircuitBreaker(
+                self.policy.failure_threshold, self.policy.reset_timeout
+            )
+        return breaker
+
+    def retry_delay(self, attempt: int, retry_after: float | None) -> float | None:
+        """Seconds to wait before retrying, or None to give up"""
+        if attempt >= self.policy.max_attempts:
+            return None
+        if retry_after is not None and retry_after > self.policy.max_delay:
+            return None
+        if not self.budget.withdraw():
+            self.counts["budget_exhausted"] += 1
+            return None
+        self.counts["retries"] += 1
+        return backoff(attempt, self.policy, retry_after)
+
+    def stats(self) -> dict:
+        requests = self.counts["requests"]
+        return {
+            **self.counts,
+            # backend attempts per client request, 1.0 without any retries
+            "amplification": round(self.counts["attempts"] / requests, 3) if requests else None,
+            "budget": round(self.budget.balance, 2),
+            "breakers": {
+                url: {"state": b.state, "failures": b.failures, "opens": b.opens}
+                for url, b in self.breakers.items()
+            },
+        }
@@ -0,0 +1,105 @@
+"""Measure per-call latency saved by connection pooling in the jazz plugin.
+
+Sends 100 sequential prompts through `JazzReasoning`, first with a new client
+per call (`pool_connections=False`) and then with the shared pooled client.
+
+By default this runs against a local stand-in server over plain HTTP, which
+shows the TCP connect and client setup cost. Point it at a real endpoint with
+`--url` to include the TLS handshake:
+
+```bash
+python bench_pool.py
+python bench_pool.py --url https://your-jazz-endpoint.com/v1 --key $JAZZ_KEY
+```
+"""
+
+import argparse
+import http.server
+import json
+import statistics
+import threading
+import time
+
+from llm_show_reasoning import JazzReasoning, close_clients
+
+STANDIN_CHUNKS = [
+    {"choices": [{"delta": {"reasoning_content": "Thinking. "}}]},
+    {"choices": [{"delta": {"content": "Hello!"}}]},
+]
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = b"".join(
+            b"data: " + json.dumps(chunk).encode() + b"\n\n" for chunk in STANDIN_CHUNKS
+        )
+        body += b"data: [DONE]\n\n"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_standin() -> str:
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def run(model, url, key, n, **options) -> list[float]:
+    latencies = []
+    for i in range(n):
+        start = time.perf_counter()
+        response = model.prompt(
+            f"Prompt {i}", key=key, stream=True, api_base=url, **options
+        )
+        response.text()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def summarize(latencies: list[float]) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "mean_ms": 1000 * statistics.fmean(ordered),
+        "p50_ms": 1000 * ordered[len(ordered) // 2],
+        "p99_ms": 1000 * ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=None, help="API base, including /v1")
+    parser.add_argument("--key", default="dummy")
+    parser.add_argument("-n", type=int, default=100)
+    parser.add_argument("--http2", action="store_true")
+    args = parser.parse_args()
+
+    url = args.url or start_standin()
+    model = JazzReasoning()
+    options = {"http2": args.http2, "show_reasoning": False}
+
+    run(model, url, args.key, 1, **options)  # warm up imports and DNS
+    fresh = summarize(run(model, url, args.key, args.n, pool_connections=False, **options))
+    close_clients()
+    pooled = summarize(run(model, url, args.key, args.n, pool_connections=True, **options))
+
+    report = {
+        "url": url,
+        "prompts": args.n,
+        "fresh_client": fresh,
+        "pooled_client": pooled,
+        "saved_per_call_ms": fresh["mean_ms"] - pooled["mean_ms"],
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
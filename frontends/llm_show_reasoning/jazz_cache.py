@@ -0,0 +1,173 @@
+"""On-disk cache of jazz responses, for prompts that are sent over and over.
+
+CI and eval scripts tend to repeat identical prompts at `temperature=0`, and
+each repeat costs the backend a full prefill and decode. With `-o cache true`
+the plugin stores the raw reasoning and content of each response in SQLite,
+keyed by a hash of everything that determines the output, and replays hits
+through the same renderer as a live stream.
+
+Entries expire after a TTL and the least recently used ones are evicted once
+the cache grows past its size limit. The database is memory-mapped and opened
+once per process, so a lookup is a single indexed read.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+# request fields that change what the model generates, plus the server's URL
+KEY_FIELDS = (
+    "api_base",
+    "model",
+    "messages",
+    "temperature",
+    "seed",
+    "max_tokens",
+    "chat_template_kwargs",
+)
+
+SCHEMA = """
+create table if not exists responses (
+    key text primary key,
+    value text not null,
+    size integer not null,
+    created real not null,
+    accessed real not null
+);
+create index if not exists responses_accessed on responses (accessed);
+create index if not exists responses_created on responses (created);
+"""
+
+# how often to sweep out expired entries and refresh access times, in seconds
+SWEEP_INTERVAL = 60
+
+
+def cache_key(payload: dict, api_base: Optional[str] = None) -> str:
+    """Hash of a chat completions payload sent to `api_base`, ignoring transport-only fields"""
+    relevant = {field: payload.get(field) for field in KEY_FIELDS}
+    relevant["api_base"] = api_base
+    blob = json.dumps(relevant, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+class ResponseCache:
+    """Size-bounded LRU cache with a TTL, backed by SQLite"""
+
+    def __init__(
+        self,
+        path,
+        max_bytes: int = 512 << 20,
+        ttl: Optional[float] = 7 * 24 * 60 * 60,
+    ):
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # autocommit, so each statement is its own short transaction
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("pragma journal_mode = wal")
+        self._db.execute("pragma synchronous = normal")
+        self._db.execute(f"pragma mmap_size = {int(max_bytes) * 2}")
+        self._db.executescript(SCHEMA)
+        # tracked incrementally, so a put doesn't have to sum the whole table
+        self._size = self._total_size()
+        self._swept_at = 0.0
+
+    def _total_size(self) -> int:
+        return self._db.execute("select coalesce(sum(size), 0) from responses").fetchone()[0]
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and created < now - self.ttl
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "select value, created, accessed from responses where key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created, accessed = row
+            if self._expired(created, now):
+                self._db.execute("delete from responses where key = ?", (key,))
+                return None
+            # a write costs more than the read, so recency is only kept to the minute
+            if now - accessed > SWEEP_INTERVAL:
+                self._db.execute("update responses set accessed = ? where key = ?", (now, key))
+        return json.loads(value)
+
+    def put(self, key: str, entry: dict):
+        value = json.dumps(entry, ensure_ascii=False)
+        size = len(value.encode())
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "insert or replace into responses (key, value, size, created, accessed) "
+                "values (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._size += size
+
+            if self.ttl is not None and now - self._swept_at > SWEEP_INTERVAL:
+                self._db.execute("delete from responses where created < ?", (now - self.ttl,))
+                self._swept_at = now
+                self._size = self._total_size()
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # other processes may share the file, so start from the real total
+        total = self._total_size()
+        if total <= self.max_bytes:
+            self._size = total
+            return
+        # least recently used first, down to 90% so we don't evict on every put
+        target = 0.9 * self.max_bytes
+        evict = []
+        for key, size in self._db.execute("select key, size from responses order by accessed"):
+            if total <= target:
+                break
+            evict.append((key,))
+            total -= size
+        self._db.executemany("delete from responses where key = ?", evict)
+        self._size = total
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._db.execute(
+                "select count(*), coalesce(sum(size), 0) from responses"
+            ).fetchone()
+        return {
+            "path": self.path,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("delete from responses")
+            self._db.execute("vacuum")
+            self._size = 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_caches: dict[str, ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(path, max_bytes: int, ttl: Optional[float]) -> ResponseCache:
+    """The process-wide cache for `path`, with the latest limits applied"""
+    with _caches_lock:
+        cache = _caches.get(str(path))
+        if cache is None:
+            cache = _caches[str(path)] = ResponseCache(path, max_bytes, ttl)
+    cache.max_bytes, cache.ttl = max_bytes, ttl
+    return cache
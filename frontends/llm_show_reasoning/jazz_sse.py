@@ -0,0 +1 @@
+../../backend/jazz_sse.py
\ No newline at end of file
@@ -1,14 +1,79 @@
+import asyncio
+import atexit
+import importlib.util
 import json
 import os
-from typing import Iterable, Iterator, Optional
-
+import sys
+import threading
+import time
+import warnings
+import weakref
+from typing import AsyncIterator, Iterable, Iterator, Optional
+
+import click
 import httpx
 import llm
 
+from jazz_cache import cache_key, get_cache
+from jazz_sse import aiter_json, delta_text, finish_reason, iter_json
+from jazz_trace import TRACEPARENT, new_traceparent, parse_traceparent
+
+# Matches TARGET_INPUTS in backend/backend.py: concurrent requests per replica
+DEFAULT_BATCH_CONCURRENCY = 10
+
 
 @llm.hookimpl
 def register_models(register):
-    register(JazzReasoning(), aliases=("jazz",))
+    register(JazzReasoning(), AsyncJazzReasoning(), aliases=("jazz",))
+
+
+@llm.hookimpl
+def register_commands(cli):
+    @cli.group(name="jazz")
+    def jazz_group():
+        "Commands for the modal-jazz backend"
+
+    @jazz_group.command(name="batch")
+    @click.argument("prompts", type=click.File("r"))
+    @click.option("-s", "--system", help="System prompt for every line")
+    @click.option(
+        "options",
+        "-o",
+        "--option",
+        type=(str, str),
+        multiple=True,
+        help="key/value options for the model",
+    )
+    @click.option(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=DEFAULT_BATCH_CONCURRENCY,
+        show_default=True,
+        help="Maximum requests in flight",
+    )
+    @click.option("--key", help="API key to use")
+    def batch(prompts, system, options, concurrency, key):
+        """Run every prompt in PROMPTS concurrently, printing JSON lines in input order.
+
+        PROMPTS has one prompt per line, either as plain text or as a JSON object
+        with a "prompt" and optionally a "system" key.
+        """
+        items = [_parse_batch_line(line) for line in prompts if line.strip()]
+        asyncio.run(run_batch(items, system, dict(options), concurrency, key))
+
+    @jazz_group.command(name="cache")
+    @click.option("--clear", is_flag=True, help="Delete every cached response")
+    def cache(clear):
+        "Show the size of the response cache used by -o cache true"
+        options = JazzReasoning.Options()
+        response_cache = get_cache(
+            cache_path(), int(options.cache_max_mb * 1e6), options.cache_ttl
+        )
+        if clear:
+            response_cache.clear()
+        click.echo(json.dumps(response_cache.stats(), indent=2))
+
 
 ANSI = {
     "reset": "\x1b[0m",
@@ -21,7 +86,192 @@ ANSI = {
 }
 
 
-class JazzReasoning(llm.KeyModel):
+# Pooled clients, keyed by (api_base, http2, connect_timeout, read_timeout),
+# so repeated prompts reuse warm TLS connections to the same endpoint
+_clients: dict[tuple, httpx.Client] = {}
+_clients_lock = threading.Lock()
+
+# Async clients are bound to an event loop, so they're pooled per loop
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _client_kwargs(
+    http2: bool, connect_timeout: Optional[float], read_timeout: Optional[float]
+) -> dict:
+    if http2 and importlib.util.find_spec("h2") is None:
+        warnings.warn(
+            "HTTP/2 requires the h2 package (pip install 'httpx[http2]'); using HTTP/1.1",
+            stacklevel=2,
+        )
+        http2 = False
+
+    return dict(
+        http2=http2,
+        timeout=httpx.Timeout(
+            connect=connect_timeout,
+            read=read_timeout,
+            write=connect_timeout,
+            pool=connect_timeout,
+        ),
+        limits=httpx.Limits(keepalive_expiry=120),
+    )
+
+
+def make_client(
+    http2: bool = False,
+    connect_timeout: Optional[float] = 10.0,
+    read_timeout: Optional[float] = 600.0,
+) -> httpx.Client:
+    return httpx.Client(**_client_kwargs(http2, connect_timeout, read_timeout))
+
+
+def get_client(
+    api_base: str,
+    http2: bool = False,
+    connect_timeout: Optional[float] = 10.0,
+    read_timeout: Optional[float] = 600.0,
+) -> httpx.Client:
+    key = (api_base, http2, connect_timeout, read_timeout)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = make_client(http2, connect_timeout, read_timeout)
+    return client
+
+
+def get_async_client(
+    api_base: str,
+    http2: bool = False,
+    connect_timeout: Optional[float] = 10.0,
+    read_timeout: Optional[float] = 600.0,
+) -> httpx.AsyncClient:
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    key = (api_base, http2, connect_timeout, read_timeout)
+    client = clients.get(key)
+    if client is None:
+        client = clients[key] = httpx.AsyncClient(
+            **_client_kwargs(http2, connect_timeout, read_timeout)
+        )
+    return client
+
+
+@atexit.register
+def close_clients():
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+def cache_path() -> str:
+    return os.environ.get("JAZZ_CACHE_PATH") or str(llm.user_dir() / "jazz_cache.db")
+
+
+def _set_usage(response, usage) -> None:
+    if isinstance(usage, dict):
+        details = {}
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        if cached is not None:
+            details["cached_tokens"] = cached
+        reasoning = (usage.get("completion_tokens_details") or {}).get("reasoning_tokens")
+        if reasoning is not None:
+            details["reasoning_tokens"] = reasoning
+
+        response.set_usage(
+            input=usage.get("prompt_tokens"),
+            output=usage.get("completion_tokens"),
+            details=details or None,
+        )
+
+
+def _finish_response(
+    response,
+    renderer: "_ReasoningRenderer",
+    usage: Optional[dict],
+    traceparent: Optional[str] = None,
+    error: Optional[dict] = None,
+) -> None:
+    """Record the raw model output, so later turns can resend it byte for byte"""
+    response.response_json = renderer.raw()
+    if error is not None:  # the stream ended early, e.g. cut off by a draining gateway
+        response.response_json["incomplete"] = True
+        response.response_json["error"] = error
+        message = error.get("message") or error.get("type") or "stream error"
+        print(f"[jazz] response ended early: {message}", file=sys.stderr)
+    trace = parse_traceparent(traceparent)
+    if trace is not None:
+        response.response_json["trace_id"] = trace[0]
+        if renderer.opts.show_trace:
+            print(f"[jazz] trace: {trace[0]}", file=sys.stderr)
+
+    if renderer.opts.show_cache_stats and isinstance(usage, dict):
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        if cached is None:
+            summary = "not reported (is enable-cache-report set on the backend?)"
+        else:
+            share = cached / prompt_tokens if prompt_tokens else 0.0
+            summary = f"{cached} ({share:.0%})"
+        print(
+            f"[jazz] prompt tokens: {prompt_tokens}, cached: {summary}",
+            file=sys.stderr,
+        )
+
+
+class _ReasoningRenderer:
+    """Turns reasoning and content deltas into display text.
+
+    Reasoning is wrapped in the configured prefix, color, and suffix."""
+
+    def __init__(self, opts):
+        self.opts = opts
+        self.saw_reasoning = False
+        self.in_reasoning = False
+        self.reasoning_parts: list[str] = []
+        self.content_parts: list[str] = []
+
+    def feed(self, reasoning: Optional[str], content: Optional[str]) -> Iterator[str]:
+        opts = self.opts
+        if reasoning:
+            self.reasoning_parts.append(reasoning)
+        if content:
+            self.content_parts.append(content)
+
+        if opts.show_reasoning and reasoning:
+            if not self.saw_reasoning:
+                self.saw_reasoning = self.in_reasoning = True
+                if opts.reasoning_prefix:
+                    yield opts.reasoning_prefix
+                if opts.color_reasoning:
+                    yield ANSI.get(opts.reasoning_color, "")
+            yield reasoning
+
+        if content:
+            yield from self._end_reasoning()
+            yield content
+
+    def finish(self) -> Iterator[str]:
+        yield from self._end_reasoning()
+
+    def raw(self) -> dict:
+        """What the model generated, without display decorations"""
+        raw = {"content": "".join(self.content_parts)}
+        if self.reasoning_parts:
+            raw["reasoning_content"] = "".join(self.reasoning_parts)
+        return raw
+
+    def _end_reasoning(self) -> Iterator[str]:
+        if self.in_reasoning:
+            self.in_reasoning = False
+            if self.opts.color_reasoning:
+                yield ANSI["reset"]
+            if self.opts.reasoning_suffix:
+                yield self.opts.reasoning_suffix
+
+
+class _JazzBase:
     """
     OpenAI-compatible Chat Completions client that also prints reasoning content.
     """
@@ -45,62 +295,86 @@ class JazzReasoning(llm.KeyModel):
         reasoning_suffix: Optional[str] = "\n"
 
         temperature: Optional[float] = None
+        seed: Optional[int] = None
         max_tokens: Optional[int] = None
 
-    def execute(
-        self,
-        prompt: llm.Prompt,
-        stream: bool,
-        response: llm.Response,
-        conversation: Optional[llm.Conversation],
-        key: Optional[str] = None,
-    ) -> Iterable[str]:
-        # Return an iterator of text chunks (sync streaming style).
-        if stream:
-            return self._streaming_iterator(prompt, response, conversation, key)
-        else:
-            return self._nonstream_iterator(prompt, response, conversation, key)
+        preserve_reasoning: bool = True
+        show_cache_stats: bool = False
+        show_trace: bool = False
+
+        cache: bool = False
+        cache_ttl: Optional[float] = 7 * 24 * 60 * 60
+        cache_max_mb: float = 512
+
+        pool_connections: bool = True
+        http2: bool = False
+        connect_timeout: Optional[float] = 10.0
+        read_timeout: Optional[float] = 600.0
 
     def _build_messages(
         self, prompt: llm.Prompt, conversation: Optional[llm.Conversation]
     ):
+        """Chat history that renders to the same token prefix on every turn.
+
+        SGLang's prefix cache only helps if earlier turns are resent exactly as
+        before, so assistant turns use the raw output recorded by
+        `_finish_response` rather than the displayed text, and the system
+        prompt stays fixed once the conversation has one."""
+        opts = prompt.options
+        history = list(conversation.responses) if conversation is not None else []
+
+        system = prompt.system or next(
+            (prev.prompt.system for prev in history if prev.prompt.system), None
+        )
         messages = []
-        if prompt.system:
-            messages.append({"role": "system", "content": prompt.system})
-
-        # Minimal conversation support
-        if conversation is not None:
-            for prev in conversation.responses:
-                # prev.prompt.prompt may be None for tool-only turns; skip those
-                if getattr(prev.prompt, "prompt", None):
-                    messages.append({"role": "user", "content": prev.prompt.prompt})
-                text = prev.text()
-                if text:
-                    messages.append({"role": "assistant", "content": text})
+        if system:
+            messages.append({"role": "system", "content": system})
+
+        for prev in history:
+            # prev.prompt.prompt may be None for tool-only turns; skip those
+            if getattr(prev.prompt, "prompt", None):
+                messages.append({"role": "user", "content": prev.prompt.prompt})
+
+            raw = prev.response_json if isinstance(prev.response_json, dict) else {}
+            if "content" in raw:
+                message = {"role": "assistant", "content": raw["content"]}
+                if opts.preserve_reasoning and raw.get("reasoning_content"):
+                    message["reasoning_content"] = raw["reasoning_content"]
+            else:
+                # logged before raw output was recorded: best effort
+                message = {"role": "assistant", "content": prev.text_or_raise()}
+
+            if message["content"] or message.get("reasoning_content"):
+                messages.append(message)
 
         messages.append({"role": "user", "content": prompt.prompt or ""})
         return messages
 
-    def _streaming_iterator(
+    def _prepare_request(
         self,
         prompt: llm.Prompt,
-        response: llm.Response,
         conversation: Optional[llm.Conversation],
         key: Optional[str],
-    ) -> Iterator[str]:
+        stream: bool,
+    ) -> tuple[str, dict, dict]:
+        """URL, headers, and JSON payload for a chat completions request"""
         opts = prompt.options
         api_base = opts.api_base.rstrip("/")
 
         if "PLEASE_CONFIGURE_JAZZ_API_BASE" in api_base:
             raise ValueError(
                 "Jazz API base URL is not configured.\n"
-                "Set it with:\n"
+                "Set it with one of these methods:\n"
+                "  1. Export JAZZ_API_BASE environment variable:\n"
+                "     export JAZZ_API_BASE='https://your-endpoint.com/v1'\n"
+                "  2. Set persistent configuration:\n"
                 "     llm models options set jazz api_base https://your-endpoint.com/v1"
             )
 
         url = f"{api_base}/chat/completions"
 
-        headers = {"Content-Type": "application/json"}
+        # a new trace per request; the backend's spans are found by its id
+        headers = {"Content-Type": "application/json", TRACEPARENT: new_traceparent()}
         if key:
             headers["Authorization"] = f"Bearer {key}"
         else:
@@ -108,66 +382,140 @@ class JazzReasoning(llm.KeyModel):
 
         payload = {
             "model": opts.upstream_model,
-            "stream": True,
+            "stream": stream,
             "messages": self._build_messages(prompt, conversation),
         }
         if opts.temperature is not None:
             payload["temperature"] = opts.temperature
+        if opts.seed is not None:
+            payload["seed"] = opts.seed
         if opts.max_tokens is not None:
             payload["max_tokens"] = opts.max_tokens
+        if stream:
+            payload["stream_options"] = {"include_usage": True}
+        if opts.preserve_reasoning:
+            # keep earlier turns' reasoning in the rendered prompt (GLM "preserved thinking")
+            payload["chat_template_kwargs"] = {"clear_thinking": False}
+
+        return url, headers, payload
+
+    def _cache(self, opts):
+        if not opts.cache:
+            return None
+        return get_cache(cache_path(), int(opts.cache_max_mb * 1e6), opts.cache_ttl)
+
+    def _cached(
+        self, prompt: llm.Prompt, payload: dict, response
+    ) -> Optional[Iterator[str]]:
+        """Replay a cached response through the renderer, or None on a miss"""
+        cache = self._cache(prompt.options)
+        key = cache_key(payload, prompt.options.api_base.rstrip("/"))
+        entry = cache.get(key) if cache is not None else None
+        if entry is None:
+            return None
+
+        def replay():
+            renderer = _ReasoningRenderer(prompt.options)
+            _set_usage(response, entry.get("usage"))
+            yield from renderer.feed(entry.get("reasoning_content"), None)
+            yield from renderer.feed(None, entry["content"])
+            yield from renderer.finish()
+            _finish_response(response, renderer, None)
+
+        return replay()
+
+    def _store(
+        self,
+        prompt: llm.Prompt,
+        payload: dict,
+        renderer: _ReasoningRenderer,
+        usage,
+        finished: Optional[str],
+    ) -> None:
+        """Cache a response that ran to completion, if it is reproducible"""
+        if finished in (None, "abort"):
+            return  # cut short, so a replay would repeat the truncation
+        if payload.get("temperature") != 0 and payload.get("seed") is None:
+            # unset means the server's default sampling, which needn't be greedy
+            return  # the next request should get a fresh sample
+        cache = self._cache(prompt.options)
+        if cache is not None:
+            key = cache_key(payload, prompt.options.api_base.rstrip("/"))
+            cache.put(key, {**renderer.raw(), "usage": usage})
+
+    @staticmethod
+    def _message_parts(evt: dict) -> tuple[Optional[str], Optional[str]]:
+        """Reasoning and content from a non-streaming response"""
+        msg = (evt.get("choices") or [{}])[0].get("message") or {}
+        return msg.get("reasoning_content") or msg.get("reasoning"), msg.get("content")
+
+
+class JazzReasoning(_JazzBase, llm.KeyModel):
+    __doc__ = _JazzBase.__doc__
+
+    def _client(self, opts) -> httpx.Client:
+        """Shared keep-alive client, or a one-off if pooling is disabled"""
+        if not opts.pool_connections:
+            return make_client(opts.http2, opts.connect_timeout, opts.read_timeout)
+        return get_client(
+            opts.api_base.rstrip("/"),
+            http2=opts.http2,
+            connect_timeout=opts.connect_timeout,
+            read_timeout=opts.read_timeout,
+        )
+
+    def execute(
+        self,
+        prompt: llm.Prompt,
+        stream: bool,
+        response: llm.Response,
+        conversation: Optional[llm.Conversation],
+        key: Optional[str] = None,
+    ) -> Iterable[str]:
+        # Return an iterator of text chunks (sync streaming style).
+        if stream:
+            return self._streaming_iterator(prompt, response, conversation, key)
+        else:
+            return self._nonstream_iterator(prompt, response, conversation, key)
+
+    def _streaming_iterator(
+        self,
+        prompt: llm.Prompt,
+        response: llm.Response,
+        conversation: Optional[llm.Conversation],
+        key: Optional[str],
+    ) -> Iterator[str]:
+        opts = prompt.options
+        url, headers, payload = self._prepare_request(prompt, conversation, key, True)
+        if (cached := self._cached(prompt, payload, response)) is not None:
+            yield from cached
+            return
 
-        saw_reasoning = False
+        renderer = _ReasoningRenderer(opts)
+        client = self._client(opts)
+        usage = finished = error = None
 
-        with httpx.Client(timeout=None) as client:
+        try:
             with client.stream("POST", url, headers=headers, json=payload) as r:
                 r.raise_for_status()
-                for raw_line in r.iter_lines():
-                    if not raw_line:
-                        continue
-                    if not raw_line.startswith("data: "):
-                        continue
-
-                    data = raw_line[6:].strip()
-                    if data == "[DONE]":
+                for evt in iter_json(r.iter_bytes()):
+                    if evt.get("error"):
+                        error = evt["error"]
                         break
-
-                    evt = json.loads(data)
-
                     # Best-effort usage capture if your server sends it in-stream
-                    if "usage" in evt and isinstance(evt["usage"], dict):
-                        u = evt["usage"]
-                        response.set_usage(
-                            input=u.get("prompt_tokens"),
-                            output=u.get("completion_tokens"),
-                            total=u.get("total_tokens"),
-                        )
-
-                    choice = evt.get("choices", [{}])[0]
-                    delta = choice.get("delta") or {}
-
-                    rc = delta.get("reasoning_content")
-                    if opts.show_reasoning and rc:
-                        if not saw_reasoning:
-                            saw_reasoning = True
-                            if opts.reasoning_prefix:
-                                yield opts.reasoning_prefix
-
-                            if opts.color_reasoning:
-                                yield ANSI.get(opts.reasoning_color, "")
-                        yield rc
-
-                    c = delta.get("content")
-                    if c:
-                        if saw_reasoning:
-                            if opts.color_reasoning:
-                                yield ANSI["reset"]
-                            if opts.reasoning_suffix:
-                                yield opts.reasoning_suffix
-                                opts.reasoning_suffix = ""
-                        yield c
-
-                    c = delta.get("content")
-
+                    if evt.get("usage"):
+                        usage = evt["usage"]
+                        _set_usage(response, usage)
+                    finished = finish_reason(evt) or finished
+                    yield from renderer.feed(*delta_text(evt))
+        finally:
+            if not opts.pool_connections:
+                client.close()
+
+        yield from renderer.finish()
+        _finish_response(response, renderer, usage, headers[TRACEPARENT], error)
+        if error is None:
+            self._store(prompt, payload, renderer, usage, finished)
 
     def _nonstream_iterator(
         self,
@@ -177,63 +525,168 @@ class JazzReasoning(llm.KeyModel):
         key: Optional[str],
     ) -> Iterator[str]:
         opts = prompt.options
-        api_base = opts.api_base.rstrip("/")
+        url, headers, payload = self._prepare_request(prompt, conversation, key, False)
+        if (cached := self._cached(prompt, payload, response)) is not None:
+            yield from cached
+            return
 
-        if "PLEASE_CONFIGURE_JAZZ_API_BASE" in api_base:
-            raise ValueError(
-                "Jazz API base URL is not configured.\n"
-                "Set it with one of these methods:\n"
-                "  1. Export JAZZ_API_BASE environment variable:\n"
-                "     export JAZZ_API_BASE='https://your-endpoint.com/v1'\n"
-                "  2. Set persistent configuration:\n"
-                "     llm models options set jazz api_base https://your-endpoint.com/v1"
-            )
+        client = self._client(opts)
+        try:
+            r = client.post(url, headers=headers, json=payload)
+            r.raise_for_status()
+            evt = r.json()
+        finally:
+            if not opts.pool_connections:
+                client.close()
 
-        url = f"{api_base}/chat/completions"
+        _set_usage(response, evt.get("usage"))
 
-        headers = {"Content-Type": "application/json"}
-        if key:
-            headers["Authorization"] = f"Bearer {key}"
-        else:
-            headers["Authorization"] = "Bearer dummy"
+        reasoning, content = self._message_parts(evt)
+        renderer = _ReasoningRenderer(opts)
+        yield from renderer.feed(reasoning, None)
+        yield from renderer.finish()
+        yield from renderer.feed(None, content)
+        _finish_response(response, renderer, evt.get("usage"), headers[TRACEPARENT])
+        self._store(prompt, payload, renderer, evt.get("usage"), finish_reason(evt))
 
-        payload = {
-            "model": opts.upstream_model,
-            "stream": False,
-            "messages": self._build_messages(prompt, conversation),
-        }
-        if opts.temperature is not None:
-            payload["temperature"] = opts.temperature
-        if opts.max_tokens is not None:
-            payload["max_tokens"] = opts.max_tokens
 
-        with httpx.Client(timeout=None) as client:
-            r = client.post(url, headers=headers, json=payload)
-            r.raise_for_status()
-            evt = r.json()
+class AsyncJazzReasoning(_JazzBase, llm.AsyncKeyModel):
+    __doc__ = _JazzBase.__doc__
 
-        u = evt.get("usage")
-        if isinstance(u, dict):
-            response.set_usage(
-                input=u.get("prompt_tokens"),
-                output=u.get("completion_tokens"),
-                total=u.get("total_tokens"),
+    async def execute(
+        self,
+        prompt: llm.Prompt,
+        stream: bool,
+        response: llm.AsyncResponse,
+        conversation: Optional[llm.AsyncConversation],
+        key: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        opts = prompt.options
+        url, headers, payload = self._prepare_request(prompt, conversation, key, stream)
+        if (cached := self._cached(prompt, payload, response)) is not None:
+            for piece in cached:
+                yield piece
+            return
+
+        renderer = _ReasoningRenderer(opts)
+        usage = finished = error = None
+
+        if opts.pool_connections:
+            client = get_async_client(
+                opts.api_base.rstrip("/"),
+                http2=opts.http2,
+                connect_timeout=opts.connect_timeout,
+                read_timeout=opts.read_timeout,
+            )
+        else:
+            client = httpx.AsyncClient(
+                **_client_kwargs(opts.http2, opts.connect_timeout, opts.read_timeout)
             )
 
-        msg = (evt.get("choices") or [{}])[0].get("message") or {}
-        rc = msg.get("reasoning_content") or msg.get("reasoning")
-        c = msg.get("content") or ""
-
-        if opts.show_reasoning and rc:
-            if opts.reasoning_prefix:
-                yield opts.reasoning_prefix
-            if opts.color_reasoning:
-                yield ANSI.get(opts.reasoning_color, "")
-            yield rc
-            if opts.color_reasoning:
-                yield ANSI["reset"]
-            if opts.reasoning_suffix:
-                yield opts.reasoning_suffix
+        try:
+            if not stream:
+                r = await client.post(url, headers=headers, json=payload)
+                r.raise_for_status()
+                evt = r.json()
+                _set_usage(response, evt.get("usage"))
+
+                reasoning, content = self._message_parts(evt)
+                for piece in renderer.feed(reasoning, None):
+                    yield piece
+                for piece in renderer.finish():
+                    yield piece
+                for piece in renderer.feed(None, content):
+                    yield piece
+                traceparent = headers[TRACEPARENT]
+                _finish_response(response, renderer, evt.get("usage"), traceparent)
+                self._store(prompt, payload, renderer, evt.get("usage"), finish_reason(evt))
+                return
+
+            async with client.stream("POST", url, headers=headers, json=payload) as r:
+                r.raise_for_status()
+                async for evt in aiter_json(r.aiter_bytes()):
+                    if evt.get("error"):
+                        error = evt["error"]
+                        break
+                    if evt.get("usage"):
+                        usage = evt["usage"]
+                        _set_usage(response, usage)
+                    finished = finish_reason(evt) or finished
+                    for piece in renderer.feed(*delta_text(evt)):
+                        yield piece
+        finally:
+            if not opts.pool_connections:
+                await client.aclose()
+
+        for piece in renderer.finish():
+            yield piece
+        _finish_response(response, renderer, usage, headers[TRACEPARENT], error)
+        if error is None:
+            self._store(prompt, payload, renderer, usage, finished)
+
+
+def _parse_batch_line(line: str) -> dict:
+    line = line.rstrip("\n")
+    if line.lstrip().startswith("{"):
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError:
+            pass
+        else:
+            if isinstance(item, dict) and "prompt" in item:
+                return item
+    return {"prompt": line}
+
+
+async def run_batch(
+    items: list[dict],
+    system: Optional[str],
+    options: dict,
+    concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+    key: Optional[str] = None,
+    out=sys.stdout,
+    err=sys.stderr,
+):
+    """Fan `items` out to the backend, printing results in input order as they finish"""
+    model = llm.get_async_model("jazz")
+    options = {"show_reasoning": False, **options}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(index: int, item: dict) -> dict:
+        async with semaphore:
+            start = time.monotonic()
+            result = {"index": index, "prompt": item["prompt"]}
+            try:
+                response = model.prompt(
+                    item["prompt"],
+                    system=item.get("system", system),
+                    key=key,
+                    **options,
+                )
+                result["response"] = await response.text()
+                raw = response.response_json or {}
+                if raw.get("incomplete"):  # the partial text is kept, for a resend
+                    error = raw.get("error") or {}
+                    result["error"] = f"incomplete: {error.get('message', 'stream error')}"
+            except Exception as e:  # one bad prompt shouldn't sink the batch
+                result["error"] = f"{type(e).__name__}: {e}"
+            result["duration_s"] = round(time.monotonic() - start, 3)
+            return result
+
+    finished: dict[int, dict] = {}
+    next_index = 0
+    tasks = [run_one(index, item) for index, item in enumerate(items)]
+
+    for count, task in enumerate(asyncio.as_completed(tasks), start=1):
+        result = await task
+        status = "error" if "error" in result else "done"
+        print(
+            f"[{count}/{len(items)}] #{result['index']} {status} in {result['duration_s']}s",
+            file=err,
+            flush=True,
+        )
 
-        if c:
-            yield c
+        finished[result["index"]] = result
+        while next_index in finished:
+            print(json.dumps(finished.pop(next_index)), file=out, flush=True)
+            next_index += 1
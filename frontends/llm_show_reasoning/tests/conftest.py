@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the plugin's modules are top-level (py-modules in pyproject.toml), not a package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
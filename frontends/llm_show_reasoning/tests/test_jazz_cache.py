@@ -0,0 +1,122 @@
+import json
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("llm")
+
+import jazz_cache  # noqa: E402
+import llm_show_reasoning  # noqa: E402
+from jazz_cache import ResponseCache, cache_key  # noqa: E402
+
+PAYLOAD = {
+    "model": "llm",
+    "messages": [{"role": "user", "content": "hi"}],
+    "temperature": 0,
+}
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(jazz_cache.time, "time", clock)
+    return clock
+
+
+def test_key_is_stable_and_ignores_transport_fields():
+    key = cache_key(PAYLOAD, "http://a/v1")
+    reordered = dict(reversed(list(PAYLOAD.items())))
+    assert cache_key(reordered, "http://a/v1") == key
+    streamed = {**PAYLOAD, "stream": True, "stream_options": {"include_usage": True}}
+    assert cache_key(streamed, "http://a/v1") == key
+
+    assert cache_key(PAYLOAD, "http://b/v1") != key
+    assert cache_key({**PAYLOAD, "seed": 1}, "http://a/v1") != key
+    assert cache_key({**PAYLOAD, "max_tokens": 10}, "http://a/v1") != key
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = ResponseCache(tmp_path / "cache.db", ttl=60)
+    cache.put("k", {"content": "hello"})
+    clock.now += 59
+    assert cache.get("k") == {"content": "hello"}
+    clock.now += 2
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_are_evicted_past_max_bytes(tmp_path, clock):
+    entry = {"content": "x" * 100}
+    size = len(json.dumps(entry).encode())
+    cache = ResponseCache(tmp_path / "cache.db", max_bytes=3 * size, ttl=None)
+    for key in "abc":
+        cache.put(key, entry)
+        clock.now += jazz_cache.SWEEP_INTERVAL + 1
+    assert cache.get("a") == entry  # now the most recently used
+
+    # over the limit, so the oldest go until it's back under 90% of it
+    cache.put("d", entry)
+    assert [cache.get(key) for key in "abcd"] == [entry, None, None, entry]
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+
+def _sse(*events) -> bytes:
+    return b"".join(f"data: {json.dumps(evt)}\n\n".encode() for evt in events) + b"data: [DONE]\n\n"
+
+
+STREAM = _sse(
+    {"choices": [{"delta": {"role": "assistant"}}]},
+    {"choices": [{"delta": {"reasoning_content": "thinking"}}]},
+    {"choices": [{"delta": {"reasoning_content": " hard"}}]},
+    {"choices": [{"delta": {"content": "4"}}]},
+    {"choices": [{"delta": {}, "finish_reason": "stop"}]},
+    {"choices": [], "usage": {"prompt_tokens": 5, "completion_tokens": 3}},
+)
+
+
+@pytest.fixture
+def backend(monkeypatch, tmp_path):
+    """Serve STREAM to the sync model, counting the requests that reach it"""
+    monkeypatch.setenv("JAZZ_CACHE_PATH", str(tmp_path / "cache.db"))
+    requests = []
+
+    def handle(request):
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, content=STREAM, headers={"content-type": "text/event-stream"})
+
+    client = httpx.Client(transport=httpx.MockTransport(handle))
+    monkeypatch.setattr(llm_show_reasoning.JazzReasoning, "_client", lambda self, opts: client)
+    return requests
+
+
+def _run(**options) -> str:
+    model = llm_show_reasoning.JazzReasoning()
+    options = {"api_base": "http://jazz.test/v1", "cache": True, **options}
+    return "".join(model.prompt("what is 2 + 2?", stream=True, **options))
+
+
+def test_hit_replays_stream_byte_for_byte(backend):
+    live = _run(temperature=0)
+    replayed = _run(temperature=0)
+    assert len(backend) == 1
+    assert replayed == live
+    assert live.startswith("\x1b[2mthinking hard") and live.endswith("4")
+
+
+@pytest.mark.parametrize(
+    "options, stored",
+    [({}, False), ({"temperature": 0.7}, False), ({"temperature": 0}, True), ({"seed": 7}, True)],
+)
+def test_only_reproducible_responses_are_stored(backend, options, stored):
+    _run(**options)
+    _run(**options)
+    assert len(backend) == (1 if stored else 2)
+    assert ("seed" in backend[0]) == ("seed" in options)
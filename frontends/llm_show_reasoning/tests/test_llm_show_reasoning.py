@@ -0,0 +1,88 @@
+import asyncio
+import inspect
+import io
+import json
+
+import pytest
+
+pytest.importorskip("httpx")
+pytest.importorskip("llm")
+
+import llm_show_reasoning  # noqa: E402
+from llm_show_reasoning import get_async_client, get_client, run_batch  # noqa: E402
+
+
+def test_one_client_per_api_base():
+    a = get_client("http://a.test/v1")
+    assert get_client("http://a.test/v1") is a
+    assert get_client("http://b.test/v1") is not a
+    assert get_client("http://a.test/v1", read_timeout=5) is not a
+
+
+def test_one_async_client_per_api_base_and_loop():
+    async def clients():
+        first = get_async_client("http://a.test/v1")
+        same = get_async_client("http://a.test/v1")
+        other = get_async_client("http://b.test/v1")
+        for client in (first, other):
+            await client.aclose()
+        return first, same, other
+
+    first, same, other = asyncio.run(clients())
+    assert first is same and other is not first
+    # a new loop gets its own client, since httpx's pool is bound to the loop
+    second, _, _ = asyncio.run(clients())
+    assert second is not first
+
+
+def test_http2_without_h2_warns_at_the_caller(monkeypatch):
+    find_spec = llm_show_reasoning.importlib.util.find_spec
+    monkeypatch.setattr(
+        llm_show_reasoning.importlib.util,
+        "find_spec",
+        lambda name: None if name == "h2" else find_spec(name),
+    )
+    with pytest.warns(UserWarning, match="h2") as record:
+        client = llm_show_reasoning.make_client(http2=True)
+    client.close()
+    # attributed to make_client, which asked for HTTP/2, not to _client_kwargs
+    lines, start = inspect.getsourcelines(llm_show_reasoning.make_client)
+    assert record[0].filename == llm_show_reasoning.__file__
+    assert start <= record[0].lineno < start + len(lines)
+
+
+class FakeResponse:
+    def __init__(self, prompt: str):
+        self.prompt = prompt
+        self.response_json = {}
+
+    async def text(self) -> str:
+        if self.prompt == "bad":
+            raise ValueError("bad prompt")
+        # later prompts finish first, to scramble the completion order
+        await asyncio.sleep(0.01 * (5 - int(self.prompt)))
+        return f"answer {self.prompt}"
+
+
+class FakeModel:
+    def prompt(self, prompt, **kwargs):
+        return FakeResponse(prompt)
+
+
+def test_batch_prints_results_in_input_order(monkeypatch):
+    monkeypatch.setattr(llm_show_reasoning.llm, "get_async_model", lambda name: FakeModel())
+    items = [{"prompt": p} for p in ("1", "2", "bad", "3", "4")]
+    out, err = io.StringIO(), io.StringIO()
+    asyncio.run(run_batch(items, None, {}, concurrency=5, out=out, err=err))
+
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r["index"] for r in results] == [0, 1, 2, 3, 4]
+    assert [r.get("response") for r in results] == [
+        "answer 1",
+        "answer 2",
+        None,
+        "answer 3",
+        "answer 4",
+    ]
+    assert results[2]["error"] == "ValueError: bad prompt"
+    assert len(err.getvalue().splitlines()) == 5
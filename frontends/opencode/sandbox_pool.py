@@ -0,0 +1,227 @@
+"""A pool of warm OpenCode sandboxes per (repo, ref), so an agent starts in seconds.
+
+Creating a sandbox from scratch means building the image, installing
+OpenCode and cloning the repo, which takes minutes. The pool keeps `size`
+sandboxes per `repo@ref` already created and cloned. Handing one out leases
+it: its checkout is refreshed with an incremental `git fetch`, and it isn't
+given out again. Then the pool is topped back up.
+
+Sandboxes have a fixed lifetime, set when they're created, so a warm one is
+only handed out if it will outlive the lease. One that has sat idle longer
+than `max_idle` is recycled, and a leased one is terminated when its lease
+is up.
+
+Everything here is plain Python against a small backend interface, so the
+pool can be exercised with `FakeBackend` instead of Modal:
+
+```bash
+python sandbox_pool.py --simulate
+```
+"""
+
+import argparse
+import json
+import statistics
+import time
+from dataclasses import dataclass
+
+MAX_LIFETIME = 24 * 3600  # seconds, the longest timeout Modal gives a sandbox
+
+
+@dataclass
+class PoolConfig:
+    size: int = 1  # warm sandboxes kept per repo@ref
+    max_idle: float = 6 * 3600  # seconds a warm sandbox waits before it's recycled
+
+
+@dataclass
+class SandboxRecord:
+    id: str
+    key: str  # repo@ref
+    created_at: float
+    expires_at: float  # when the sandbox's own timeout terminates it
+    leased_until: float | None = None
+
+    @property
+    def leased(self) -> bool:
+        return self.leased_until is not None
+
+
+class FakeBackend:
+    """In-memory sandboxes with simulated creation and refresh times"""
+
+    def __init__(self, clock, create_seconds: float = 180.0, refresh_seconds: float = 3.0):
+        self.clock = clock
+        self.create_seconds = create_seconds
+        self.refresh_seconds = refresh_seconds
+        self.sandboxes: dict[str, SandboxRecord] = {}
+        self.ready_at: dict[str, float] = {}
+        self.ended_at: dict[str, float] = {}
+        self.created = 0
+
+    def list(self) -> list[SandboxRecord]:
+        now = self.clock()
+        return [
+            r
+            for r in self.sandboxes.values()
+            if r.expires_at > now and r.id not in self.ended_at
+        ]
+
+    def create(self, key: str, lifetime: float) -> SandboxRecord:
+        now = self.clock()
+        self.created += 1
+        record = SandboxRecord(f"sb-{self.created}", key, now, now + lifetime)
+        self.sandboxes[record.id] = record
+        self.ready_at[record.id] = now + self.create_seconds
+        return record
+
+    def save(self, record: SandboxRecord):
+        self.sandboxes[record.id] = record
+
+    def refresh(self, record: SandboxRecord) -> float:
+        """Seconds until the checkout is current: any setup left, then a fetch"""
+        return max(0.0, self.ready_at[record.id] - self.clock()) + self.refresh_seconds
+
+    def terminate(self, record: SandboxRecord):
+        self.ended_at.setdefault(record.id, self.clock())
+
+    def sandbox_seconds(self) -> float:
+        """Running time of every sandbox so far, which is what they cost"""
+        now = self.clock()
+        return sum(
+            min(self.ended_at.get(r.id, now), r.expires_at, now) - r.created_at
+            for r in self.sandboxes.values()
+        )
+
+
+class SandboxPool:
+    """Leases sandboxes from a backend, keeping `config.size` warm per repo@ref"""
+
+    def __init__(self, backend, config: PoolConfig | None = None, clock=time.time):
+        self.backend = backend
+        self.config = config or PoolConfig()
+        self.clock = clock
+        self.records: dict[str, SandboxRecord] = {}
+        self.counts = dict.fromkeys(("hits", "misses", "created", "recycled", "expired"), 0)
+
+    def sync(self):
+        """Reload the sandboxes the backend has running"""
+        self.records = {record.id: record for record in self.backend.list()}
+
+    def lifetime(self, lease: float) -> float:
+        """Timeout for a new warm sandbox: time to wait in the pool, then a lease"""
+        return min(MAX_LIFETIME, self.config.max_idle + lease)
+
+    def warm(self, key: str) -> list[SandboxRecord]:
+        """Unleased sandboxes for `key`, oldest first"""
+        return sorted(
+            (r for r in self.records.values() if r.key == key and not r.leased),
+            key=lambda r: r.created_at,
+        )
+
+    def acquire(self, key: str, lease: float) -> tuple[SandboxRecord, bool]:
+        """A sandbox leased for `lease` seconds, and whether it came from the pool"""
+        now = self.clock()
+        for record in self.warm(key):
+            if record.expires_at - now < lease:
+                continue  # would be terminated mid-lease; reap() recycles it
+            self._lease(record, now + lease)
+            try:
+                self.backend.refresh(record)
+            except RuntimeError as e:
+                print(f"🏖️  Discarding sandbox {record.id}: {e}")
+                self._terminate(record)
+                continue
+            self.counts["hits"] += 1
+            return record, True
+
+        self.counts["misses"] += 1
+        record = self._create(key, lease)
+        self._lease(record, now + lease)
+        self.backend.refresh(record)
+        return record, False
+
+    def reap(self) -> list[SandboxRecord]:
+        """Terminate sandboxes whose lease is over, or that idled too long"""
+        now = self.clock()
+        reaped = []
+        for record in list(self.records.values()):
+            if record.leased:
+                if record.leased_until <= now:
+                    self.counts["expired"] += 1
+                    reaped.append(record)
+            elif now - record.created_at > self.config.max_idle:
+                self.counts["recycled"] += 1
+                reaped.append(record)
+        for record in reaped:
+            self._terminate(record)
+        return reaped
+
+    def fill(self, key: str, lease: float) -> list[SandboxRecord]:
+        """Create sandboxes until `key` has `config.size` warm ones"""
+        missing = self.config.size - len(self.warm(key))
+        return [self._create(key, self.lifetime(lease)) for _ in range(max(0, missing))]
+
+    def stats(self) -> dict:
+        leased = sum(record.leased for record in self.records.values())
+        return {**self.counts, "warm": len(self.records) - leased, "leased": leased}
+
+    def _create(self, key: str, lifetime: float) -> SandboxRecord:
+        record = self.backend.create(key, lifetime)
+        self.records[record.id] = record
+        self.counts["created"] += 1
+        return record
+
+    def _lease(self, record: SandboxRecord, until: float):
+        record.leased_until = until
+        self.backend.save(record)
+
+    def _terminate(self, record: SandboxRecord):
+        self.records.pop(record.id, None)
+        self.backend.terminate(record)
+
+
+def simulate(
+    sessions: int = 40,
+    interval: float = 1800.0,
+    lease: float = 3600.0,
+    size: int = 1,
+    create_seconds: float = 180.0,
+    refresh_seconds: float = 3.0,
+) -> dict:
+    """Seconds to a ready agent, for sessions every `interval`, with and without a pool"""
+    results = {}
+    for pool_size in (0, size):
+        now = 0.0
+        backend = FakeBackend(lambda: now, create_seconds, refresh_seconds)
+        pool = SandboxPool(backend, PoolConfig(size=pool_size), clock=lambda: now)
+        waits = []
+        for _ in range(sessions):
+            pool.sync()
+            pool.reap()
+            record, _ = pool.acquire("modal-labs/modal-examples@main", lease)
+            waits.append(backend.refresh(record))
+            pool.fill("modal-labs/modal-examples@main", lease)
+            now += interval
+        results["pool" if pool_size else "no_pool"] = {
+            "wait_s_p50": round(statistics.median(waits), 1),
+            "wait_s_max": round(max(waits), 1),
+            "sandbox_hours": round(backend.sandbox_seconds() / 3600, 1),
+            **pool.stats(),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--simulate", action="store_true", required=True)
+    parser.add_argument("--sessions", type=int, default=40)
+    parser.add_argument("--interval", type=float, default=1800.0, help="Seconds between sessions")
+    parser.add_argument("--lease", type=float, default=3600.0, help="Seconds per session")
+    parser.add_argument("--size", type=int, default=1, help="Warm sandboxes per repo@ref")
+    args = parser.parse_args()
+    print(json.dumps(simulate(args.sessions, args.interval, args.lease, args.size), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# sandbox_pool.py is imported flat, next to opencode_server.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
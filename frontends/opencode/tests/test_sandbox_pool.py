@@ -0,0 +1,101 @@
+import pytest
+
+from sandbox_pool import FakeBackend, PoolConfig, SandboxPool
+
+KEY = "modal-labs/modal-examples@main"
+HOUR = 3600.0
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FlakyBackend(FakeBackend):
+    """Fails to refresh the sandboxes in `broken`"""
+
+    def __init__(self, clock, broken=()):
+        super().__init__(clock)
+        self.broken = set(broken)
+
+    def refresh(self, record):
+        if record.id in self.broken:
+            raise RuntimeError("git fetch failed")
+        return super().refresh(record)
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def make_pool(clock, backend=None, **config) -> SandboxPool:
+    return SandboxPool(backend or FakeBackend(clock), PoolConfig(**config), clock=clock)
+
+
+def test_warm_hit_and_miss(clock):
+    pool = make_pool(clock)
+    record, warm = pool.acquire(KEY, HOUR)
+    assert not warm and record.leased_until == HOUR
+    [spare] = pool.fill(KEY, HOUR)
+    clock.now = 600
+    hit, warm = pool.acquire(KEY, HOUR)
+    assert warm and hit is spare and hit.leased_until == 600 + HOUR
+    assert pool.stats()["hits"] == 1 and pool.stats()["misses"] == 1
+
+
+def test_skips_a_sandbox_that_would_expire_mid_lease(clock):
+    pool = make_pool(clock, max_idle=HOUR)
+    [spare] = pool.fill(KEY, HOUR)  # lives for max_idle + lease
+    clock.now = spare.expires_at - HOUR + 1
+    record, warm = pool.acquire(KEY, HOUR)
+    assert not warm and record is not spare and not spare.leased
+
+
+def test_reap_expires_leases_and_recycles_idle_sandboxes(clock):
+    pool = make_pool(clock, max_idle=2 * HOUR)
+    leased, _ = pool.acquire(KEY, HOUR)
+    [idle] = pool.fill(KEY, HOUR)
+    clock.now = HOUR
+    assert pool.reap() == [leased]  # the lease is up, the spare is still fresh
+    clock.now = 2 * HOUR + 1
+    assert pool.reap() == [idle]
+    assert pool.stats() == {
+        "hits": 0,
+        "misses": 1,
+        "created": 2,
+        "recycled": 1,
+        "expired": 1,
+        "warm": 0,
+        "leased": 0,
+    }
+    assert set(pool.backend.ended_at) == {leased.id, idle.id}
+
+
+def test_fill_tops_up_to_size(clock):
+    pool = make_pool(clock, size=3)
+    assert len(pool.fill(KEY, HOUR)) == 3
+    assert pool.fill(KEY, HOUR) == []
+    pool.acquire(KEY, HOUR)
+    assert len(pool.fill(KEY, HOUR)) == 1
+    assert len(pool.warm(KEY)) == 3 and pool.fill("other@main", HOUR) != []
+
+
+def test_failed_refresh_falls_through_to_the_next_sandbox(clock):
+    backend = FlakyBackend(clock, broken={"sb-1"})
+    pool = make_pool(clock, backend, size=2)
+    first, second = pool.fill(KEY, HOUR)
+    record, warm = pool.acquire(KEY, HOUR)
+    assert warm and record is second
+    assert first.id in backend.ended_at and first.id not in pool.records
+
+
+def test_failed_refresh_of_every_warm_sandbox_creates_one(clock):
+    backend = FlakyBackend(clock, broken={"sb-1"})
+    pool = make_pool(clock, backend)
+    pool.fill(KEY, HOUR)
+    record, warm = pool.acquire(KEY, HOUR)
+    assert not warm and record.id == "sb-2" and "sb-1" in backend.ended_at